@@ -1,3 +1,12 @@
 from django.contrib import admin
 
-# Register your models here.
+from apps.api.models import IdempotencyKey
+from apps.billing.admin import DerivedTableAdmin
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(DerivedTableAdmin):
+    list_display = ['key', 'order_code', 'status_code', 'created_on', 'expires_at']
+    list_filter = ['status_code']
+    search_fields = ['key__exact', 'order_code__exact']
+    search_help_text = 'Exact idempotency key or order code'
@@ -0,0 +1,250 @@
+"""
+Change selection strategies.
+
+A strategy picks which notes and coins to hand back for a balance, given the till stock (including what
+the customer just paid). ``greedy`` is the original search: largest denominations first, first solution
+found. The other strategies give each denomination a per-note cost derived from the till and return the
+cheapest exact breakdown, so the till keeps the denominations it will need for later customers:
+
+- ``fewest_notes``: every note costs the same, the fewest notes are handed out.
+- ``preserve_scarce``: notes the till holds few of cost more, plentiful ones are handed out first.
+- ``target_float``: denominations below their ``CHANGE_TARGET_FLOAT`` count cost more, those above cost less.
+
+The cheapest breakdown is a bounded knapsack solved with one sliding-window minimum per denomination,
+``O(balance * denominations)``.
+
+``suggest_tender`` runs the same search the other way round: which notes the customer should hand over so
+that the notes paid plus the notes given back are as few as possible.
+"""
+from collections import deque, namedtuple
+
+from django.conf import settings
+
+# Balances above this are first paid down with the largest notes, so the DP table stays small
+MAX_OPTIMIZED_AMOUNT = 5000
+INFINITY = float('inf')
+# ``suggest_tender`` considers overpaying by up to this many of the largest denomination
+TENDER_SEARCH_SPAN_NOTES = 2
+
+TenderSuggestion = namedtuple('TenderSuggestion', ['tender', 'change'])
+
+
+class ChangeStrategy:
+    name = None
+
+    def make_change(self, stock, amount):
+        """
+        Returns ``{value: count}`` adding up to ``amount`` without exceeding ``stock`` (``{value: available}``),
+        or None when exact change can't be given.
+        """
+        if amount == 0:
+            return {}
+
+        stock = {value: available for value, available in stock.items() if available > 0 and value <= amount}
+        change = {}
+        # Large balances: hand out the largest notes until the rest is small enough to optimize
+        for value in sorted(stock, reverse=True):
+            if amount <= MAX_OPTIMIZED_AMOUNT:
+                break
+            count = min(stock[value], (amount - MAX_OPTIMIZED_AMOUNT + value - 1) // value)
+            if count:
+                change[value] = count
+                stock[value] -= count
+                amount -= count * value
+
+        rest = _cheapest_change(stock, amount, self.note_costs(stock))
+        if rest is None:
+            return None
+        for value, count in rest.items():
+            change[value] = change.get(value, 0) + count
+        return change
+
+    def note_costs(self, stock):
+        """Cost of handing out one note of each value, lower costs are preferred."""
+        raise NotImplementedError
+
+
+class GreedyStrategy(ChangeStrategy):
+    """Largest denominations first, backtracking to the first exact solution."""
+    name = 'greedy'
+
+    def make_change(self, stock, amount):
+        denominations = sorted(((value, available) for value, available in stock.items() if available > 0),
+                               reverse=True)
+        result = {}
+
+        def calculate_possibilities(index, remaining):
+            if remaining == 0:
+                return True
+
+            if index >= len(denominations):
+                return False
+
+            value, available = denominations[index]
+            max_use = min(remaining // value, available)
+
+            for use_count in range(max_use, -1, -1):
+                if use_count > 0:
+                    result[value] = use_count
+
+                if calculate_possibilities(index + 1, remaining - (value * use_count)):
+                    return True
+
+                result.pop(value, None)
+
+            return False
+
+        if calculate_possibilities(0, amount):
+            return result
+        return None
+
+
+class FewestNotesStrategy(ChangeStrategy):
+    name = 'fewest_notes'
+
+    def note_costs(self, stock):
+        return {value: 1.0 for value in stock}
+
+
+class PreserveScarceStrategy(ChangeStrategy):
+    name = 'preserve_scarce'
+    # How strongly a short supply raises a note's cost, relative to the cost of handing out one more note
+    scarcity_weight = 10.0
+
+    def note_costs(self, stock):
+        return {value: 1.0 + self.scarcity_weight / (available + 1) for value, available in stock.items()}
+
+
+class TargetFloatStrategy(ChangeStrategy):
+    name = 'target_float'
+    # A denomination at zero stock costs 1 + deficit_weight per note, one at twice its target the minimum
+    deficit_weight = 2.0
+    min_cost = 0.1
+
+    def note_costs(self, stock):
+        targets = settings.CHANGE_TARGET_FLOAT
+        costs = {}
+        for value, available in stock.items():
+            target = targets.get(value)
+            if not target:
+                costs[value] = 1.0
+                continue
+            costs[value] = max(self.min_cost, 1.0 + self.deficit_weight * (target - available) / target)
+        return costs
+
+
+def _cheapest_change(stock, amount, costs):
+    """Bounded knapsack minimizing the summed note costs of an exact breakdown of ``amount``."""
+    best, steps = _cheapest_table(stock, amount, costs)
+    if best[amount] == INFINITY:
+        return None
+    return _breakdown(steps, amount)
+
+
+def _cheapest_table(stock, amount, costs):
+    """
+    Cheapest cost of every amount up to ``amount``, with the steps ``_breakdown`` needs to recover the
+    notes of any of them.
+    """
+    best = [INFINITY] * (amount + 1)
+    best[0] = 0.0
+    steps = []
+
+    for value in sorted(stock, reverse=True):
+        limit = min(stock[value], amount // value)
+        if not limit:
+            continue
+        cost = costs[value]
+        current = best[:]
+        used = [0] * (amount + 1)
+
+        # Within one residue class mod value, using k notes moves k positions along the class. The cheapest
+        # predecessor among the last ``limit`` positions is kept in a monotonic deque.
+        for residue in range(min(value, amount + 1)):
+            window = deque()
+            for position, index in enumerate(range(residue, amount + 1, value)):
+                key = best[index] - cost * position
+                while window and window[-1][1] >= key:
+                    window.pop()
+                window.append((position, key))
+                if window[0][0] < position - limit:
+                    window.popleft()
+                start, start_key = window[0]
+                if start_key + cost * position < current[index]:
+                    current[index] = start_key + cost * position
+                    used[index] = position - start
+
+        best = current
+        steps.append((value, used))
+
+    return best, steps
+
+
+def _breakdown(steps, amount):
+    change = {}
+    for value, used in reversed(steps):
+        count = used[amount]
+        if count:
+            change[value] = count
+            amount -= count * value
+    return change
+
+
+def suggest_tender(amount, till, wallet=None):
+    """
+    Notes to take from the customer for ``amount`` so the till can give exact change, with the fewest notes
+    changing hands in total. ``till`` is ``{value: available}``, ``wallet`` the notes the customer has in the
+    same form, or None when they can pay with any valid denomination.
+
+    Returns ``TenderSuggestion`` or None when no tender within the search span works. Change is searched in
+    the till alone: handing back a note of a value the customer just paid never saves notes.
+    """
+    denominations = settings.VALID_DENOMINATIONS
+    # Overpaying by more than the span is never suggested, this bounds both tables
+    span = TENDER_SEARCH_SPAN_NOTES * max(denominations)
+    if wallet is None:
+        wallet = {value: (amount + span) // value for value in denominations}
+    wallet = {value: count for value, count in wallet.items() if count > 0 and value in denominations}
+    if sum(value * count for value, count in wallet.items()) < amount:
+        # The customer can't cover the amount, don't size tables for it
+        return None
+
+    # Large amounts: tender the largest notes until the rest is small enough to search, as make_change does
+    tender = {}
+    for value in sorted(wallet, reverse=True):
+        if amount <= MAX_OPTIMIZED_AMOUNT:
+            break
+        count = min(wallet[value], (amount - MAX_OPTIMIZED_AMOUNT + value - 1) // value)
+        if count:
+            tender[value] = count
+            wallet[value] -= count
+            amount -= count * value
+
+    paid_best, paid_steps = _cheapest_table(wallet, amount + span, {value: 1.0 for value in wallet})
+    till = {value: available for value, available in till.items() if available > 0}
+    change_best, change_steps = _cheapest_table(till, span, {value: 1.0 for value in till})
+
+    best = None
+    for paid in range(amount, amount + span + 1):
+        notes = paid_best[paid] + change_best[paid - amount]
+        # Ties go to the smaller overpayment
+        if notes != INFINITY and (best is None or notes < best[0]):
+            best = (notes, paid)
+    if best is None:
+        return None
+
+    paid = best[1]
+    for value, count in _breakdown(paid_steps, paid).items():
+        tender[value] = tender.get(value, 0) + count
+    return TenderSuggestion(tender=tender, change=_breakdown(change_steps, paid - amount))
+
+
+CHANGE_STRATEGIES = {
+    strategy.name: strategy for strategy in (
+        GreedyStrategy, FewestNotesStrategy, PreserveScarceStrategy, TargetFloatStrategy,
+    )
+}
+
+
+def get_change_strategy(name=None):
+    return CHANGE_STRATEGIES[name or settings.CHANGE_STRATEGY]()
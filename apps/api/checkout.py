@@ -0,0 +1,115 @@
+"""
+Persistence of draft and finalized orders.
+
+The checkout views validate requests with ``apps.api.payloads`` and pass the checked data straight to
+these functions, nothing is validated again here.
+"""
+from django.conf import settings
+
+from apps.api.events import publish_till_changes
+from apps.billing.models import (
+    PurchaseOrder, PurchaseItem, AmountDenomination, DenominationDetail, StockMovement, CustomerStats,
+)
+from apps.billing.search import index_order
+
+
+def create_draft(draft_data):
+    """Creates a draft order with its items and totals. ``draft_data['items']`` holds PurchaseItem fields."""
+    draft_data = dict(draft_data)
+    items_data = draft_data.pop('items')
+    order = PurchaseOrder.objects.create(**draft_data)
+    _save_items(order, items_data)
+    return order
+
+
+def update_draft(order, draft_data):
+    """Replaces the items of a draft order and recalculates its totals."""
+    order.purchase_items.all().delete()
+    _save_items(order, draft_data['items'])
+    return order
+
+
+def _save_items(order, items_data):
+    """Create purchase items and recalculate totals."""
+    PurchaseItem.objects.bulk_create([PurchaseItem(purchase=order, **item_data) for item_data in items_data])
+    order.calculate_totals()
+    order.save()
+
+
+def settle_order(order, settlement):
+    """
+    Finalizes a draft: takes the items out of stock, records the tenders and change in the till and marks the
+    order paid. ``settlement`` holds ``paid_amount``, ``balance`` and the ``paid`` and ``change`` breakdowns
+    from ``validate_balance_possible``. Call inside the finalization transaction.
+    """
+    paid_data = settlement['paid']
+    change_data = settlement['change']
+
+    purchase_items = list(order.purchase_items.select_related('product'))
+    if settings.STOCK_LEDGER_ENABLED:
+        # Append to the ledger instead of locking hot product rows; compaction folds these in later
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                product_id=item.product_id,
+                purchase=order,
+                quantity=-item.quantity,
+                type=StockMovement.SALE,
+            )
+            for item in purchase_items
+        ])
+    else:
+        for item in purchase_items:
+            item.product.stock_quantity -= item.quantity
+            item.product.save(update_fields=['stock_quantity'])
+
+    # Deactivated denominations still hold the unique value, notes of that value are counted on them
+    denom_map = {d.value: d for d in AmountDenomination.all_objects.all()}
+
+    for detail in paid_data:
+        denom = denom_map.get(detail['value'])
+        if denom:
+            denom.available_count += detail['count']
+            denom.save(update_fields=['available_count'])
+        else:
+            denom = AmountDenomination.objects.create(
+                value=detail['value'],
+                available_count=detail['count'],
+            )
+        DenominationDetail.objects.create(
+            purchase=order,
+            denomination=denom,
+            count=detail['count'],
+            type=DenominationDetail.PAID,
+        )
+
+    for detail in change_data:
+        denom = denom_map.get(detail['value'])
+        denom.available_count -= detail['count']
+        denom.save(update_fields=['available_count'])
+        DenominationDetail.objects.create(
+            purchase=order,
+            denomination=denom,
+            count=detail['count'],
+            type=DenominationDetail.BALANCE,
+        )
+
+    order.amount_paid = settlement['paid_amount']
+    order.change_given = settlement['balance']
+    order.is_draft = False
+    order.save(update_fields=['amount_paid', 'change_given', 'is_draft'])
+
+    CustomerStats.record_purchase(order)
+    index_order(order, purchase_items)
+
+    denomination_deltas = {}
+    for detail in paid_data:
+        denomination_deltas[detail['value']] = denomination_deltas.get(detail['value'], 0) + detail['count']
+    for detail in change_data:
+        denomination_deltas[detail['value']] = denomination_deltas.get(detail['value'], 0) - detail['count']
+    publish_till_changes(
+        order.code,
+        denomination_deltas,
+        {item.product.code: -item.quantity for item in purchase_items},
+    )
+
+    return order
@@ -0,0 +1,166 @@
+"""
+Draft order storage.
+
+With ``DRAFT_BACKEND = 'database'`` (the default) drafts are ``PurchaseOrder`` rows with ``is_draft=True``,
+rewritten on every recalculation. With ``'cache'`` drafts live in Django's cache keyed by order code and
+the order and its items are only written to the database when the bill is generated, so recalculating
+and abandoning drafts costs no database writes.
+
+The cache must be shared by all web workers (file-based, database or an external cache), a per-process
+``LocMemCache`` only works with a single worker.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from apps.api.checkout import create_draft, update_draft
+from apps.billing.models import Customer, Product, PurchaseItem, PurchaseOrder
+from apps.billing.totals import basket_totals
+
+
+class DraftNotFound(Exception):
+    pass
+
+
+class StaleDraft(Exception):
+    """The draft refers to products that no longer exist, it has to be recalculated."""
+
+
+class DatabaseDraftStore:
+    """Drafts stored as PurchaseOrder(is_draft=True) rows."""
+
+    def load(self, order_code):
+        """Returns ``(order, items)`` for the draft or None."""
+        order = PurchaseOrder.objects.filter(code=order_code, is_draft=True).first()
+        if order is None:
+            return None
+        return order, list(order.purchase_items.select_related('product'))
+
+    def save(self, validated_data, order_code=None):
+        """Creates the draft, or replaces the items of draft ``order_code``. Returns the order with totals."""
+        order = None
+        if order_code:
+            order = PurchaseOrder.objects.filter(code=order_code, is_draft=True).first()
+            if order is None:
+                raise DraftNotFound(order_code)
+
+        with transaction.atomic():
+            if order is not None:
+                return update_draft(order, validated_data)
+            # Created with the draft, so a failed save leaves no customer behind
+            return create_draft({**validated_data, 'customer': Customer.for_email(validated_data['customer_email'])})
+
+    def materialize(self, order, items):
+        """
+        Ensures the draft is in the database. Call inside the finalization transaction. Locks the draft row so
+        concurrent bills for it settle one at a time, raises ``DraftNotFound`` if another one finalized it first.
+        """
+        locked = (PurchaseOrder.objects.select_for_update().filter(pk=order.pk, is_draft=True)
+                  .values_list('pk', flat=True).first())
+        if locked is None:
+            raise DraftNotFound(order.code)
+        return order
+
+    def discard(self, order_code):
+        pass
+
+
+class CacheDraftStore:
+    """Drafts stored in Django's cache, written to the database only when finalized."""
+
+    def __init__(self):
+        self.cache = caches[settings.DRAFT_CACHE_ALIAS]
+
+    @staticmethod
+    def _key(order_code):
+        return f"draft:{order_code}"
+
+    def load(self, order_code):
+        """Returns ``(order, items)`` for the draft or None, raises ``StaleDraft`` if a product was deleted."""
+        record = self.cache.get(self._key(order_code))
+        if record is None:
+            return None
+
+        products = Product.all_objects.in_bulk([product_id for product_id, *_ in record['items']])
+        if len(products) < len({product_id for product_id, *_ in record['items']}):
+            raise StaleDraft(f"Draft order '{order_code}' contains products that no longer exist, "
+                             f"calculate the total again.")
+        items = [
+            PurchaseItem(
+                product=products[product_id],
+                quantity=quantity,
+                unit_price=Decimal(unit_price),
+                tax_percentage=Decimal(tax_percentage),
+            )
+            for product_id, quantity, unit_price, tax_percentage in record['items']
+        ]
+        return self._build_order(record['code'], record['customer_email'], items), items
+
+    def save(self, validated_data, order_code=None):
+        """
+        Stores the draft under ``order_code`` or a newly reserved code. The returned order has no id until the
+        bill is generated, the code identifies the draft.
+        """
+        if order_code:
+            if self.cache.get(self._key(order_code)) is None:
+                raise DraftNotFound(order_code)
+        else:
+            order_code = self._reserve_code()
+
+        items = [PurchaseItem(**item_data) for item_data in validated_data['items']]
+        record = {
+            'code': order_code,
+            'customer_email': validated_data['customer_email'],
+            'items': [
+                (item.product_id, item.quantity, str(item.unit_price), str(item.tax_percentage))
+                for item in items
+            ],
+        }
+        self.cache.set(self._key(order_code), record, timeout=settings.DRAFT_CACHE_TIMEOUT)
+        return self._build_order(order_code, validated_data['customer_email'], items)
+
+    def materialize(self, order, items):
+        if order.pk is None:
+            order.customer = Customer.for_email(order.customer_email)
+            order.save()
+            for item in items:
+                item.purchase = order
+            PurchaseItem.objects.bulk_create(items)
+            # Reload the totals as stored, so the bill shows the same two-decimal amounts as database drafts
+            order.refresh_from_db(fields=['total_before_tax', 'total_tax', 'total_amount'])
+        return order
+
+    def discard(self, order_code):
+        self.cache.delete(self._key(order_code))
+
+    def _reserve_code(self):
+        # cache.add is atomic, so two workers can't hand out the same code for different drafts
+        while True:
+            order_code = PurchaseOrder.generate_code()
+            if self.cache.add(self._key(order_code), None, timeout=settings.DRAFT_CACHE_TIMEOUT):
+                return order_code
+
+    @staticmethod
+    def _build_order(order_code, customer_email, items):
+        """Unsaved draft order carrying the totals its items add up to."""
+        totals = basket_totals((item.quantity, item.unit_price, item.tax_percentage) for item in items)
+        return PurchaseOrder(
+            code=order_code,
+            customer_email=customer_email,
+            is_draft=True,
+            total_before_tax=totals.total_before_tax,
+            total_tax=totals.total_tax,
+            total_amount=totals.total_amount,
+        )
+
+
+DRAFT_STORES = {
+    'database': DatabaseDraftStore,
+    'cache': CacheDraftStore,
+}
+
+
+def get_draft_store():
+    return DRAFT_STORES[settings.DRAFT_BACKEND]()
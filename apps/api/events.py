@@ -0,0 +1,191 @@
+"""
+Live till and stock events.
+
+Finalizing a bill publishes one ``till`` event with the denomination and product stock deltas it caused,
+once its transaction commits. ``/api/till-events/`` streams these as Server-Sent Events: a ``snapshot``
+event with the current levels first, then only deltas. Clients that fall too far behind get a fresh
+snapshot instead of the events they missed.
+
+The broker is in-process, so a stream only sees bills finalized by the same server process.
+"""
+import asyncio
+import itertools
+import json
+import queue
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.billing.models import AmountDenomination, Product
+
+
+class _Subscriber:
+    """A stream's bounded mailbox. When it overflows, queued events are dropped and ``overflowed`` is set."""
+
+    def __init__(self):
+        self.overflowed = False
+
+
+class _QueueSubscriber(_Subscriber):
+    """Mailbox for streams served from a worker thread (WSGI)."""
+
+    def __init__(self, size):
+        super().__init__()
+        self.queue = queue.Queue(maxsize=size)
+
+    def deliver(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def clear(self):
+        self.overflowed = False
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+
+class _AsyncSubscriber(_Subscriber):
+    """Mailbox for streams served from an event loop (ASGI). Publishers hand messages over thread-safely."""
+
+    def __init__(self, size):
+        super().__init__()
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=size)
+
+    def deliver(self, message):
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def clear(self):
+        self.overflowed = False
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+
+class EventBroker:
+    """Fans published events out to the subscribed streams of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.add(subscriber)
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        message = format_event(event, data, event_id=next(self._ids))
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.deliver(message)
+
+
+broker = EventBroker()
+
+
+def format_event(event, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data, cls=DjangoJSONEncoder)}"]
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+HEARTBEAT = b': keep-alive\n\n'
+
+
+def publish_till_changes(order_code, denomination_deltas, product_deltas):
+    """
+    Publishes a bill's stock changes once the current transaction commits. Deltas map denomination
+    values and product codes to signed count changes.
+    """
+    data = {
+        'order_code': order_code,
+        'at': timezone.now(),
+        'denominations': [{'value': value, 'delta': delta}
+                          for value, delta in sorted(denomination_deltas.items(), reverse=True) if delta],
+        'products': [{'code': code, 'delta': delta} for code, delta in sorted(product_deltas.items()) if delta],
+    }
+    transaction.on_commit(lambda: broker.publish('till', data))
+
+
+def till_snapshot():
+    return {
+        'at': timezone.now(),
+        'denominations': list(AmountDenomination.objects.order_by('-value').values('value', 'available_count')),
+        'products': list(Product.objects.with_available_stock().order_by('code').values('code', 'available_stock')),
+    }
+
+
+def _snapshot_and_release():
+    # The stream thread may stay open for hours, don't keep its database connection idle meanwhile
+    try:
+        return till_snapshot()
+    finally:
+        connection.close()
+
+
+def stream_events():
+    """Blocking SSE stream for WSGI servers, one worker thread per open stream."""
+    subscriber = _QueueSubscriber(settings.TILL_EVENTS_QUEUE_SIZE)
+    # Subscribe before reading the snapshot, so no change is lost between the two. A bill committing while the
+    # snapshot is read may show up in both, dashboards resynchronize on the next snapshot.
+    broker.subscribe(subscriber)
+    try:
+        yield format_event('snapshot', _snapshot_and_release())
+        while True:
+            message = subscriber.get(settings.TILL_EVENTS_HEARTBEAT)
+            if subscriber.overflowed:
+                subscriber.clear()
+                yield format_event('snapshot', _snapshot_and_release())
+            elif message is not None:
+                yield message
+            else:
+                yield HEARTBEAT
+    finally:
+        broker.unsubscribe(subscriber)
+
+
+async def astream_events():
+    """SSE stream for ASGI servers, no thread is held while the stream waits."""
+    subscriber = _AsyncSubscriber(settings.TILL_EVENTS_QUEUE_SIZE)
+    broker.subscribe(subscriber)
+    try:
+        yield format_event('snapshot', await sync_to_async(till_snapshot)())
+        while True:
+            message = await subscriber.get(settings.TILL_EVENTS_HEARTBEAT)
+            if subscriber.overflowed:
+                subscriber.clear()
+                yield format_event('snapshot', await sync_to_async(till_snapshot)())
+            elif message is not None:
+                yield message
+            else:
+                yield HEARTBEAT
+    finally:
+        broker.unsubscribe(subscriber)
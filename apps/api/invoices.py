@@ -0,0 +1,158 @@
+"""
+Invoice rendering pipeline.
+
+Invoices are rendered to HTML (and to PDF when WeasyPrint is installed) in a bounded process pool, so
+template and PDF work never holds a web worker's GIL. Rendered artifacts are stored by order code and
+reused for the invoice email, downloads and resends.
+
+This module is imported by the pool's worker processes before Django is set up, so it must not import
+models at module level.
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.template.loader import render_to_string
+
+INVOICE_TEMPLATE = 'email/order/invoice_notification.html'
+
+Invoice = namedtuple('Invoice', ['html', 'pdf'])
+
+
+class InvoiceRenderTimeout(Exception):
+    """The pool didn't render the invoice within ``INVOICE_RENDER_TIMEOUT`` seconds."""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = None
+
+
+def _init_worker():
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    django.setup()
+
+
+def _render(context):
+    """Renders the invoice HTML and, if WeasyPrint is available, the PDF. Runs in a worker process."""
+    html = render_to_string(INVOICE_TEMPLATE, context)
+
+    try:
+        from weasyprint import HTML
+    except ImportError:
+        return html, None
+    return html, HTML(string=html).write_pdf()
+
+
+def _get_executor():
+    global _executor, _pending
+    with _executor_lock:
+        if _executor is None:
+            # spawn keeps workers free of the parent's threads, locks and database connections
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.INVOICE_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+            _pending = threading.BoundedSemaphore(
+                settings.INVOICE_RENDER_WORKERS + settings.INVOICE_RENDER_QUEUE_SIZE
+            )
+        return _executor, _pending
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _render_in_pool(context):
+    executor, pending = _get_executor()
+    timeout = settings.INVOICE_RENDER_TIMEOUT
+    # Bound the backlog, submitters wait here instead of queueing unbounded work on the pool. A stalled
+    # pool never frees a slot, so the wait is bounded too.
+    if not pending.acquire(timeout=timeout):
+        raise InvoiceRenderTimeout(f"No invoice render slot freed up within {timeout} seconds.")
+    try:
+        future = executor.submit(_render, context)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Drops the job if no worker has picked it up yet, a running render finishes and is discarded
+            future.cancel()
+            raise InvoiceRenderTimeout(f"Invoice not rendered within {timeout} seconds.")
+        except BrokenProcessPool:
+            _reset_executor()
+            return _render(context)
+    finally:
+        pending.release()
+
+
+def _storage():
+    return FileSystemStorage(location=settings.INVOICE_STORAGE_DIR)
+
+
+def _artifact_names(order_code):
+    return f"{order_code}.html", f"{order_code}.pdf"
+
+
+def _read(storage, name):
+    if not storage.exists(name):
+        return None
+    with storage.open(name, 'rb') as artifact:
+        return artifact.read()
+
+
+def _write(storage, name, content):
+    """Replaces an artifact atomically, concurrent writers leave one complete file and no suffixed copies."""
+    path = storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(content)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def get_invoice(order, items, change_details, refresh=False):
+    """
+    Returns the stored ``Invoice`` for the order, rendering and storing it first if needed.
+    ``items`` must carry the computed ``subtotal``, ``tax_amount`` and ``total`` attributes.
+    Raises ``InvoiceRenderTimeout`` when the pool is too slow.
+    """
+    storage = _storage()
+    html_name, pdf_name = _artifact_names(order.code)
+
+    if not refresh:
+        html = _read(storage, html_name)
+        if html is not None:
+            return Invoice(html.decode(), _read(storage, pdf_name))
+
+    # Materialize querysets so workers only receive plain model instances and never query the database
+    html, pdf = _render_in_pool({
+        'recipient_name': order.customer_email,
+        'order': order,
+        'items': list(items),
+        'change_details': list(change_details),
+    })
+
+    # The PDF goes first, a stored HTML file means the invoice is complete
+    for name, content in ((pdf_name, pdf), (html_name, html.encode())):
+        if content is not None:
+            _write(storage, name, content)
+
+    return Invoice(html, pdf)
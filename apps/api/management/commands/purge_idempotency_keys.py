@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.api.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Deletes idempotency keys whose TTL has expired.'
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired idempotency keys."))
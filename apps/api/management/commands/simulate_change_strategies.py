@@ -0,0 +1,135 @@
+import math
+import random
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.api.change import CHANGE_STRATEGIES, get_change_strategy
+from apps.billing.models import AmountDenomination, DenominationDetail, PurchaseOrder
+
+
+def parse_float(value):
+    """Parses ``'500:10,100:20'`` into ``{500: 10, 100: 20}``."""
+    try:
+        return {int(denomination): int(count) for denomination, count in
+                (pair.split(':') for pair in value.split(',') if pair)}
+    except ValueError:
+        raise CommandError(f"Invalid float {value!r}, expected value:count pairs like '500:10,100:20'.")
+
+
+def breakdown(amount, denominations):
+    """Largest-first ``{value: count}`` for an amount, the way customers hand over cash."""
+    notes = {}
+    for value in sorted(denominations, reverse=True):
+        count, amount = divmod(amount, value)
+        if count:
+            notes[value] = count
+    return notes
+
+
+class Command(BaseCommand):
+    help = ('Replays a day of bills against a simulated till with each change strategy and reports '
+            'refusal rate and CPU time per strategy.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, default=None,
+                            help='Replay finalized orders of this day (YYYY-MM-DD) instead of synthetic bills.')
+        parser.add_argument('--bills', type=int, default=1000, help='Synthetic bills to generate.')
+        parser.add_argument('--seed', type=int, default=42, help='Seed for synthetic bills.')
+        parser.add_argument('--float', dest='opening_float', type=parse_float, default=None,
+                            help='Opening till as value:count pairs, defaults to CHANGE_TARGET_FLOAT.')
+        parser.add_argument('--current-till', action='store_true',
+                            help='Open with the current AmountDenomination counts.')
+        parser.add_argument('--strategies', nargs='+', choices=sorted(CHANGE_STRATEGIES),
+                            default=sorted(CHANGE_STRATEGIES), help='Strategies to compare.')
+
+    def handle(self, *args, **options):
+        if options['current_till']:
+            opening = dict(AmountDenomination.objects.values_list('value', 'available_count'))
+        else:
+            opening = options['opening_float'] or dict(settings.CHANGE_TARGET_FLOAT)
+        for value in settings.VALID_DENOMINATIONS:
+            opening.setdefault(value, 0)
+
+        if options['date']:
+            bills = self._recorded_bills(options['date'])
+            source = f"{len(bills)} bills of {options['date']}"
+        else:
+            bills = self._synthetic_bills(options['bills'], options['seed'])
+            source = f"{len(bills)} synthetic bills (seed {options['seed']})"
+        if not bills:
+            raise CommandError('No bills to replay.')
+
+        self.stdout.write(f"Replaying {source}, opening till: "
+                          f"{', '.join(f'{value}x{count}' for value, count in sorted(opening.items(), reverse=True))}")
+        self.stdout.write(f"{'strategy':<16}{'refused':>9}{'refusal %':>11}{'notes out':>11}"
+                          f"{'cpu ms':>10}{'us/bill':>10}  emptied")
+        for name in options['strategies']:
+            self._report(name, *self._simulate(get_change_strategy(name), bills, opening))
+
+    def _simulate(self, strategy, bills, opening):
+        till = dict(opening)
+        refused = notes_out = 0
+        cpu = 0.0
+
+        for total, paid in bills:
+            working = dict(till)
+            for value, count in paid.items():
+                working[value] = working.get(value, 0) + count
+
+            started = time.process_time()
+            change = strategy.make_change(working, sum(value * count for value, count in paid.items()) - total)
+            cpu += time.process_time() - started
+
+            if change is None:
+                # The customer is turned away, the till is unchanged
+                refused += 1
+                continue
+            for value, count in change.items():
+                working[value] -= count
+            notes_out += sum(change.values())
+            till = working
+
+        return len(bills), refused, notes_out, cpu, till
+
+    def _report(self, name, bills, refused, notes_out, cpu, till):
+        emptied = ', '.join(str(value) for value, count in sorted(till.items()) if count == 0) or '-'
+        self.stdout.write(f"{name:<16}{refused:>9}{100 * refused / bills:>10.1f}%{notes_out:>11}"
+                          f"{cpu * 1000:>10.1f}{cpu * 1e6 / bills:>10.0f}  {emptied}")
+
+    @staticmethod
+    def _recorded_bills(day):
+        """``(total, {value: count paid})`` for the day's finalized orders, in purchase order."""
+        orders = (
+            PurchaseOrder.all_objects.filter(is_draft=False, purchase_date__date=day)
+            .order_by('purchase_date').values_list('id', 'total_amount')
+        )
+        paid = {}
+        details = DenominationDetail.objects.filter(
+            purchase__in=orders.values('id'), type=DenominationDetail.PAID,
+        ).values_list('purchase_id', 'denomination__value', 'count')
+        for purchase_id, value, count in details.iterator():
+            paid.setdefault(purchase_id, {})[value] = count
+        return [(int(total), paid[order_id]) for order_id, total in orders.iterator() if order_id in paid]
+
+    @staticmethod
+    def _synthetic_bills(count, seed):
+        """
+        Bills with log-uniform totals. Customers pay up to the next round amount in large notes, some
+        pay exact and some add coins for the odd rupees to get round change back.
+        """
+        rng = random.Random(seed)
+        denominations = settings.VALID_DENOMINATIONS
+        bills = []
+        for _ in range(count):
+            total = int(math.exp(rng.uniform(math.log(20), math.log(3000))))
+            round_to = rng.choices((1, 10, 50, 100, 500), (10, 15, 20, 30, 25))[0]
+            odd = total % 10 if rng.random() < 0.3 else 0
+            paid = -(-(total - odd) // round_to) * round_to
+            notes = breakdown(paid, denominations)
+            for value, coins in breakdown(odd, denominations).items():
+                notes[value] = notes.get(value, 0) + coins
+            bills.append((total, notes))
+        return bills
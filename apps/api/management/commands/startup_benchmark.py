@@ -0,0 +1,133 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: imports the entry point, serves one GET and prints the timings as JSON
+PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+entrypoint, path = sys.argv[1], sys.argv[2]
+
+if entrypoint == 'wsgi':
+    import io
+    from core.wsgi import application
+    imported = time.perf_counter()
+    from django.conf import settings
+    host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': host,
+        'SERVER_PORT': '80', 'HTTP_HOST': host, 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+    }
+    statuses = []
+    b''.join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+    status = int(statuses[0].split()[0])
+else:
+    import asyncio
+    from core.asgi import application
+    imported = time.perf_counter()
+    from django.conf import settings
+    host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', host.encode())], 'client': ('127.0.0.1', 0), 'server': (host, 80),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    status = messages[0]['status']
+
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_response_ms': (time.perf_counter() - started) * 1000,
+    'status': status,
+}))
+'''
+
+
+def parse_importtime(output):
+    """Self time in microseconds per top-level package from ``-X importtime`` output."""
+    totals = defaultdict(int)
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        totals[name.strip().split('.')[0]] += int(self_us)
+    return totals
+
+
+class Command(BaseCommand):
+    help = ('Measures time to first response of the WSGI and ASGI applications in fresh interpreters and shows '
+            'where import time goes. Fails when the median exceeds the budget, for use in CI.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Measured runs per entry point, after one warm-up.')
+        parser.add_argument('--path', default='/api/denominations-list/', help='Path of the first request.')
+        parser.add_argument('--entrypoints', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+        parser.add_argument('--budget-ms', type=float, default=settings.STARTUP_BUDGET_MS,
+                            help='Maximum median time to first response, 0 disables the check.')
+        parser.add_argument('--top', type=int, default=15, help='Packages shown in the import time breakdown.')
+
+    def handle(self, *args, **options):
+        if options['runs'] <= 0:
+            raise CommandError('--runs must be positive.')
+
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'core.settings'))
+        over_budget = []
+
+        for entrypoint in options['entrypoints']:
+            # The warm-up run writes bytecode caches, later runs measure a worker restart, not a fresh install
+            self._run(entrypoint, options['path'], env)
+            runs = [self._run(entrypoint, options['path'], env) for _ in range(options['runs'])]
+
+            median = {key: statistics.median(run[key] for run in runs)
+                      for key in ('import_ms', 'first_response_ms', 'process_ms')}
+            self.stdout.write(
+                f"{entrypoint}: import {median['import_ms']:.0f} ms, first response {median['first_response_ms']:.0f} "
+                f"ms, process {median['process_ms']:.0f} ms (median of {len(runs)}, status {runs[-1]['status']})"
+            )
+            if options['budget_ms'] and median['first_response_ms'] > options['budget_ms']:
+                over_budget.append(f"{entrypoint} {median['first_response_ms']:.0f} ms")
+
+            # A separate run, -X importtime itself slows imports down
+            packages = self._run(entrypoint, options['path'], env, importtime=True)['packages']
+            total_us = sum(packages.values())
+            for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+                self.stdout.write(f"  {name:<28}{self_us / 1000:>8.1f} ms{100 * self_us / total_us:>6.1f}%")
+
+        if over_budget:
+            raise CommandError(f"Time to first response over the {options['budget_ms']:.0f} ms budget: "
+                               f"{', '.join(over_budget)}.")
+        if options['budget_ms']:
+            self.stdout.write(self.style.SUCCESS(f"Within the {options['budget_ms']:.0f} ms budget."))
+
+    @staticmethod
+    def _run(entrypoint, path, env, importtime=False):
+        command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', PROBE, entrypoint, path]
+        started = time.perf_counter()
+        result = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        process_ms = (time.perf_counter() - started) * 1000
+        if result.returncode:
+            raise CommandError(f"{entrypoint} probe failed:\n{result.stderr[-2000:]}")
+
+        run = json.loads(result.stdout.strip().splitlines()[-1])
+        if run['status'] >= 400:
+            raise CommandError(f"{entrypoint} answered {path} with status {run['status']}.")
+        run['process_ms'] = process_ms
+        if importtime:
+            run['packages'] = parse_importtime(result.stderr)
+        return run
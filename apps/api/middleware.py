@@ -0,0 +1,237 @@
+"""
+Admission control for the checkout endpoints.
+
+Each process admits at most ``ADMISSION_MAX_CONCURRENT`` checkout requests at a time, the rest wait in
+a bounded queue where bill finalization is served before draft recalculation. Requests that find the
+queue full, or wait longer than ``ADMISSION_QUEUE_TIMEOUT``, get an immediate ``503`` with
+``Retry-After`` instead of piling up on database locks.
+
+Under ASGI the middleware runs async and queued requests wait on the event loop, so they hold no thread
+from the pool that runs the sync views; under WSGI each queued request blocks its worker thread.
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+# Lower values are served first
+BILL_PRIORITY = 0
+DRAFT_PRIORITY = 1
+
+ADMISSION_PRIORITIES = {
+    'generate-bill': BILL_PRIORITY,
+    'calculate-total': DRAFT_PRIORITY,
+}
+PRIORITY_NAMES = {BILL_PRIORITY: 'bill', DRAFT_PRIORITY: 'draft'}
+
+
+class _Waiter:
+    """A queued request, woken through a thread event or, for async requests, a future on their loop."""
+    __slots__ = ('event', 'loop', 'future', 'admitted', 'evicted')
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+        self.admitted = False
+        self.evicted = False
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            # release() may run on another thread or loop
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdmissionController:
+    """Concurrency limiter with a bounded priority queue, shared by the threads and event loop of one process."""
+
+    def __init__(self, max_concurrent, max_queue):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queue = []
+        self._sequence = itertools.count()
+        self._peak_queue_depth = 0
+        self._counters = {
+            name: {'admitted': 0, 'shed': 0, 'timed_out': 0} for name in PRIORITY_NAMES.values()
+        }
+
+    def acquire(self, priority, timeout):
+        """Returns True once the request may run, or False if it was shed or timed out."""
+        admitted, entry = self._enter(priority)
+        if entry is None:
+            return admitted
+        entry[2].event.wait(timeout)
+        return self._leave_queue(entry)
+
+    async def aacquire(self, priority, timeout):
+        """``acquire`` for async requests, waits without blocking the event loop."""
+        admitted, entry = self._enter(priority, loop=asyncio.get_running_loop())
+        if entry is None:
+            return admitted
+        try:
+            await asyncio.wait_for(entry[2].future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # The client went away, give back a slot that was handed over meanwhile
+            if self._leave_queue(entry):
+                self.release()
+            raise
+        return self._leave_queue(entry)
+
+    def _enter(self, priority, loop=None):
+        """Admits, sheds or queues a request. Returns ``(admitted, queue entry or None)``."""
+        counters = self._counters[PRIORITY_NAMES[priority]]
+
+        with self._lock:
+            if self._active < self.max_concurrent and not self._queue:
+                self._active += 1
+                counters['admitted'] += 1
+                return True, None
+
+            if len(self._queue) >= self.max_queue and not self._evict_lower_than(priority):
+                counters['shed'] += 1
+                return False, None
+
+            entry = (priority, next(self._sequence), _Waiter(loop))
+            heapq.heappush(self._queue, entry)
+            self._peak_queue_depth = max(self._peak_queue_depth, len(self._queue))
+            return False, entry
+
+    def _leave_queue(self, entry):
+        """Settles a queued request after its wait. Returns True if it was handed a slot."""
+        priority, _, waiter = entry
+        counters = self._counters[PRIORITY_NAMES[priority]]
+
+        with self._lock:
+            if waiter.admitted:
+                counters['admitted'] += 1
+                return True
+            if waiter.evicted:
+                counters['shed'] += 1
+                return False
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            counters['timed_out'] += 1
+            return False
+
+    def release(self):
+        with self._lock:
+            if self._queue:
+                # Hand the slot straight to the next waiter, so newcomers can't overtake the queue
+                _, _, waiter = heapq.heappop(self._queue)
+                waiter.admitted = True
+                waiter.wake()
+            else:
+                self._active -= 1
+
+    def _evict_lower_than(self, priority):
+        """Sheds the newest queued request of a lower priority to make room. Call with the lock held."""
+        candidates = [entry for entry in self._queue if entry[0] > priority]
+        if not candidates:
+            return False
+        victim = max(candidates)
+        self._queue.remove(victim)
+        heapq.heapify(self._queue)
+        victim[2].evicted = True
+        victim[2].wake()
+        return True
+
+    def snapshot(self):
+        with self._lock:
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _, _ in self._queue:
+                queued[PRIORITY_NAMES[priority]] += 1
+            return {
+                'active': self._active,
+                'max_concurrent': self.max_concurrent,
+                'queue_depth': len(self._queue),
+                'queued': queued,
+                'peak_queue_depth': self._peak_queue_depth,
+                'max_queue': self.max_queue,
+                'requests': {name: dict(counters) for name, counters in self._counters.items()},
+            }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController(settings.ADMISSION_MAX_CONCURRENT, settings.ADMISSION_MAX_QUEUE)
+        return _controller
+
+
+class AdmissionControlMiddleware:
+    """Runs checkout requests through the process's AdmissionController, other requests pass straight through."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        priority = self._priority(request) if settings.ADMISSION_CONTROL_ENABLED else None
+        if priority is None:
+            return self.get_response(request)
+
+        controller = get_admission_controller()
+        if not controller.acquire(priority, settings.ADMISSION_QUEUE_TIMEOUT):
+            return self._busy_response()
+
+        try:
+            return self.get_response(request)
+        finally:
+            controller.release()
+
+    async def __acall__(self, request):
+        priority = self._priority(request) if settings.ADMISSION_CONTROL_ENABLED else None
+        if priority is None:
+            return await self.get_response(request)
+
+        controller = get_admission_controller()
+        if not await controller.aacquire(priority, settings.ADMISSION_QUEUE_TIMEOUT):
+            return self._busy_response()
+
+        try:
+            return await self.get_response(request)
+        finally:
+            controller.release()
+
+    @staticmethod
+    def _busy_response():
+        response = JsonResponse({'error': 'The server is busy, please retry shortly.'}, status=503)
+        response['Retry-After'] = str(settings.ADMISSION_RETRY_AFTER)
+        return response
+
+    @staticmethod
+    def _priority(request):
+        if request.method != 'POST':
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        return ADMISSION_PRIORITIES.get(match.url_name)
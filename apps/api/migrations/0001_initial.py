@@ -0,0 +1,30 @@
+# Generated by Django 4.2.28 on 2026-10-19 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Client supplied Idempotency-Key header', max_length=255, unique=True)),
+                ('order_code', models.CharField(help_text='Order finalized by the first request', max_length=25)),
+                ('status_code', models.PositiveSmallIntegerField(help_text='Status code of the stored response')),
+                ('response', models.JSONField(help_text='Serialized response body')),
+                ('created_on', models.DateTimeField(auto_now_add=True, help_text='When the key was first used')),
+                ('expires_at', models.DateTimeField(db_index=True, help_text='Key is ignored and purged after this time')),
+            ],
+            options={
+                'verbose_name': 'Idempotency Key',
+                'verbose_name_plural': 'Idempotency Keys',
+            },
+        ),
+    ]
@@ -1,3 +1,41 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+
+class IdempotencyKey(models.Model):
+    """Response of a finalized bill, replayed when a client retries with the same ``Idempotency-Key``."""
+    key = models.CharField(max_length=255, unique=True, help_text='Client supplied Idempotency-Key header')
+    order_code = models.CharField(max_length=25, help_text='Order finalized by the first request')
+    status_code = models.PositiveSmallIntegerField(help_text='Status code of the stored response')
+    response = models.JSONField(help_text='Serialized response body')
+    created_on = models.DateTimeField(auto_now_add=True, help_text='When the key was first used')
+    expires_at = models.DateTimeField(db_index=True, help_text='Key is ignored and purged after this time')
+
+    class Meta:
+        verbose_name = 'Idempotency Key'
+        verbose_name_plural = 'Idempotency Keys'
+
+    def __str__(self):
+        return f"{self.key} - Order #{self.order_code}"
+
+    @classmethod
+    def lookup(cls, key):
+        """Returns the unexpired stored response for ``key`` or None."""
+        return cls.objects.filter(key=key, expires_at__gt=timezone.now()).first()
 
-# Create your models here.
+    @classmethod
+    def store(cls, key, order_code, response, status_code):
+        """Stores a response. Call inside the transaction that finalized the order."""
+        now = timezone.now()
+        # An expired row still holds the unique key, clear it so the key can be reused
+        cls.objects.filter(key=key, expires_at__lte=now).delete()
+        return cls.objects.create(
+            key=key,
+            order_code=order_code,
+            status_code=status_code,
+            response=response,
+            expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+        )
@@ -0,0 +1,142 @@
+"""
+Typed checkout payloads.
+
+The checkout views parse request bodies once into these slotted dataclasses and pass them on to
+stock checks and settlement, instead of re-validating already checked data through DRF serializers.
+"""
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+
+# Largest amount a DecimalField(max_digits=10, decimal_places=2) column can hold, exclusive
+MAX_AMOUNT = 10 ** 8
+
+
+class PayloadError(Exception):
+    """Raised with the response body to return as a 400 when a payload is malformed."""
+
+    def __init__(self, detail):
+        super().__init__(detail)
+        self.detail = detail
+
+
+def _is_positive_int(value):
+    # bool is an int subclass, but `true` is not a quantity
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+@dataclass(frozen=True, slots=True)
+class LineItem:
+    product_code: str
+    # None when the request did not carry a positive integer, reported once the product is known
+    quantity: int | None
+
+
+@dataclass(frozen=True, slots=True)
+class DraftPayload:
+    customer_email: str
+    items: tuple
+    order_code: str | None
+
+    @classmethod
+    def parse(cls, data):
+        customer_email = data.get('customer_email', '')
+        customer_email = customer_email.strip() if isinstance(customer_email, str) else ''
+        items_data = data.get('items') or []
+        errors = {}
+
+        if not customer_email:
+            errors['customer_email'] = 'Customer email is required.'
+        else:
+            try:
+                validate_email(customer_email)
+            except ValidationError:
+                errors['customer_email'] = 'Enter a valid email address.'
+
+        if not items_data or not isinstance(items_data, list):
+            errors['items'] = 'At least one item is required.'
+
+        if errors:
+            raise PayloadError({'errors': errors})
+
+        items = []
+        for item in items_data:
+            product_code = item.get('product_code') if isinstance(item, dict) else None
+            if not product_code or not isinstance(product_code, str):
+                raise PayloadError({'errors': {'items': 'Each item needs a product code and quantity.'}})
+
+            quantity = item.get('quantity', 0)
+            items.append(LineItem(product_code, quantity if _is_positive_int(quantity) else None))
+
+        # Check for duplicate product codes in request
+        if len({item.product_code for item in items}) != len(items):
+            raise PayloadError({'error': 'Duplicate product entries found. Adjust quantity instead.'})
+
+        order_code = data.get('order_code') or None
+        return cls(customer_email, tuple(items), str(order_code) if order_code else None)
+
+
+@dataclass(frozen=True, slots=True)
+class Tender:
+    value: int
+    count: int
+
+
+def _parse_tenders(denominations_data):
+    denominations = []
+    for item in denominations_data:
+        value = item.get('value') if isinstance(item, dict) else None
+        count = item.get('count') if isinstance(item, dict) else None
+        if not _is_positive_int(value) or not _is_positive_int(count):
+            raise PayloadError({'error': 'Each denomination needs a positive integer value and count.'})
+        denominations.append(Tender(value, count))
+
+    if len({tender.value for tender in denominations}) != len(denominations):
+        raise PayloadError({'error': 'Duplicate denomination entries found. Adjust count instead.'})
+    return tuple(denominations)
+
+
+@dataclass(frozen=True, slots=True)
+class BillPayload:
+    order_code: str
+    denominations: tuple
+
+    @property
+    def paid_amount(self):
+        return sum(tender.value * tender.count for tender in self.denominations)
+
+    @classmethod
+    def parse(cls, data):
+        order_code = data.get('order_code')
+        denominations_data = data.get('denominations') or []
+
+        if not order_code:
+            raise PayloadError({'error': 'Order code is required.'})
+
+        if not denominations_data or not isinstance(denominations_data, list):
+            raise PayloadError({'error': 'Denomination details are required.'})
+
+        payload = cls(str(order_code), _parse_tenders(denominations_data))
+        if payload.paid_amount >= MAX_AMOUNT:
+            raise PayloadError({'error': 'Paid amount is too large.'})
+        return payload
+
+
+@dataclass(frozen=True, slots=True)
+class TenderSuggestionPayload:
+    order_code: str
+    # The notes the customer has, None when they didn't say
+    available: tuple | None
+
+    @classmethod
+    def parse(cls, data):
+        order_code = data.get('order_code')
+        available_data = data.get('available') or None
+
+        if not order_code:
+            raise PayloadError({'error': 'Order code is required.'})
+        if available_data is not None and not isinstance(available_data, list):
+            raise PayloadError({'error': 'Available denominations must be a list.'})
+
+        return cls(str(order_code), _parse_tenders(available_data) if available_data else None)
@@ -1,3 +1,1062 @@
-from django.test import TestCase
+import asyncio
+import base64
+import io
+import itertools
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from apps.api import events
+from apps.api.change import CHANGE_STRATEGIES, FewestNotesStrategy, get_change_strategy, suggest_tender
+from apps.api.management.commands.startup_benchmark import parse_importtime
+from apps.api import invoices
+from apps.api.checkout import settle_order
+from apps.api.drafts import CacheDraftStore, DatabaseDraftStore, DraftNotFound, StaleDraft
+from apps.api.middleware import BILL_PRIORITY, DRAFT_PRIORITY, AdmissionController, AdmissionControlMiddleware
+from apps.api.models import IdempotencyKey
+from apps.api.payloads import MAX_AMOUNT, BillPayload, DraftPayload, PayloadError, Tender, TenderSuggestionPayload
+from apps.api.utils import _send_invoice
+from apps.billing.feed import append_to_feed
+from apps.billing.models import (
+    AmountDenomination, Customer, CustomerStats, DenominationDetail, OrderFeedEntry, Product, PurchaseItem,
+    PurchaseOrder, TillSnapshot,
+)
+from apps.billing.search import index_order
+from apps.billing.till import take_snapshot
+from core.log import QueueListenerHandler
+from core.profiling import collapsed_stacks, prune_profiles
+from core.routers import REPLICA_DB_ALIAS, ReplicaRouter, pin_to_primary, read_from_replica
+
+
+class AdmissionControllerTests(SimpleTestCase):
+
+    def _queue_in_background(self, controller, priority, results, timeout=5):
+        thread = threading.Thread(target=lambda: results.append((priority, controller.acquire(priority, timeout))))
+        thread.start()
+        return thread
+
+    def _wait_for_queue_depth(self, controller, depth):
+        for _ in range(500):
+            if controller.snapshot()['queue_depth'] == depth:
+                return
+            threading.Event().wait(0.01)
+        self.fail(f"Queue never reached depth {depth}")
+
+    def test_sheds_when_queue_is_full(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=0)
+        self.assertTrue(controller.acquire(DRAFT_PRIORITY, timeout=0))
+        self.assertFalse(controller.acquire(DRAFT_PRIORITY, timeout=0))
+        controller.release()
+        self.assertTrue(controller.acquire(DRAFT_PRIORITY, timeout=0))
+
+        requests = controller.snapshot()['requests']['draft']
+        self.assertEqual((requests['admitted'], requests['shed']), (2, 1))
+
+    def test_queued_bills_run_before_drafts(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=2)
+        controller.acquire(DRAFT_PRIORITY, timeout=0)
+
+        results = []
+        draft = self._queue_in_background(controller, DRAFT_PRIORITY, results)
+        self._wait_for_queue_depth(controller, 1)
+        bill = self._queue_in_background(controller, BILL_PRIORITY, results)
+        self._wait_for_queue_depth(controller, 2)
+
+        controller.release()
+        bill.join()
+        controller.release()
+        draft.join()
+        self.assertEqual(results, [(BILL_PRIORITY, True), (DRAFT_PRIORITY, True)])
+
+    def test_bill_evicts_queued_draft_when_full(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=1)
+        controller.acquire(DRAFT_PRIORITY, timeout=0)
+
+        results = []
+        draft = self._queue_in_background(controller, DRAFT_PRIORITY, results)
+        self._wait_for_queue_depth(controller, 1)
+        draft_shed = controller.acquire(DRAFT_PRIORITY, timeout=0)
+        bill = self._queue_in_background(controller, BILL_PRIORITY, results)
+        draft.join()
+        self.assertFalse(draft_shed)
+        self.assertEqual(results, [(DRAFT_PRIORITY, False)])
+
+        controller.release()
+        bill.join()
+        self.assertEqual(results[-1], (BILL_PRIORITY, True))
+
+    def test_queued_request_times_out(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=1)
+        controller.acquire(BILL_PRIORITY, timeout=0)
+        self.assertFalse(controller.acquire(BILL_PRIORITY, timeout=0.01))
+
+        snapshot = controller.snapshot()
+        self.assertEqual(snapshot['queue_depth'], 0)
+        self.assertEqual(snapshot['requests']['bill']['timed_out'], 1)
+
+    def test_async_requests_wait_on_the_event_loop(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=2)
+        controller.acquire(DRAFT_PRIORITY, timeout=0)
+
+        async def queue_and_release():
+            waiting = asyncio.ensure_future(controller.aacquire(BILL_PRIORITY, timeout=5))
+            timing_out = asyncio.ensure_future(controller.aacquire(DRAFT_PRIORITY, timeout=0.01))
+            while controller.snapshot()['queue_depth'] < 2:
+                await asyncio.sleep(0)
+            self.assertFalse(await timing_out)
+            # Released from another thread, as a finished sync view would
+            threading.Thread(target=controller.release).start()
+            return await waiting
+
+        self.assertTrue(asyncio.run(queue_and_release()))
+        requests = controller.snapshot()['requests']
+        self.assertEqual((requests['bill']['admitted'], requests['draft']['timed_out']), (1, 1))
+
+    def test_cancelled_async_request_leaves_the_queue(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=1)
+        controller.acquire(BILL_PRIORITY, timeout=0)
+
+        async def queue_and_cancel():
+            waiting = asyncio.ensure_future(controller.aacquire(BILL_PRIORITY, timeout=5))
+            while controller.snapshot()['queue_depth'] < 1:
+                await asyncio.sleep(0)
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+
+        asyncio.run(queue_and_cancel())
+        self.assertEqual(controller.snapshot()['queue_depth'], 0)
+        controller.release()
+        self.assertTrue(controller.acquire(BILL_PRIORITY, timeout=0))
+
+
+def _brute_force_fewest_notes(stock, amount):
+    """Smallest note count of any exact breakdown, or None."""
+    values = sorted(stock)
+    best = None
+    for counts in itertools.product(*(range(stock[value] + 1) for value in values)):
+        if sum(value * count for value, count in zip(values, counts)) == amount:
+            best = sum(counts) if best is None else min(best, sum(counts))
+    return best
+
+
+class PayloadTests(SimpleTestCase):
+
+    def assertRejected(self, payload_class, data, key='error'):
+        with self.assertRaises(PayloadError) as raised:
+            payload_class.parse(data)
+        self.assertIn(key, raised.exception.detail)
+        return raised.exception.detail
+
+    def test_draft_payload(self):
+        payload = DraftPayload.parse({'customer_email': ' ravi@example.com ', 'order_code': 'PO1',
+                                      'items': [{'product_code': 'P100', 'quantity': 2},
+                                                {'product_code': 'P200', 'quantity': 0}]})
+        self.assertEqual(payload.customer_email, 'ravi@example.com')
+        self.assertEqual(payload.order_code, 'PO1')
+        # Bad quantities are reported with the product name once it is known
+        self.assertEqual([(item.product_code, item.quantity) for item in payload.items],
+                         [('P100', 2), ('P200', None)])
+        self.assertIsNone(DraftPayload.parse({'customer_email': 'a@x.com', 'order_code': '',
+                                              'items': [{'product_code': 'P100', 'quantity': True}]}).order_code)
+
+    def test_draft_payload_rejects_missing_and_invalid_fields(self):
+        detail = self.assertRejected(DraftPayload, {'customer_email': '  ', 'items': []}, 'errors')
+        self.assertEqual(set(detail['errors']), {'customer_email', 'items'})
+        detail = self.assertRejected(DraftPayload, {'customer_email': 'not-an-email', 'items': 'P100'}, 'errors')
+        self.assertEqual(set(detail['errors']), {'customer_email', 'items'})
+        self.assertRejected(DraftPayload, {'customer_email': 'a@x.com', 'items': [{'quantity': 1}]}, 'errors')
+        self.assertRejected(DraftPayload, {'customer_email': 'a@x.com', 'items': [
+            {'product_code': 'P100', 'quantity': 1}, {'product_code': 'P100', 'quantity': 2}]})
+
+    def test_bill_payload(self):
+        payload = BillPayload.parse({'order_code': 1001, 'denominations': [{'value': 500, 'count': 2},
+                                                                           {'value': 10, 'count': 1}]})
+        self.assertEqual(payload.order_code, '1001')
+        self.assertEqual(payload.denominations, (Tender(500, 2), Tender(10, 1)))
+        self.assertEqual(payload.paid_amount, 1010)
+
+    def test_bill_payload_rejects_invalid_tenders(self):
+        self.assertRejected(BillPayload, {'denominations': [{'value': 10, 'count': 1}]})
+        self.assertRejected(BillPayload, {'order_code': 'PO1', 'denominations': []})
+        self.assertRejected(BillPayload, {'order_code': 'PO1', 'denominations': {'value': 10, 'count': 1}})
+        for tender in ({'value': 10, 'count': -1}, {'value': 10, 'count': 0}, {'value': 10, 'count': '2'},
+                       {'value': 10.5, 'count': 1}, {'value': 10, 'count': True}, {'value': 10}, 10):
+            with self.subTest(tender=tender):
+                self.assertRejected(BillPayload, {'order_code': 'PO1', 'denominations': [tender]})
+        self.assertRejected(BillPayload, {'order_code': 'PO1', 'denominations': [
+            {'value': 10, 'count': 1}, {'value': 10, 'count': 2}]})
+
+    def test_bill_payload_bounds_the_paid_amount(self):
+        below = BillPayload.parse({'order_code': 'PO1', 'denominations': [{'value': MAX_AMOUNT - 1, 'count': 1}]})
+        self.assertEqual(below.paid_amount, MAX_AMOUNT - 1)
+        self.assertRejected(BillPayload, {'order_code': 'PO1', 'denominations': [{'value': 500,
+                                                                                  'count': MAX_AMOUNT // 500}]})
+
+    def test_tender_suggestion_payload(self):
+        self.assertIsNone(TenderSuggestionPayload.parse({'order_code': 'PO1', 'available': []}).available)
+        payload = TenderSuggestionPayload.parse({'order_code': 'PO1', 'available': [{'value': 500, 'count': 1}]})
+        self.assertEqual(payload.available, (Tender(500, 1),))
+        self.assertRejected(TenderSuggestionPayload, {'available': [{'value': 500, 'count': 1}]})
+        self.assertRejected(TenderSuggestionPayload, {'order_code': 'PO1', 'available': {'value': 500}})
+
+
+class ChangeStrategyTests(SimpleTestCase):
+
+    def _random_cases(self, rng, iterations):
+        for _ in range(iterations):
+            values = rng.sample([1, 2, 5, 10, 20, 50, 100], rng.randint(1, 4))
+            yield {value: rng.randint(0, 4) for value in values}, rng.randint(0, 150)
+
+    def test_change_is_exact_and_within_stock(self):
+        rng = random.Random(1)
+        for stock, amount in self._random_cases(rng, 300):
+            feasible = _brute_force_fewest_notes(stock, amount) is not None
+            for name in CHANGE_STRATEGIES:
+                with self.subTest(strategy=name, stock=stock, amount=amount):
+                    change = get_change_strategy(name).make_change(stock, amount)
+                    self.assertEqual(change is not None, feasible)
+                    if change is not None:
+                        self.assertEqual(sum(value * count for value, count in change.items()), amount)
+                        self.assertTrue(all(0 < count <= stock[value] for value, count in change.items()))
+
+    def test_fewest_notes_is_optimal(self):
+        rng = random.Random(2)
+        for stock, amount in self._random_cases(rng, 300):
+            change = FewestNotesStrategy().make_change(stock, amount)
+            if change is not None:
+                with self.subTest(stock=stock, amount=amount):
+                    self.assertEqual(sum(change.values()), _brute_force_fewest_notes(stock, amount))
+
+    def test_fewest_notes_beats_first_greedy_solution(self):
+        stock = {50: 1, 20: 3, 2: 5}
+        self.assertEqual(get_change_strategy('greedy').make_change(stock, 60), {50: 1, 2: 5})
+        self.assertEqual(FewestNotesStrategy().make_change(stock, 60), {20: 3})
+
+    def test_preserve_scarce_spares_the_last_notes(self):
+        stock = {10: 1, 5: 20}
+        self.assertEqual(get_change_strategy('fewest_notes').make_change(stock, 10), {10: 1})
+        self.assertEqual(get_change_strategy('preserve_scarce').make_change(stock, 10), {5: 2})
+
+    def test_large_balances_are_paid_down_with_large_notes(self):
+        change = FewestNotesStrategy().make_change({500: 100, 1: 10}, 20003)
+        self.assertEqual(change, {500: 40, 1: 3})
+
+
+@override_settings(VALID_DENOMINATIONS=[1, 2, 5, 10, 20])
+class TenderSuggestionTests(SimpleTestCase):
+
+    def _brute_force(self, amount, till, wallet):
+        best = None
+        values = sorted(wallet)
+        for counts in itertools.product(*(range(wallet[value] + 1) for value in values)):
+            paid = sum(value * count for value, count in zip(values, counts))
+            # The search span is two of the largest denomination
+            if not amount <= paid <= amount + 40:
+                continue
+            change_notes = _brute_force_fewest_notes(till, paid - amount)
+            if change_notes is not None and (best is None or sum(counts) + change_notes < best):
+                best = sum(counts) + change_notes
+        return best
+
+    def test_fewest_notes_exchanged(self):
+        rng = random.Random(3)
+        for _ in range(200):
+            till = {value: rng.randint(0, 3) for value in rng.sample([1, 2, 5, 10, 20], 3)}
+            wallet = {value: rng.randint(0, 3) for value in rng.sample([1, 2, 5, 10, 20], 3)}
+            amount = rng.randint(1, 60)
+            with self.subTest(amount=amount, till=till, wallet=wallet):
+                suggestion = suggest_tender(amount, till, wallet)
+                expected = self._brute_force(amount, till, wallet)
+                self.assertEqual(suggestion is not None, expected is not None)
+                if suggestion is None:
+                    continue
+                paid = sum(value * count for value, count in suggestion.tender.items())
+                self.assertTrue(all(count <= wallet[value] for value, count in suggestion.tender.items()))
+                self.assertTrue(all(count <= till[value] for value, count in suggestion.change.items()))
+                self.assertEqual(sum(value * count for value, count in suggestion.change.items()), paid - amount)
+                self.assertEqual(sum(suggestion.tender.values()) + sum(suggestion.change.values()), expected)
+
+    def test_overpays_when_change_saves_notes(self):
+        # 18 exactly takes four notes, a 20 with a 2 back takes two
+        suggestion = suggest_tender(18, {2: 1}, None)
+        self.assertEqual(suggestion.tender, {20: 1})
+        self.assertEqual(suggestion.change, {2: 1})
+        self.assertEqual(suggest_tender(18, {}, None).tender, {10: 1, 5: 1, 2: 1, 1: 1})
+
+    def test_short_wallet_is_rejected_before_searching(self):
+        with mock.patch('apps.api.change._cheapest_table') as cheapest_table:
+            self.assertIsNone(suggest_tender(10 ** 9, {}, {500: 3, 100: 2}))
+        cheapest_table.assert_not_called()
+
+
+@override_settings(VALID_DENOMINATIONS=[1, 2, 5, 10, 20])
+class TenderSuggestionViewTests(TestCase):
+
+    def setUp(self):
+        Product.objects.create(code='P100', name='Lavender Soap', unit_price=18, tax_percentage=0, stock_quantity=5)
+        AmountDenomination.objects.create(value=2, available_count=1)
+        self.order_code = self.client.post('/api/calculate-total/', {
+            'customer_email': 'ravi@example.com', 'items': [{'product_code': 'P100', 'quantity': 1}],
+        }, content_type='application/json').json()['order_code']
+
+    def _suggest(self, data):
+        return self.client.post('/api/suggest-tender/', data, content_type='application/json')
+
+    def test_suggests_tender_and_change(self):
+        response = self._suggest({'order_code': self.order_code})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'order_code': self.order_code, 'total_amount': '18.00', 'paid_amount': 20, 'balance': '2.00',
+            'denominations': [{'value': 20, 'count': 1}], 'change': [{'value': 2, 'count': 1}],
+        })
+
+    def test_wallet_that_cannot_cover_the_amount(self):
+        response = self._suggest({'order_code': self.order_code, 'available': [{'value': 5, 'count': 3}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('exact change for 18', response.json()['error'])
+
+    def test_invalid_payloads(self):
+        for data in ({}, {'order_code': self.order_code, 'available': {'value': 5}},
+                     {'order_code': self.order_code, 'available': [{'value': 5, 'count': -1}]},
+                     {'order_code': self.order_code, 'available': [{'value': 50, 'count': 1}]}):
+            with self.subTest(data=data):
+                self.assertEqual(self._suggest(data).status_code, 400)
+        self.assertEqual(self._suggest({'order_code': 'PO-MISSING'}).status_code, 404)
+
+
+@override_settings(ADMISSION_CONTROL_ENABLED=True, ADMISSION_QUEUE_TIMEOUT=0, ADMISSION_RETRY_AFTER=3)
+class AdmissionControlMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = AdmissionControlMiddleware(lambda request: HttpResponse('ok'))
+
+    def test_overloaded_checkout_gets_503_with_retry_after(self):
+        with mock.patch('apps.api.middleware._controller', AdmissionController(max_concurrent=0, max_queue=0)):
+            response = self.middleware(self.factory.post('/api/generate-bill/'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+
+    def test_other_requests_bypass_the_limiter(self):
+        with mock.patch('apps.api.middleware._controller', AdmissionController(max_concurrent=0, max_queue=0)):
+            response = self.middleware(self.factory.get('/api/denominations-list/'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_async_chain(self):
+        async def get_response(request):
+            return HttpResponse('ok')
+
+        middleware = AdmissionControlMiddleware(get_response)
+        controller = AdmissionController(max_concurrent=1, max_queue=0)
+        with mock.patch('apps.api.middleware._controller', controller):
+            response = asyncio.run(middleware(self.factory.post('/api/generate-bill/')))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(controller.snapshot()['active'], 0)
+
+            controller.acquire(BILL_PRIORITY, timeout=0)
+            response = asyncio.run(middleware(self.factory.post('/api/generate-bill/')))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+
+    async def test_asgi_handler_uses_the_async_path(self):
+        controller = AdmissionController(max_concurrent=0, max_queue=0)
+        with mock.patch('apps.api.middleware._controller', controller), \
+                mock.patch.object(controller, 'acquire', side_effect=AssertionError('blocking acquire')):
+            response = await self.async_client.post('/api/generate-bill/', {}, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+
+    def test_metrics_view(self):
+        controller = AdmissionController(max_concurrent=0, max_queue=0)
+        with mock.patch('apps.api.middleware._controller', controller):
+            shed = self.client.post('/api/generate-bill/', {}, content_type='application/json')
+            response = self.client.get('/api/admission-metrics/')
+        self.assertEqual(shed.status_code, 503)
+        self.assertEqual(shed['Retry-After'], '3')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'active': 0,
+            'max_concurrent': 0,
+            'queue_depth': 0,
+            'queued': {'bill': 0, 'draft': 0},
+            'peak_queue_depth': 0,
+            'max_queue': 0,
+            'requests': {
+                'bill': {'admitted': 0, 'shed': 1, 'timed_out': 0},
+                'draft': {'admitted': 0, 'shed': 0, 'timed_out': 0},
+            },
+        })
+
+
+class DraftStoreTests(TestCase):
+
+    def setUp(self):
+        self.soap = Product.objects.create(code='P100', name='Lavender Soap', unit_price=Decimal('40'),
+                                           tax_percentage=Decimal('0'), stock_quantity=10)
+        self.rice = Product.objects.create(code='P200', name='Basmati Rice', unit_price=Decimal('120'),
+                                           tax_percentage=Decimal('5'), stock_quantity=10)
+        caches[settings.DRAFT_CACHE_ALIAS].clear()
+
+    def _data(self, *lines):
+        return {
+            'customer_email': 'Ravi@example.com',
+            'is_draft': True,
+            'items': [{'product': product, 'quantity': quantity, 'unit_price': product.unit_price,
+                       'tax_percentage': product.tax_percentage} for product, quantity in lines],
+        }
+
+    def _stores(self):
+        for store_class in (DatabaseDraftStore, CacheDraftStore):
+            with self.subTest(store=store_class.__name__):
+                yield store_class()
+
+    def test_save_load_and_finalize(self):
+        for store in self._stores():
+            draft = store.save(self._data((self.soap, 1)))
+            updated = store.save(self._data((self.soap, 2), (self.rice, 1)), order_code=draft.code)
+            self.assertEqual((updated.code, updated.total_amount), (draft.code, Decimal('206')))
+
+            order, items = store.load(draft.code)
+            self.assertEqual((order.code, order.total_amount), (draft.code, Decimal('206')))
+            self.assertEqual(sorted((item.product.code, item.quantity) for item in items),
+                             [('P100', 2), ('P200', 1)])
+
+            order = store.materialize(order, items)
+            settle_order(order, {'paid_amount': Decimal('206'), 'balance': Decimal('0'), 'paid': [], 'change': []})
+            store.discard(draft.code)
+
+            finalized = PurchaseOrder.objects.get(code=draft.code)
+            self.assertFalse(finalized.is_draft)
+            self.assertEqual(finalized.customer.email, 'ravi@example.com')
+            self.assertEqual(finalized.purchase_items.count(), 2)
+            self.assertIsNone(store.load(draft.code))
+
+    def test_unknown_drafts(self):
+        for store in self._stores():
+            self.assertIsNone(store.load('PO-MISSING'))
+            with self.assertRaises(DraftNotFound):
+                store.save(self._data((self.soap, 1)), order_code='PO-MISSING')
+
+    def test_failed_save_leaves_no_customer(self):
+        with mock.patch('apps.api.drafts.create_draft', side_effect=IntegrityError('items')):
+            with self.assertRaises(IntegrityError):
+                DatabaseDraftStore().save(self._data((self.soap, 1)))
+        self.assertFalse(Customer.all_objects.exists())
+
+    def test_cached_drafts_are_identified_by_code(self):
+        draft = CacheDraftStore().save(self._data((self.soap, 1)))
+        self.assertIsNone(draft.id)
+        self.assertTrue(draft.code)
+        self.assertFalse(Customer.all_objects.exists())
+
+    def test_database_draft_finalized_meanwhile_is_not_materialized(self):
+        store = DatabaseDraftStore()
+        order, items = store.load(store.save(self._data((self.soap, 1))).code)
+        PurchaseOrder.objects.filter(id=order.id).update(is_draft=False)
+        with self.assertRaises(DraftNotFound):
+            store.materialize(order, items)
+
+    def test_cached_draft_with_a_deleted_product_is_stale(self):
+        store = CacheDraftStore()
+        draft = store.save(self._data((self.soap, 1), (self.rice, 1)))
+        Product.all_objects.filter(id=self.rice.id).delete()
+        with self.assertRaises(StaleDraft):
+            store.load(draft.code)
+
+
+@mock.patch('apps.api.views.send_invoice_email')
+class GenerateBillTests(TestCase):
+
+    def setUp(self):
+        Product.objects.create(code='P100', name='Lavender Soap', unit_price=40, tax_percentage=0, stock_quantity=10)
+        self.first = self._draft()
+        self.second = self._draft()
+
+    def _draft(self):
+        response = self.client.post('/api/calculate-total/', {
+            'customer_email': 'ravi@example.com', 'items': [{'product_code': 'P100', 'quantity': 1}],
+        }, content_type='application/json')
+        return response.json()['order_code']
+
+    def _bill(self, order_code, key, denominations=({'value': 20, 'count': 2},)):
+        return self.client.post('/api/generate-bill/', {'order_code': order_code, 'denominations': list(denominations)},
+                                content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_stored_response(self, send_invoice_email):
+        first = self._bill(self.first, 'key-1')
+        self.assertEqual(first.status_code, 200)
+        self.assertFalse(first.has_header('Idempotent-Replayed'))
+
+        # Even with a body that no longer parses, the key decides
+        for retry in (self._bill(self.first, 'key-1'), self._bill(self.first, 'key-1', denominations=())):
+            self.assertEqual(retry.status_code, 200)
+            self.assertEqual(retry['Idempotent-Replayed'], 'true')
+            self.assertEqual(retry.json(), first.json())
+        self.assertEqual(send_invoice_email.call_count, 1)
+        self.assertEqual(DenominationDetail.objects.filter(purchase__code=self.first).count(), 1)
+
+    def test_key_reused_for_another_order_is_rejected(self, send_invoice_email):
+        self._bill(self.first, 'key-1')
+        response = self._bill(self.second, 'key-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertTrue(PurchaseOrder.objects.get(code=self.second).is_draft)
+
+    def test_concurrent_duplicate_replays_the_winner(self, send_invoice_email):
+        # The duplicate looked the key up and loaded the draft before the first request committed
+        stale_draft = DatabaseDraftStore().load(self.first)
+        first = self._bill(self.first, 'key-1')
+        with mock.patch.object(IdempotencyKey, 'lookup', side_effect=[None, IdempotencyKey.lookup('key-1')]), \
+                mock.patch.object(DatabaseDraftStore, 'load', return_value=stale_draft):
+            duplicate = self._bill(self.first, 'key-1')
+
+        self.assertEqual(duplicate.status_code, 200)
+        self.assertEqual(duplicate['Idempotent-Replayed'], 'true')
+        self.assertEqual(duplicate.json(), first.json())
+        self.assertEqual(Product.objects.get(code='P100').stock_quantity, 9)
+        self.assertEqual(AmountDenomination.objects.get(value=20).available_count, 2)
+
+    def test_lost_race_without_key_is_a_conflict(self, send_invoice_email):
+        stale_draft = DatabaseDraftStore().load(self.first)
+        self._bill(self.first, '')
+        with mock.patch.object(DatabaseDraftStore, 'load', return_value=stale_draft):
+            response = self._bill(self.first, '')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Product.objects.get(code='P100').stock_quantity, 9)
+
+    def test_other_integrity_errors_are_not_reported_as_not_found(self, send_invoice_email):
+        self.client.raise_request_exception = True
+        with mock.patch('apps.api.views.settle_order', side_effect=IntegrityError('CHECK constraint failed')):
+            with self.assertRaises(IntegrityError):
+                self._bill(self.first, 'key-1')
+
+    def test_deactivated_denomination_is_counted_not_recreated(self, send_invoice_email):
+        AmountDenomination.objects.create(value=20, available_count=3)
+        AmountDenomination.all_objects.filter(value=20).update(is_active=False)
+        self.assertEqual(self._bill(self.first, 'key-1').status_code, 200)
+        self.assertEqual(AmountDenomination.all_objects.get(value=20).available_count, 5)
+
+    def test_purge_removes_only_expired_keys(self, send_invoice_email):
+        self._bill(self.first, 'key-1')
+        self._bill(self.second, 'key-2')
+        IdempotencyKey.objects.filter(key='key-1').update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(IdempotencyKey.lookup('key-1'))
+
+        call_command('purge_idempotency_keys', stdout=io.StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['key-2'])
+
+
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.read_alias = read_from_replica(lambda request: self.router.db_for_read(PurchaseOrder))
+
+    def _with_replica(self, configured=True):
+        databases = {'default': settings.DATABASES['default']}
+        if configured:
+            databases[REPLICA_DB_ALIAS] = {**settings.DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+        with warnings.catch_warnings():
+            # Only the aliases are read here, no connection is opened to the overridden databases
+            warnings.simplefilter('ignore')
+            self.enterContext(override_settings(DATABASES=databases))
+
+    def test_reads_in_wrapped_views_go_to_the_replica(self):
+        self._with_replica()
+        self.assertEqual(self.read_alias(RequestFactory().get('/')), REPLICA_DB_ALIAS)
+        self.assertIsNone(self.router.db_for_read(PurchaseOrder))
+
+    def test_pinned_clients_read_from_the_primary(self):
+        self._with_replica()
+        request = RequestFactory().get('/')
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = '1'
+        self.assertIsNone(self.read_alias(request))
+
+        response = pin_to_primary(HttpResponse())
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual((cookie.value, cookie['max-age']), ('1', settings.REPLICA_PIN_SECONDS))
+
+    def test_writes_go_to_the_primary(self):
+        self._with_replica()
+        write_alias = read_from_replica(lambda request: self.router.db_for_write(PurchaseOrder))
+        self.assertEqual(write_alias(RequestFactory().get('/')), 'default')
+        self.assertEqual(self.router.db_for_write(PurchaseOrder), 'default')
+
+    def test_reads_pass_through_without_a_replica(self):
+        self._with_replica(configured=False)
+        self.assertIsNone(self.read_alias(RequestFactory().get('/')))
+
+
+class InvoiceTests(TestCase):
+
+    def setUp(self):
+        self.storage_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(INVOICE_STORAGE_DIR=self.storage_dir, INVOICE_RENDER_WORKERS=1))
+        self.order = PurchaseOrder(code='PO1001', customer_email='ravi@example.com', total_amount=Decimal('94.00'))
+        item = PurchaseItem(product=Product(code='P100', name='Lavender Soap'), quantity=2,
+                            unit_price=Decimal('40.00'), tax_percentage=Decimal('18.00'))
+        item.subtotal, item.tax_amount, item.total = item.get_subtotal(), item.get_tax_amount(), item.get_total()
+        self.items = [item]
+
+    def test_renders_in_the_pool_and_reuses_the_stored_invoice(self):
+        self.addCleanup(invoices._reset_executor)
+        invoice = invoices.get_invoice(self.order, self.items, [])
+        self.assertIn('PO1001', invoice.html)
+        self.assertIn('94.4000', invoice.html)
+
+        with mock.patch.object(invoices, '_render_in_pool') as render:
+            self.assertEqual(invoices.get_invoice(self.order, self.items, []).html, invoice.html)
+            render.assert_not_called()
+
+            # Re-rendering replaces the stored files instead of saving suffixed copies next to them
+            render.return_value = ('<p>updated</p>', b'%PDF')
+            invoices.get_invoice(self.order, self.items, [], refresh=True)
+            invoices.get_invoice(self.order, self.items, [], refresh=True)
+        self.assertEqual(sorted(os.listdir(self.storage_dir)), ['PO1001.html', 'PO1001.pdf'])
+        self.assertEqual(invoices.get_invoice(self.order, self.items, []), ('<p>updated</p>', b'%PDF'))
+
+    @override_settings(INVOICE_RENDER_TIMEOUT=0, INVOICE_RENDER_RETRY_AFTER=7)
+    def test_slow_render_is_a_503_with_retry_after(self):
+        executor = mock.Mock()
+        future = executor.submit.return_value
+        future.result.side_effect = FutureTimeoutError
+        with mock.patch.object(invoices, '_get_executor', return_value=(executor, threading.Semaphore())):
+            with self.assertRaises(invoices.InvoiceRenderTimeout):
+                invoices.get_invoice(self.order, self.items, [])
+            future.cancel.assert_called_once()
+
+            self.order.save()
+            response = self.client.get(f"/bill/{self.order.code}/invoice/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+        self.assertEqual(os.listdir(self.storage_dir), [])
+
+    @override_settings(INVOICE_RENDER_TIMEOUT=0)
+    def test_full_render_queue_times_out_without_submitting(self):
+        executor = mock.Mock()
+        with mock.patch.object(invoices, '_get_executor', return_value=(executor, threading.Semaphore(0))):
+            with self.assertRaises(invoices.InvoiceRenderTimeout):
+                invoices.get_invoice(self.order, self.items, [])
+        executor.submit.assert_not_called()
+
+
+# Sends in the request thread instead of a background thread, so the outcome can be asserted
+@mock.patch('apps.api.views.send_invoice_email', side_effect=_send_invoice)
+class ResendInvoiceTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(override_settings(INVOICE_STORAGE_DIR=self.enterContext(tempfile.TemporaryDirectory())))
+        soap = Product.objects.create(code='P100', name='Lavender Soap', unit_price=40, tax_percentage=18)
+        self.order = PurchaseOrder.objects.create(code='PO1001', customer_email='ravi@example.com',
+                                                  total_amount=Decimal('47'))
+        PurchaseItem.objects.create(purchase=self.order, product=soap, quantity=1, unit_price=40, tax_percentage=18)
+
+    def _resend(self, order_code):
+        return self.client.post('/api/resend-invoice/', {'order_code': order_code}, content_type='application/json')
+
+    def test_sends_the_stored_invoice(self, send_invoice_email):
+        with mock.patch.object(invoices, '_render_in_pool', return_value=('<p>PO1001</p>', b'%PDF')):
+            response = self._resend('PO1001')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual((mail.outbox[0].to, mail.outbox[0].body), (['ravi@example.com'], '<p>PO1001</p>'))
+        self.assertEqual(mail.outbox[0].attachments[0][0], 'invoice-PO1001.pdf')
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.invoice_sent)
+
+    def test_unknown_or_draft_orders(self, send_invoice_email):
+        PurchaseOrder.objects.create(code='PO1002', customer_email='ravi@example.com', is_draft=True)
+        self.assertEqual(self._resend('PO9999').status_code, 404)
+        self.assertEqual(self._resend('PO1002').status_code, 404)
+        self.assertEqual(self._resend('').status_code, 400)
+        send_invoice_email.assert_not_called()
+
+    @override_settings(INVOICE_RENDER_TIMEOUT=0)
+    def test_render_timeout_is_logged_and_sends_nothing(self, send_invoice_email):
+        executor = mock.Mock()
+        executor.submit.return_value.result.side_effect = FutureTimeoutError
+        with mock.patch.object(invoices, '_get_executor', return_value=(executor, threading.Semaphore())):
+            with self.assertLogs('apps.api.utils', logging.ERROR) as logs:
+                response = self._resend('PO1001')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(logs.records[0].getMessage(), 'invoice_email_failed')
+        self.assertEqual(mail.outbox, [])
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.invoice_sent)
+
+
+class CustomerStatsViewTests(TestCase):
+
+    def setUp(self):
+        self.first_purchase_at = timezone.now() - timedelta(days=30)
+        CustomerStats.objects.create(customer=Customer.for_email('ravi@example.com'), order_count=2,
+                                     lifetime_spend=Decimal('220.00'), first_purchase_at=self.first_purchase_at,
+                                     last_purchase_at=timezone.now())
+
+    def _stats(self, email):
+        return self.client.get('/api/customer-stats/', {'email': email})
+
+    def test_known_customer(self):
+        response = self._stats('ravi@example.com')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['customer_email'], 'ravi@example.com')
+        self.assertEqual((response.data['order_count'], response.data['lifetime_spend']), (2, '220.00'))
+        self.assertEqual(response.data['first_purchase_at'], self.first_purchase_at)
+
+    def test_email_is_case_folded(self):
+        response = self._stats('  Ravi@Example.COM ')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['customer_email'], 'ravi@example.com')
+
+    def test_unknown_or_missing_email(self):
+        Customer.for_email('asha@example.com')
+        self.assertEqual(self._stats('nobody@example.com').status_code, 404)
+        # A customer whose bills were never finalized has no stats either
+        self.assertEqual(self._stats('asha@example.com').status_code, 404)
+        self.assertEqual(self._stats('').status_code, 400)
+
+
+class TillEventsTests(TestCase):
+
+    def setUp(self):
+        self.subscriber = events._QueueSubscriber(size=2)
+        events.broker.subscribe(self.subscriber)
+        self.addCleanup(events.broker.unsubscribe, self.subscriber)
+
+    def test_changes_are_published_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            events.publish_till_changes('PO1', {500: 1, 100: -2, 50: 0}, {'P001': -3})
+            self.assertIsNone(self.subscriber.get(timeout=0))
+        self.assertEqual(len(callbacks), 1)
+
+        message = self.subscriber.get(timeout=0).decode()
+        self.assertIn('event: till', message)
+        self.assertIn('"denominations": [{"value": 500, "delta": 1}, {"value": 100, "delta": -2}]', message)
+        self.assertIn('"products": [{"code": "P001", "delta": -3}]', message)
+
+    def test_stream_opens_with_a_snapshot(self):
+        AmountDenomination.objects.create(value=500, available_count=2)
+        # The stream closes its thread's connection after each snapshot, which would end the test transaction
+        with mock.patch('apps.api.events.connection'):
+            response = self.client.get('/api/till-events/')
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            self.assertEqual(response['Cache-Control'], 'no-cache')
+            first_event = next(iter(response.streaming_content)).decode()
+        response.close()
+
+        self.assertTrue(first_event.startswith('event: snapshot\n'))
+        self.assertIn('{"value": 500, "available_count": 2}', first_event)
+        # Closing the response ends the stream and its subscription
+        self.assertEqual(events.broker._subscribers, {self.subscriber})
+
+    def test_slow_subscriber_is_flagged_for_resync(self):
+        for _ in range(3):
+            events.broker.publish('till', {})
+        self.assertTrue(self.subscriber.overflowed)
+        self.subscriber.clear()
+        self.assertFalse(self.subscriber.overflowed)
+        self.assertIsNone(self.subscriber.get(timeout=0))
+
+
+class TillReconciliationViewTests(TestCase):
+
+    def setUp(self):
+        self.note = AmountDenomination.objects.create(value=500, available_count=2)
+        self.coin = AmountDenomination.objects.create(value=10, available_count=5)
+
+    def _tender(self, denomination, count, type):
+        order = PurchaseOrder.objects.create(customer_email='ravi@example.com')
+        return DenominationDetail.objects.create(purchase=order, denomination=denomination, count=count, type=type)
+
+    def _reconcile(self, at=None):
+        return self.client.get('/api/till-reconciliation/', {'at': at} if at else {})
+
+    def test_counts_are_the_snapshot_plus_tenders_after_its_high_water_mark(self):
+        # Already in the snapshot's counts, must not be added again even though it is timestamped later
+        self._tender(self.note, 9, DenominationDetail.PAID)
+        snapshot = take_snapshot()
+        DenominationDetail.objects.update(created_on=snapshot.taken_at + timedelta(seconds=1))
+        self._tender(self.note, 1, DenominationDetail.PAID)
+        self._tender(self.coin, 3, DenominationDetail.BALANCE)
+
+        response = self._reconcile()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['snapshot']['id'], snapshot.id)
+        self.assertEqual(response.data['deltas_scanned'], 2)
+        self.assertEqual(response.data['denominations'], [{'value': 500, 'count': 3}, {'value': 10, 'count': 2}])
+        self.assertEqual(response.data['total_value'], 1520)
+
+    def test_naive_and_invalid_datetimes(self):
+        snapshot = take_snapshot()
+        at = timezone.localtime(snapshot.taken_at + timedelta(minutes=1)).replace(tzinfo=None).isoformat()
+        self.assertEqual(self._reconcile(at).data['snapshot']['id'], snapshot.id)
+        self.assertEqual(self._reconcile('yesterday').status_code, 400)
+
+    def test_no_snapshot_yet(self):
+        response = self._reconcile()
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('No till snapshot', response.data['error'])
+
+        TillSnapshot.objects.create(taken_at=timezone.now(), counts={})
+        self.assertEqual(self._reconcile((timezone.now() - timedelta(days=1)).isoformat()).status_code, 404)
+
+
+class OrderSearchViewTests(TestCase):
+
+    def setUp(self):
+        soap = Product.objects.create(code='P100', name='Lavender Soap', unit_price=40, tax_percentage=18)
+        order = PurchaseOrder.objects.create(code='PO1001', customer_email='asha@example.com', is_draft=False,
+                                             total_amount=Decimal('47.00'))
+        index_order(order, [PurchaseItem.objects.create(purchase=order, product=soap, quantity=1, unit_price=40,
+                                                        tax_percentage=18)])
+        self.staff = User.objects.create_user('support', password='secret', is_staff=True)
+
+    def _search(self, **params):
+        return self.client.get('/api/order-search/', params)
+
+    def test_staff_find_orders(self):
+        self.client.force_login(self.staff)
+        response = self._search(q='asha soap')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data'], [{
+            'code': 'PO1001', 'customer_email': 'asha@example.com',
+            'purchase_date': PurchaseOrder.objects.get(code='PO1001').purchase_date, 'total_amount': '47.00',
+        }])
+
+        self.assertEqual(self._search(q='ravi').data['data'], [])
+        self.assertEqual(self._search(q='').status_code, 400)
+        self.assertEqual(self._search(q='asha', limit='x').status_code, 400)
+
+    def test_basic_auth(self):
+        response = self.client.get('/api/order-search/', {'q': 'asha'},
+                                   HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'support:secret').decode())
+        self.assertEqual(len(response.data['data']), 1)
+
+    def test_forbidden_without_staff(self):
+        self.assertEqual(self._search(q='a').status_code, 403)
+        self.client.force_login(User.objects.create_user('cashier', password='secret'))
+        self.assertEqual(self._search(q='a').status_code, 403)
+
+
+@override_settings(ORDER_FEED_SETTLE_SECONDS=0)
+class OrderFeedTests(TestCase):
+
+    def setUp(self):
+        soap = Product.objects.create(code='P100', name='Lavender Soap', unit_price=40, tax_percentage=18)
+        note = AmountDenomination.objects.create(value=100, available_count=5)
+        self.codes = []
+        for number in range(3):
+            order = PurchaseOrder.objects.create(code=f"PO{number}", customer_email='ravi@example.com',
+                                                 is_draft=False, total_amount=Decimal('47.20'))
+            PurchaseItem.objects.create(purchase=order, product=soap, quantity=1, unit_price=soap.unit_price,
+                                        tax_percentage=soap.tax_percentage)
+            DenominationDetail.objects.create(purchase=order, denomination=note, count=1,
+                                              type=DenominationDetail.PAID)
+            with self.captureOnCommitCallbacks(execute=True):
+                append_to_feed(order)
+            self.codes.append(order.code)
+        # Drafts never enter the feed
+        PurchaseOrder.objects.create(code='PO-DRAFT', customer_email='ravi@example.com', is_draft=True)
+        self.client.force_login(User.objects.create_user('sync', password='secret', is_staff=True))
+
+    def _page(self, **params):
+        response = self.client.get('/api/order-feed/', params)
+        lines = [json.loads(line) for line in response.content.decode().splitlines()]
+        return response, lines
+
+    def test_pages_follow_the_cursor(self):
+        response, lines = self._page(limit=2)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([line['order']['code'] for line in lines], self.codes[:2])
+        self.assertEqual(response['X-Has-More'], 'true')
+        self.assertEqual(response['X-Next-Cursor'], str(lines[-1]['cursor']))
+        self.assertEqual(lines[0]['order']['items'][0]['product_code'], 'P100')
+        self.assertEqual(lines[0]['order']['denominations'][0]['value'], 100)
+
+        response, lines = self._page(after=response['X-Next-Cursor'], limit=2)
+        self.assertEqual([line['order']['code'] for line in lines], self.codes[2:])
+        self.assertEqual(response['X-Has-More'], 'false')
+
+        # Caught up: an empty page keeps the cursor where it was
+        cursor = response['X-Next-Cursor']
+        response, lines = self._page(after=cursor)
+        self.assertEqual(lines, [])
+        self.assertEqual(response['X-Next-Cursor'], cursor)
+
+    def test_rejects_invalid_cursor_and_limit(self):
+        for params in ({'after': 'x'}, {'after': -1}, {'limit': 0}):
+            response, _ = self._page(**params)
+            self.assertEqual(response.status_code, 400)
+
+    def test_forbidden_without_staff(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/order-feed/').status_code, 403)
+        self.client.force_login(User.objects.create_user('cashier', password='secret'))
+        self.assertEqual(self.client.get('/api/order-feed/').status_code, 403)
+
+    def test_append_waits_for_commit(self):
+        order = PurchaseOrder.objects.create(code='PO9', customer_email='ravi@example.com', is_draft=False)
+        with self.captureOnCommitCallbacks() as callbacks:
+            append_to_feed(order)
+        self.assertFalse(OrderFeedEntry.objects.filter(order=order).exists())
+
+        for callback in callbacks:
+            callback()
+        _, lines = self._page()
+        self.assertEqual(lines[-1]['order']['code'], 'PO9')
+
+    @override_settings(ORDER_FEED_SETTLE_SECONDS=60)
+    def test_fresh_entries_are_held_back(self):
+        response, lines = self._page()
+        self.assertEqual(lines, [])
+        self.assertEqual(response['X-Next-Cursor'], '0')
+
+        OrderFeedEntry.objects.update(created_on=timezone.now() - timedelta(minutes=5))
+        _, lines = self._page()
+        self.assertEqual([line['order']['code'] for line in lines], self.codes)
+
+    def test_backfill_appends_missing_orders(self):
+        OrderFeedEntry.objects.filter(order__code='PO1').delete()
+        output = io.StringIO()
+        call_command('backfill_order_feed', stdout=output)
+        self.assertIn('Appended 1 orders', output.getvalue())
+        _, lines = self._page()
+        self.assertEqual([line['order']['code'] for line in lines], ['PO0', 'PO2', 'PO1'])
+
+
+class StartupBenchmarkTests(SimpleTestCase):
+
+    def test_import_time_is_summed_per_top_level_package(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     numpy._core\n'
+            'import time:       300 |        420 |   numpy\n'
+            'import time:        50 |        470 | apps.billing.totals\n'
+            'unrelated warning\n'
+        )
+        self.assertEqual(parse_importtime(output), {'numpy': 420, 'apps': 50})
+
+
+class ProfilingTests(TestCase):
+    MAIN = ('billing.py', 1, 'main')
+    TOTALS = ('billing.py', 2, 'totals')
+    SLEEP = ('~', 0, '<built-in method time.sleep>')
+
+    def setUp(self):
+        self.directory = Path(self.enterContext(tempfile.TemporaryDirectory()))
+
+    def test_collapsed_stacks_split_time_across_callers(self):
+        # (primitive calls, calls, own time, cumulative time, callers with the time spent under each caller)
+        stats = mock.Mock(stats={
+            self.MAIN: (1, 1, 0.2, 0.9, {}),
+            self.TOTALS: (1, 1, 0.4, 0.6, {self.MAIN: (1, 1, 0.4, 0.6)}),
+            self.SLEEP: (2, 2, 0.3, 0.3, {self.MAIN: (1, 1, 0.1, 0.1), self.TOTALS: (1, 1, 0.2, 0.2)}),
+        })
+        self.assertEqual(sorted(collapsed_stacks(stats)), [
+            'main (billing.py:1) 200000',
+            'main (billing.py:1);<built-in method time.sleep> 100000',
+            'main (billing.py:1);totals (billing.py:2) 400000',
+            'main (billing.py:1);totals (billing.py:2);<built-in method time.sleep> 200000',
+        ])
+
+    def test_prune_keeps_newest_profiles_within_max_age(self):
+        now = time.time()
+        for number, age in enumerate((10, 20, 30, 40, 3 * 86400)):
+            for suffix in ('.pstats', '.collapsed'):
+                path = self.directory / f"profile-{number}{suffix}"
+                path.touch()
+                os.utime(path, (now - age, now - age))
+
+        prune_profiles(self.directory, max_files=3, max_age=86400)
+        self.assertEqual(sorted(path.name for path in self.directory.iterdir()), [
+            'profile-0.collapsed', 'profile-0.pstats', 'profile-1.collapsed', 'profile-1.pstats',
+            'profile-2.collapsed', 'profile-2.pstats',
+        ])
+
+        prune_profiles(self.directory, max_files=3, max_age=15)
+        self.assertEqual(sorted(path.name for path in self.directory.iterdir()),
+                         ['profile-0.collapsed', 'profile-0.pstats'])
+
+    def _profile_settings(self):
+        return override_settings(PROFILING_ENABLED=True, PROFILING_TOKEN='secret', PROFILING_DIR=str(self.directory))
+
+    def _assert_profiled(self, response):
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+        self.assertIn('-denomination-list-', profile_id)
+        self.assertTrue((self.directory / f"{profile_id}.pstats").exists())
+        self.assertIn(';dispatch (views.py:', (self.directory / f"{profile_id}.collapsed").read_text())
+
+    def test_middleware_profiles_opted_in_requests(self):
+        self.enterContext(self._profile_settings())
+
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/denominations-list/'))
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/denominations-list/', HTTP_X_PROFILE='wrong'))
+        self._assert_profiled(self.client.get('/api/denominations-list/', HTTP_X_PROFILE='secret'))
+
+    async def test_middleware_profiles_under_asgi(self):
+        with self._profile_settings():
+            response = await self.async_client.get('/api/denominations-list/', headers={'X-Profile': 'secret'})
+        self._assert_profiled(response)
+
+
+class StructuredLoggingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = Path(self.enterContext(tempfile.TemporaryDirectory())) / 'logs'
+
+    def _handler(self):
+        handler = QueueListenerHandler(str(self.directory / 'billing.log'), max_bytes=10 ** 6, backup_count=1,
+                                       queue_size=10)
+        self.addCleanup(handler.close)
+        return handler
+
+    def test_handler_starts_on_the_first_record(self):
+        handler = self._handler()
+        self.assertFalse(self.directory.exists())
+        self.assertIsNone(handler.listener._thread)
+
+        handler.handle(logging.makeLogRecord({'name': 'apps.tests', 'levelno': logging.INFO, 'msg': 'started'}))
+        handler.close()
+        self.assertEqual(json.loads((self.directory / 'billing.log').read_text())['message'], 'started')
+
+    def test_records_are_written_as_json_lines(self):
+        handler = self._handler()
+        logger = logging.getLogger('apps.tests.structured')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        self.addCleanup(setattr, logger, 'propagate', logger.propagate)
+        logger.propagate = False
+
+        logger.warning('generate_bill %s', 'done', extra={'order_code': 'PO1', 'duration_ms': 1.5})
+        try:
+            raise ValueError('smtp down')
+        except ValueError:
+            logger.exception('invoice_email_failed', extra={'order_code': 'PO1'})
+        handler.close()
+
+        first, second = [json.loads(line) for line in (self.directory / 'billing.log').read_text().splitlines()]
+        self.assertEqual(first['message'], 'generate_bill done')
+        self.assertEqual((first['order_code'], first['duration_ms']), ('PO1', 1.5))
+        self.assertEqual(second['level'], 'ERROR')
+        self.assertIn('ValueError: smtp down', second['exception'])
@@ -1,9 +1,21 @@
 from django.urls import path
 
-from apps.api.views import AmountDenominationListView, CalculateTotalView, GenerateBillView
+from apps.api.views import (
+    AdmissionMetricsView, AmountDenominationListView, CalculateTotalView, CustomerStatsView, GenerateBillView,
+    OrderFeedView, OrderSearchView, ResendInvoiceView, TenderSuggestionView, TillEventsView,
+    TillReconciliationView,
+)
 
 urlpatterns = [
     path('denominations-list/', AmountDenominationListView.as_view(), name='denomination-list'),
+    path('customer-stats/', CustomerStatsView.as_view(), name='customer-stats'),
+    path('order-search/', OrderSearchView.as_view(), name='order-search'),
+    path('order-feed/', OrderFeedView.as_view(), name='order-feed'),
     path('calculate-total/', CalculateTotalView.as_view(), name='calculate-total'),
+    path('suggest-tender/', TenderSuggestionView.as_view(), name='suggest-tender'),
     path('generate-bill/', GenerateBillView.as_view(), name='generate-bill'),
+    path('admission-metrics/', AdmissionMetricsView.as_view(), name='admission-metrics'),
+    path('till-reconciliation/', TillReconciliationView.as_view(), name='till-reconciliation'),
+    path('till-events/', TillEventsView.as_view(), name='till-events'),
+    path('resend-invoice/', ResendInvoiceView.as_view(), name='resend-invoice'),
 ]
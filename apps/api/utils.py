@@ -1,64 +1,36 @@
+import logging
 import threading
+import time
 from decimal import Decimal
 
+from django.conf import settings
 from django.core.mail import EmailMessage
-from django.template.loader import render_to_string
 from django.utils import timezone
 
+from apps.api.change import get_change_strategy
+from apps.api.invoices import get_invoice
 from apps.billing.models import AmountDenomination
-from core.settings import VALID_DENOMINATIONS, SERVER_EMAIL
 
-
-def _find_change(denominations, amount):
-    result = []
-
-    def calculate_possibilities(index, remaining):
-        if remaining == 0:
-            return True
-
-        if index >= len(denominations):
-            return False
-
-        value, available, denom_id = denominations[index]
-        max_use = min(remaining // value, available)
-
-        for use_count in range(max_use, -1, -1):
-            if use_count > 0:
-                result.append({
-                    'denomination_id': denom_id,
-                    'value': value,
-                    'count': use_count,
-                })
-
-            if calculate_possibilities(index + 1, remaining - (value * use_count)):
-                return True
-
-            if use_count > 0:
-                result.pop()
-
-        return False
-
-    if calculate_possibilities(0, amount):
-        return result
-    return None
+logger = logging.getLogger(__name__)
 
 
 def validate_balance_possible(order_instance, paid_denomination_data):
     """
     Checks if the shop can return exact change using available denominations.
+    ``paid_denomination_data`` is a sequence of ``apps.api.payloads.Tender``.
     """
     # Validate denomination values against allowed list
-    invalid_values = [item['value'] for item in paid_denomination_data if item['value'] not in VALID_DENOMINATIONS]
+    invalid_values = [item.value for item in paid_denomination_data if item.value not in settings.VALID_DENOMINATIONS]
     if invalid_values:
         return {
             'success': False,
             'message': (
                 f"Invalid denomination values: {', '.join(map(str, invalid_values))}. "
-                f"Valid denominations: {', '.join(map(str, sorted(VALID_DENOMINATIONS, reverse=True)))}"
+                f"Valid denominations: {', '.join(map(str, sorted(settings.VALID_DENOMINATIONS, reverse=True)))}"
             ),
         }
 
-    paid_amount = sum(item['value'] * item['count'] for item in paid_denomination_data)
+    paid_amount = sum(item.value * item.count for item in paid_denomination_data)
     paid_amount = Decimal(str(paid_amount))
     order_total = order_instance.total_amount
 
@@ -77,11 +49,11 @@ def validate_balance_possible(order_instance, paid_denomination_data):
     denom_map = {d.value: d for d in available_denoms}
     paid_details = []
     for item in paid_denomination_data:
-        denom = denom_map.get(item['value'])
+        denom = denom_map.get(item.value)
         paid_details.append({
             'denomination_id': denom.id if denom else None,
-            'value': item['value'],
-            'count': item['count'],
+            'value': item.value,
+            'count': item.count,
         })
 
     if balance == 0:
@@ -94,7 +66,7 @@ def validate_balance_possible(order_instance, paid_denomination_data):
         }
 
     # Build working stock: shop's current stock + customer's paid cash
-    paid_by_value = {item['value']: item['count'] for item in paid_denomination_data}
+    paid_by_value = {item.value: item.count for item in paid_denomination_data}
     working_stock = {}
 
     for denom in available_denoms:
@@ -105,21 +77,16 @@ def validate_balance_possible(order_instance, paid_denomination_data):
         if value not in working_stock:
             working_stock[value] = count
 
-    denom_list = [
-        (value, stock, denom_map[value].id if value in denom_map else None)
-        for value, stock in sorted(working_stock.items(), reverse=True)
-        if stock > 0
-    ]
-
-    change_breakdown = _find_change(denom_list, int(balance))
+    strategy = get_change_strategy()
+    change = strategy.make_change(working_stock, int(balance))
 
-    if change_breakdown is None:
+    if change is None:
         min_value = min(working_stock.keys()) if working_stock else 0
         suggestion = None
 
         for extra in range(1, min_value + 1):
             new_balance = int(balance) + extra
-            if _find_change(denom_list, new_balance) is not None:
+            if strategy.make_change(working_stock, new_balance) is not None:
                 suggestion = extra
                 break
 
@@ -146,12 +113,19 @@ def validate_balance_possible(order_instance, paid_denomination_data):
         'paid_amount': paid_amount,
         'balance': balance,
         'paid': paid_details,
-        'change': change_breakdown,
+        'change': [
+            {
+                'denomination_id': denom_map[value].id if value in denom_map else None,
+                'value': value,
+                'count': count,
+            }
+            for value, count in sorted(change.items(), reverse=True)
+        ],
     }
 
 
 def _send_invoice(order):
-    """Renders HTML invoice template and sends as email."""
+    """Renders (or reuses) the stored invoice and sends it as email with the PDF attached."""
     items = order.purchase_items.select_related('product').all()
     change_details = order.denomination_details.filter(
         type='balance'
@@ -163,31 +137,35 @@ def _send_invoice(order):
         item.tax_amount = item.get_tax_amount()
         item.total = item.get_total()
 
-    html_content = render_to_string(
-        'email/order/invoice_notification.html',
-        {
-            'recipient_name': order.customer_email,
-            'order': order,
-            'items': items,
-            'change_details': change_details,
-        },
-    )
-
+    started = time.perf_counter()
     try:
+        invoice = get_invoice(order, items, change_details)
+
         email = EmailMessage(
             subject=f"Invoice - Order #{order.code}",
-            body=html_content,
-            from_email=SERVER_EMAIL,
+            body=invoice.html,
+            from_email=settings.SERVER_EMAIL,
             to=[order.customer_email],
         )
         email.content_subtype = 'html'
+        if invoice.pdf:
+            email.attach(f"invoice-{order.code}.pdf", invoice.pdf, 'application/pdf')
         email.send(fail_silently=False)
 
         order.invoice_sent = True
         order.invoice_sent_at = timezone.now()
         order.save(update_fields=['invoice_sent', 'invoice_sent_at'])
-    except Exception as e:
-        print(str(e))
+    except Exception:
+        logger.exception('invoice_email_failed', extra={
+            'order_code': order.code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+        })
+    else:
+        logger.info('invoice_email_sent', extra={
+            'order_code': order.code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            'pdf_attached': bool(invoice.pdf),
+        })
 
 
 def send_invoice_email(order):
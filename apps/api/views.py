@@ -1,50 +1,238 @@
-from django.db import transaction
+import json
+import logging
+import math
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.decorators import method_decorator
+from django.views import View
 from rest_framework import status
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from apps.api.serializers import PurchaseOrderCreateSerializer, GenerateBillSerializer
+from apps.api.change import suggest_tender
+from apps.api.checkout import settle_order
+from apps.api.drafts import DraftNotFound, StaleDraft, get_draft_store
+from apps.api.events import astream_events, stream_events
+from apps.api.middleware import get_admission_controller
+from apps.api.models import IdempotencyKey
+from apps.api.payloads import BillPayload, DraftPayload, PayloadError, TenderSuggestionPayload
 from apps.api.utils import validate_balance_possible, send_invoice_email
-from apps.billing.models import Product, PurchaseOrder
-from core.settings import VALID_DENOMINATIONS
+from apps.billing.archive import order_record
+from apps.billing.feed import append_to_feed, read_feed
+from apps.billing.models import AmountDenomination, Customer, CustomerStats, Product, PurchaseOrder
+from apps.billing.search import DEFAULT_LIMIT, search_orders
+from apps.billing.till import ReconciliationError, till_at
+from core.log import log_request
+from core.routers import pin_to_primary, read_from_replica
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
 
 # List and Retrieve API's for data preload
 
 class AmountDenominationListView(APIView):
     def get(self, request):
-        return Response({'data': sorted(VALID_DENOMINATIONS, reverse=True)}, status=status.HTTP_200_OK)
-
+        return Response({'data': sorted(settings.VALID_DENOMINATIONS, reverse=True)}, status=status.HTTP_200_OK)
 
-# Process Flow API's
 
-class CalculateTotalView(APIView):
+class AdmissionMetricsView(APIView):
     """
-    Validates stock, creates a draft order with current prices, and returns calculated totals.
+    Returns this process's checkout admission metrics: running and queued requests, and admitted,
+    shed and timed out counts per request class.
     """
 
-    def post(self, request):
-        customer_email = request.data.get('customer_email', '').strip()
-        items_data = request.data.get('items', [])
-        errors = {}
+    def get(self, request):
+        return Response(get_admission_controller().snapshot(), status=status.HTTP_200_OK)
 
-        if not customer_email:
-            errors['customer_email'] = 'Customer email is required.'
 
-        if not items_data:
-            errors['items'] = 'At least one item is required.'
+class TillEventsView(View):
+    """
+    Server-Sent Events stream of till and stock levels: a ``snapshot`` event, then one ``till`` event
+    with the denomination and stock deltas of every bill this process finalizes. A plain Django view,
+    the stream needs none of DRF's request parsing or content negotiation.
+    """
 
-        if errors:
-            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+    def get(self, request):
+        # Async iterators only stream under ASGI, WSGI servers need a blocking one
+        stream = astream_events() if isinstance(request, ASGIRequest) else stream_events()
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # GZipMiddleware only flushes when its buffer fills, which would hold events back; it skips encoded responses
+        response['Content-Encoding'] = 'identity'
+        # Stops nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+@method_decorator(read_from_replica, name='get')
+class CustomerStatsView(APIView):
+    """
+    Returns a customer's lifetime stats, maintained when bills are finalized.
+    """
+
+    def get(self, request):
+        email = request.query_params.get('email', '').strip()
+
+        if not email:
+            return Response({'error': 'Customer email is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Check for duplicate product codes in request
-        product_codes = [item.get('product_code') for item in items_data]
-        if len(product_codes) != len(set(product_codes)):
+        stats = CustomerStats.objects.select_related('customer').filter(
+            customer__email=Customer.normalize_email(email)
+        ).first()
+        if not stats:
             return Response(
-                {'error': 'Duplicate product entries found. Adjust quantity instead.'},
-                status=status.HTTP_400_BAD_REQUEST,
+                {'error': f"No completed orders found for '{email}'."},
+                status=status.HTTP_404_NOT_FOUND,
             )
 
-        products = Product.objects.filter(code__in=product_codes)
+        return Response(
+            {
+                'customer_email': stats.customer.email,
+                'order_count': stats.order_count,
+                'lifetime_spend': str(stats.lifetime_spend),
+                'first_purchase_at': stats.first_purchase_at,
+                'last_purchase_at': stats.last_purchase_at,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class TillReconciliationView(APIView):
+    """
+    Returns the till counts at ``?at=<ISO datetime>`` (default now), rebuilt from the nearest earlier
+    till snapshot and the tenders recorded since.
+    """
+
+    def get(self, request):
+        at = request.query_params.get('at', '').strip()
+        if at:
+            moment = parse_datetime(at)
+            if moment is None:
+                return Response({'error': f"Invalid datetime '{at}'."}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+        else:
+            moment = timezone.now()
+
+        try:
+            state = till_at(moment)
+        except ReconciliationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(
+            {
+                'at': state.at,
+                'snapshot': {
+                    'id': state.snapshot.id,
+                    'taken_at': state.snapshot.taken_at,
+                    'kind': state.snapshot.kind,
+                },
+                'deltas_scanned': state.deltas_scanned,
+                'denominations': [{'value': value, 'count': count}
+                                  for value, count in sorted(state.counts.items(), reverse=True)],
+                'total_value': sum(value * count for value, count in state.counts.items()),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+@method_decorator(read_from_replica, name='get')
+class OrderSearchView(APIView):
+    """
+    Finds finalized orders for support. Every term of ``?q=`` must appear in the order code, customer
+    email or a product code or name, or equal the order amount. Newest first, up to ``?limit=``.
+    Staff only: partial matches would otherwise let anyone enumerate customer emails.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'Search query is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            return Response({'error': 'Limit must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit <= 0:
+            return Response({'error': 'Limit must be positive.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {
+                'data': [
+                    {
+                        'code': document.order.code,
+                        'customer_email': document.order.customer_email,
+                        'purchase_date': document.purchase_date,
+                        'total_amount': str(document.total_amount),
+                    }
+                    for document in search_orders(query, limit)
+                ],
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+@method_decorator(read_from_replica, name='get')
+class OrderFeedView(APIView):
+    """
+    Finalized orders with their items and denominations, oldest first, after the cursor ``?after=`` as
+    newline-delimited JSON. Pass the ``X-Next-Cursor`` of a page as ``after`` to get the next one, an
+    empty page means the consumer is caught up. Staff only, the records carry customer emails.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            after = int(request.query_params.get('after', 0))
+            limit = int(request.query_params.get('limit', settings.ORDER_FEED_PAGE_SIZE))
+        except ValueError:
+            return Response({'error': 'Cursor and limit must be numbers.'}, status=status.HTTP_400_BAD_REQUEST)
+        if after < 0:
+            return Response({'error': 'Cursor must not be negative.'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit <= 0:
+            return Response({'error': 'Limit must be positive.'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(limit, settings.ORDER_FEED_MAX_PAGE_SIZE)
+
+        # One more than asked for tells whether another page follows
+        entries = read_feed(after, limit + 1)
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        response = HttpResponse(
+            ''.join(json.dumps({'cursor': entry.id, 'order': order_record(entry.order)}, separators=(',', ':'))
+                    + '\n' for entry in entries),
+            content_type='application/x-ndjson',
+        )
+        response['X-Next-Cursor'] = str(entries[-1].id if entries else after)
+        response['X-Has-More'] = 'true' if has_more else 'false'
+        return response
+
+
+# Process Flow API's
+
+@method_decorator(log_request('calculate_total', logger), name='post')
+class CalculateTotalView(APIView):
+    """
+    Validates stock, creates a draft order with current prices, and returns calculated totals.
+    ``order_id`` is null with the cache draft backend, drafts are identified by ``order_code``.
+    """
+
+    def post(self, request):
+        try:
+            payload = DraftPayload.parse(request.data)
+        except PayloadError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
+        product_codes = [item.product_code for item in payload.items]
+        products = Product.objects.with_available_stock().filter(code__in=product_codes)
         product_map = {p.code: p for p in products}
         missing_codes = set(product_codes) - set(product_map.keys())
         if missing_codes:
@@ -55,61 +243,47 @@ class CalculateTotalView(APIView):
 
         # --- Validate each item's quantity and stock ---
         stock_errors = []
-        for item in items_data:
-            product = product_map[item['product_code']]
-            quantity = item.get('quantity', 0)
+        for item in payload.items:
+            product = product_map[item.product_code]
 
-            if not isinstance(quantity, int) or quantity <= 0:
+            if item.quantity is None:
                 stock_errors.append(f"Invalid quantity for '{product.name}' ({product.code}).")
                 continue
 
-            if product.stock_quantity < quantity:
+            if product.available_stock < item.quantity:
                 stock_errors.append(
                     f"Insufficient stock for '{product.name}' ({product.code}). "
-                    f"Available: {product.stock_quantity}, Requested: {quantity}"
+                    f"Available: {product.available_stock}, Requested: {item.quantity}"
                 )
 
         if stock_errors:
             return Response({'errors': stock_errors}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer_items = []
-        for item_data in items_data:
-            product = product_map[item_data['product_code']]
-            serializer_items.append({
-                'product': product.id,
-                'quantity': item_data['quantity'],
-                'unit_price': str(product.unit_price),
-                'tax_percentage': str(product.tax_percentage),
-            })
-
-        # --- Check if updating an existing draft ---
-        order_code = request.data.get('order_code')
-        order = None
-
-        if order_code:
-            try:
-                order = PurchaseOrder.objects.get(code=order_code, is_draft=True)
-            except PurchaseOrder.DoesNotExist:
-                return Response(
-                    {'error': f"Draft order '{order_code}' not found."},
-                    status=status.HTTP_404_NOT_FOUND,
-                )
-
-        serializer_data = {
-            'customer_email': customer_email,
+        # Everything is validated above, the draft store only persists the draft
+        validated_data = {
+            'customer_email': payload.customer_email,
             'is_draft': True,
-            'items': serializer_items,
+            'items': [
+                {
+                    'product': product_map[item.product_code],
+                    'quantity': item.quantity,
+                    'unit_price': product_map[item.product_code].unit_price,
+                    'tax_percentage': product_map[item.product_code].tax_percentage,
+                }
+                for item in payload.items
+            ],
         }
 
-        if order:
-            serializer = PurchaseOrderCreateSerializer(order, data=serializer_data)
-        else:
-            serializer = PurchaseOrderCreateSerializer(data=serializer_data)
-
-        serializer.is_valid(raise_exception=True)
+        # --- Create the draft or update an existing one ---
+        order_code = payload.order_code
 
-        with transaction.atomic():
-            order = serializer.save()
+        try:
+            order = get_draft_store().save(validated_data, order_code=order_code)
+        except DraftNotFound:
+            return Response(
+                {'error': f"Draft order '{order_code}' not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
 
         return Response(
             {
@@ -124,44 +298,125 @@ class CalculateTotalView(APIView):
         )
 
 
+class TenderSuggestionView(APIView):
+    """
+    Suggests the notes to take for a draft order so the till can give exact change with the fewest notes
+    changing hands. ``available`` limits the suggestion to the notes the customer has.
+    """
+
+    def post(self, request):
+        try:
+            payload = TenderSuggestionPayload.parse(request.data)
+        except PayloadError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
+        wallet = None
+        if payload.available:
+            invalid_values = [tender.value for tender in payload.available
+                              if tender.value not in settings.VALID_DENOMINATIONS]
+            if invalid_values:
+                return Response(
+                    {'error': f"Invalid denomination values: {', '.join(map(str, invalid_values))}."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            wallet = {tender.value: tender.count for tender in payload.available}
+
+        try:
+            draft = get_draft_store().load(payload.order_code)
+        except StaleDraft as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if draft is None:
+            return Response(
+                {'error': f"Draft order '{payload.order_code}' not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        order, _ = draft
+        amount_due = math.ceil(order.total_amount)
+        till = dict(AmountDenomination.objects.values_list('value', 'available_count'))
+        suggestion = suggest_tender(amount_due, till, wallet)
+        if suggestion is None:
+            return Response(
+                {'error': f"No tender from the available notes lets the till give exact change for {amount_due}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        paid_amount = sum(value * count for value, count in suggestion.tender.items())
+        return Response(
+            {
+                'order_code': order.code,
+                'total_amount': str(order.total_amount),
+                'paid_amount': paid_amount,
+                'balance': str((paid_amount - order.total_amount).quantize(CENT)),
+                'denominations': [{'value': value, 'count': count}
+                                  for value, count in sorted(suggestion.tender.items(), reverse=True)],
+                # Fewest-notes change, CHANGE_STRATEGY may pick other notes for the same balance
+                'change': [{'value': value, 'count': count}
+                           for value, count in sorted(suggestion.change.items(), reverse=True)],
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+@method_decorator(log_request('generate_bill', logger), name='post')
 class GenerateBillView(APIView):
     """
     Validates stock + denomination change, finalizes the draft order,
+    and replays the stored response for retries carrying the same Idempotency-Key.
     """
 
     def post(self, request):
-        order_code = request.data.get('order_code')
-        paid_denominations = request.data.get('denominations', [])
+        idempotency_key = request.headers.get('Idempotency-Key', '').strip()
 
-        if not order_code:
-            return Response({'error': 'Order code is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(idempotency_key) > IdempotencyKey._meta.get_field('key').max_length:
+            return Response({'error': 'Idempotency-Key is too long.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not paid_denominations:
-            return Response({'error': 'Denomination details are required.'}, status=status.HTTP_400_BAD_REQUEST)
+        # Before parsing, a retry replays the stored response even if the client changed the tenders since
+        if idempotency_key:
+            stored = IdempotencyKey.lookup(idempotency_key)
+            if stored:
+                order_code = request.data.get('order_code') if isinstance(request.data, dict) else None
+                return self._replay(stored, str(order_code) if order_code else None)
 
         try:
-            order = PurchaseOrder.objects.get(code=order_code, is_draft=True)
-        except PurchaseOrder.DoesNotExist:
+            payload = BillPayload.parse(request.data)
+        except PayloadError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
+        order_code = payload.order_code
+
+        draft_store = get_draft_store()
+        try:
+            draft = draft_store.load(order_code)
+        except StaleDraft as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if draft is None:
             return Response(
                 {'error': f"Draft order '{order_code}' not found."},
                 status=status.HTTP_404_NOT_FOUND,
             )
 
+        order, purchase_items = draft
         stock_errors = []
-        purchase_items = order.purchase_items.select_related('product').all()
+        available_stock = dict(
+            Product.objects.with_available_stock()
+            .filter(id__in=[item.product_id for item in purchase_items])
+            .values_list('id', 'available_stock')
+        )
 
         for item in purchase_items:
             product = item.product
-            if product.stock_quantity < item.quantity:
+            available = available_stock.get(product.id, 0)
+            if available < item.quantity:
                 stock_errors.append(
                     f"Insufficient stock for '{product.name}' ({product.code}). "
-                    f"Available: {product.stock_quantity}, Requested: {item.quantity}"
+                    f"Available: {available}, Requested: {item.quantity}"
                 )
 
         if stock_errors:
             return Response({'errors': stock_errors}, status=status.HTTP_400_BAD_REQUEST)
 
-        result = validate_balance_possible(order, paid_denominations)
+        result = validate_balance_possible(order, payload.denominations)
 
         if not result['success']:
             return Response(
@@ -169,21 +424,64 @@ class GenerateBillView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        serializer = GenerateBillSerializer(order, data={
-            'paid_amount': str(result['paid_amount']),
-            'balance': str(result['balance']),
+        # The settlement was computed from validated tenders above, so it is persisted without re-validation.
+        # Amounts are quantized to the two decimal places the columns (and responses) use.
+        settlement = {
+            'paid_amount': result['paid_amount'].quantize(CENT),
+            'balance': result['balance'].quantize(CENT),
             'paid': result['paid'],
             'change': result['change'],
-        })
-        serializer.is_valid(raise_exception=True)
+        }
 
-        with transaction.atomic():
-            order = serializer.save()
+        try:
+            with transaction.atomic():
+                order = draft_store.materialize(order, purchase_items)
+                order = settle_order(order, settlement)
+                response_data = self._build_response(order, purchase_items, result)
+                if idempotency_key:
+                    IdempotencyKey.store(idempotency_key, order.code, response_data, status.HTTP_200_OK)
+                append_to_feed(order)
+        except (IntegrityError, DraftNotFound) as e:
+            # Only a lost race is answered here: a concurrent request finalized the same draft (or used the
+            # same key) first, its settlement wins and ours rolled back. Other constraint failures are bugs.
+            stored = IdempotencyKey.lookup(idempotency_key) if idempotency_key else None
+            if stored:
+                return self._replay(stored, order_code)
+            if PurchaseOrder.all_objects.filter(code=order_code, is_draft=False).exists():
+                return Response(
+                    {'error': f"Order '{order_code}' was already finalized by another request."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            if isinstance(e, DraftNotFound):
+                return Response(
+                    {'error': f"Draft order '{order_code}' not found."},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            raise
+
+        draft_store.discard(order_code)
 
         # Send invoice email in background — doesn't block the response and for this simple billing system.
         # For production grade we can go with celery
         send_invoice_email(order)
 
+        # The client is redirected to the bill page next, keep its reads on the primary until the replica catches up
+        return pin_to_primary(Response(response_data, status=status.HTTP_200_OK))
+
+    @staticmethod
+    def _replay(stored, order_code):
+        """Returns the stored response, refusing keys reused for a different order."""
+        if stored.order_code != order_code:
+            return Response(
+                {'error': f"Idempotency-Key was already used for order '{stored.order_code}'."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        response = Response(stored.response, status=stored.status_code)
+        response['Idempotent-Replayed'] = 'true'
+        return pin_to_primary(response)
+
+    @staticmethod
+    def _build_response(order, purchase_items, result):
         items_response = []
         for item in purchase_items:
             items_response.append({
@@ -206,18 +504,43 @@ class GenerateBillView(APIView):
             for d in result['change']
         ]
 
+        return {
+            'order_code': order.code,
+            'customer_email': order.customer_email,
+            'items': items_response,
+            'total_before_tax': str(order.total_before_tax),
+            'total_tax': str(order.total_tax),
+            'total_amount': str(order.total_amount),
+            'amount_paid': str(order.amount_paid),
+            'change_given': str(order.change_given),
+            'paid_denominations': paid_response,
+            'change_denominations': change_response,
+        }
+
+
+@method_decorator(log_request('resend_invoice', logger), name='post')
+class ResendInvoiceView(APIView):
+    """
+    Resends the invoice of a finalized order, reusing the stored invoice artifacts.
+    """
+
+    def post(self, request):
+        order_code = request.data.get('order_code')
+
+        if not order_code:
+            return Response({'error': 'Order code is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            order = PurchaseOrder.objects.get(code=order_code, is_draft=False)
+        except PurchaseOrder.DoesNotExist:
+            return Response(
+                {'error': f"Order '{order_code}' not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        send_invoice_email(order)
+
         return Response(
-            {
-                'order_code': order.code,
-                'customer_email': order.customer_email,
-                'items': items_response,
-                'total_before_tax': str(order.total_before_tax),
-                'total_tax': str(order.total_tax),
-                'total_amount': str(order.total_amount),
-                'amount_paid': str(order.amount_paid),
-                'change_given': str(order.change_given),
-                'paid_denominations': paid_response,
-                'change_denominations': change_response,
-            },
-            status=status.HTTP_200_OK,
+            {'message': f"Invoice for order '{order.code}' will be sent to {order.customer_email}."},
+            status=status.HTTP_202_ACCEPTED,
         )
@@ -1,4 +1,173 @@
 from django.contrib import admin
-from apps.billing.models.masters import Product,AmountDenomination
 
-admin.site.register([Product,AmountDenomination])
\ No newline at end of file
+from apps.billing.models import (
+    AmountDenomination, ArchivedOrder, Customer, CustomerStats, DenominationDetail, OrderFeedEntry,
+    OrderSearchDocument, Product, PurchaseItem, PurchaseOrder, StockMovement, TillSnapshot,
+)
+from core.paginators import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Base admin for tables that grow with every sale. Counts come from planner estimates and the
+    "N total" link that re-counts the unfiltered table is hidden.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class DerivedTableAdmin(LargeTableAdmin):
+    """Rows written by checkout or rebuild commands, shown but never added, edited or deleted by hand."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class ReadOnlyInline(admin.TabularInline):
+    """Finalized order lines are history, shown but never edited from the admin."""
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    list_display = ['code', 'name', 'unit_price', 'tax_percentage', 'stock_quantity', 'is_active']
+    list_filter = ['is_active', 'tax_percentage']
+    search_fields = ['code', 'name']
+
+
+@admin.register(AmountDenomination)
+class AmountDenominationAdmin(admin.ModelAdmin):
+    list_display = ['value', 'available_count', 'is_active']
+
+
+@admin.register(Customer)
+class CustomerAdmin(LargeTableAdmin):
+    list_display = ['email', 'created_on', 'is_active']
+    search_fields = ['email__exact']
+    search_help_text = 'Exact (lower-case) email'
+
+
+class PurchaseItemInline(ReadOnlyInline):
+    model = PurchaseItem
+    fields = ['product', 'quantity', 'unit_price', 'tax_percentage']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+
+class DenominationDetailInline(ReadOnlyInline):
+    model = DenominationDetail
+    fields = ['type', 'denomination', 'count']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('denomination')
+
+
+@admin.register(PurchaseOrder)
+class PurchaseOrderAdmin(LargeTableAdmin):
+    list_display = ['code', 'customer_email', 'purchase_date', 'total_amount', 'amount_paid', 'is_draft',
+                    'invoice_sent']
+    list_filter = ['is_draft', 'invoice_sent']
+    date_hierarchy = 'purchase_date'
+    search_fields = ['code__exact', 'customer__email__exact']
+    search_help_text = 'Exact order code or (lower-case) customer email'
+    raw_id_fields = ['customer']
+    readonly_fields = ['code', 'purchase_date', 'total_before_tax', 'total_tax', 'total_amount', 'amount_paid',
+                       'change_given']
+    inlines = [PurchaseItemInline, DenominationDetailInline]
+
+
+@admin.register(PurchaseItem)
+class PurchaseItemAdmin(LargeTableAdmin):
+    list_display = ['purchase', 'product', 'quantity', 'unit_price', 'tax_percentage']
+    list_select_related = ['purchase', 'product']
+    search_fields = ['purchase__code__exact', 'product__code__exact']
+    search_help_text = 'Exact order or product code'
+    raw_id_fields = ['purchase', 'product']
+
+
+@admin.register(DenominationDetail)
+class DenominationDetailAdmin(LargeTableAdmin):
+    list_display = ['purchase', 'denomination', 'count', 'type', 'created_on']
+    list_filter = ['type']
+    list_select_related = ['purchase', 'denomination']
+    date_hierarchy = 'created_on'
+    search_fields = ['purchase__code__exact']
+    search_help_text = 'Exact order code'
+    raw_id_fields = ['purchase', 'denomination']
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(LargeTableAdmin):
+    list_display = ['product', 'purchase', 'quantity', 'type', 'created_on']
+    list_filter = ['type']
+    list_select_related = ['product', 'purchase']
+    date_hierarchy = 'created_on'
+    search_fields = ['product__code__exact', 'purchase__code__exact']
+    search_help_text = 'Exact product or order code'
+    raw_id_fields = ['product', 'purchase']
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(LargeTableAdmin):
+    list_display = ['code', 'customer_email', 'purchase_date', 'total_amount', 'archive_file', 'archived_on']
+    date_hierarchy = 'purchase_date'
+    search_fields = ['code__exact', 'customer__email__exact']
+    search_help_text = 'Exact order code or (lower-case) customer email'
+    raw_id_fields = ['customer']
+    # Index rows point into archive files, editing them would orphan or corrupt records
+    readonly_fields = ['code', 'customer', 'customer_email', 'purchase_date', 'total_amount', 'amount_paid',
+                       'archive_file', 'offset', 'length', 'archived_on']
+
+
+@admin.register(CustomerStats)
+class CustomerStatsAdmin(LargeTableAdmin):
+    list_display = ['customer', 'order_count', 'lifetime_spend', 'first_purchase_at', 'last_purchase_at']
+    list_select_related = ['customer']
+    search_fields = ['customer__email__exact']
+    search_help_text = 'Exact (lower-case) customer email'
+    raw_id_fields = ['customer']
+    readonly_fields = ['order_count', 'lifetime_spend', 'first_purchase_at', 'last_purchase_at']
+
+
+@admin.register(OrderSearchDocument)
+class OrderSearchDocumentAdmin(DerivedTableAdmin):
+    list_display = ['order', 'total_amount', 'purchase_date']
+    list_select_related = ['order']
+    date_hierarchy = 'purchase_date'
+    search_fields = ['order__code__exact']
+    search_help_text = 'Exact order code'
+
+
+@admin.register(OrderFeedEntry)
+class OrderFeedEntryAdmin(DerivedTableAdmin):
+    list_display = ['id', 'order', 'created_on']
+    list_select_related = ['order']
+    search_fields = ['order__code__exact']
+    search_help_text = 'Exact order code'
+
+
+@admin.register(TillSnapshot)
+class TillSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['taken_at', 'kind', 'last_detail_id', 'note']
+    list_filter = ['kind']
+    date_hierarchy = 'taken_at'
+    # Reconciliation trusts the counts and high-water mark as recorded, only the note is editable
+    readonly_fields = ['taken_at', 'last_detail_id', 'counts', 'kind']
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,160 @@
+"""
+Cold storage for finalized orders.
+
+Each archive file holds one month of orders as independently zlib-compressed JSON records written
+back to back. ``ArchivedOrder`` rows index them by code and email with the record's byte offset, so a
+lookup memory-maps the file and decompresses only the one record it needs.
+"""
+import json
+import mmap
+import os
+import zlib
+from decimal import Decimal
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: nothing stops two archivers appending at once, run one at a time there
+    fcntl = None
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+from apps.billing.models import (
+    AmountDenomination, ArchivedOrder, DenominationDetail, Product, PurchaseItem, PurchaseOrder,
+)
+
+ARCHIVE_FILE_SUFFIX = '.arc'
+
+
+class ArchiveError(Exception):
+    """An archived order's record can't be read."""
+
+
+def archive_file_name(purchase_date):
+    """Monthly archive file an order belongs to, e.g. ``orders-2025-01.arc``."""
+    return f"orders-{purchase_date:%Y-%m}{ARCHIVE_FILE_SUFFIX}"
+
+
+def order_record(order):
+    """An order with its items and denomination details as a JSON-ready dict. Prefetch both for many orders."""
+    return {
+        'code': order.code,
+        'customer_email': order.customer_email,
+        'purchase_date': order.purchase_date.isoformat(),
+        'total_before_tax': str(order.total_before_tax),
+        'total_tax': str(order.total_tax),
+        'total_amount': str(order.total_amount),
+        'amount_paid': str(order.amount_paid),
+        'change_given': str(order.change_given),
+        'invoice_sent': order.invoice_sent,
+        'invoice_sent_at': order.invoice_sent_at.isoformat() if order.invoice_sent_at else None,
+        'items': [
+            {
+                'product_id': item.product_id,
+                'product_code': item.product.code,
+                'product_name': item.product.name,
+                'quantity': item.quantity,
+                'unit_price': str(item.unit_price),
+                'tax_percentage': str(item.tax_percentage),
+            }
+            for item in order.purchase_items.all()
+        ],
+        'denominations': [
+            {
+                'denomination_id': detail.denomination_id,
+                'value': detail.denomination.value,
+                'count': detail.count,
+                'type': detail.type,
+            }
+            for detail in order.denomination_details.all()
+        ],
+    }
+
+
+def serialize_order(order):
+    """Flattens an order with its items and denomination details into a compressed record."""
+    return zlib.compress(json.dumps(order_record(order), separators=(',', ':')).encode())
+
+
+def append_records(file_name, records):
+    """
+    Appends compressed records to an archive file and fsyncs it.
+    Returns the ``(offset, length)`` of each record in order.
+    """
+    os.makedirs(settings.ORDER_ARCHIVE_DIR, exist_ok=True)
+    positions = []
+
+    with open(os.path.join(settings.ORDER_ARCHIVE_DIR, file_name), 'ab') as archive:
+        if fcntl:
+            # archive_orders skips locked rows, so archivers can run concurrently. Without the lock two could
+            # read the same end offset and one's records would land after the other's. Released on close.
+            fcntl.flock(archive.fileno(), fcntl.LOCK_EX)
+        offset = archive.seek(0, os.SEEK_END)
+        for record in records:
+            archive.write(record)
+            positions.append((offset, len(record)))
+            offset += len(record)
+        archive.flush()
+        os.fsync(archive.fileno())
+
+    return positions
+
+
+def read_record(archived):
+    """Decompresses the record an ``ArchivedOrder`` points at. Raises ``ArchiveError`` when it can't be read."""
+    path = os.path.join(settings.ORDER_ARCHIVE_DIR, archived.archive_file)
+    try:
+        with open(path, 'rb') as archive, mmap.mmap(archive.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data = mapped[archived.offset:archived.offset + archived.length]
+    except FileNotFoundError:
+        raise ArchiveError(f"Archive file {path} of order {archived.code} is missing.") from None
+    try:
+        return json.loads(zlib.decompress(data))
+    except zlib.error as e:
+        raise ArchiveError(f"Record of order {archived.code} in {path} is corrupt: {e}") from None
+
+
+def load_archived_order(**filters):
+    """
+    Rebuilds an archived order as unsaved model instances so views, templates and
+    ``PurchaseItem.get_*`` work unchanged. Returns ``(order, items, denomination_details)`` or None, and raises
+    ``ArchiveError`` when the record can't be read.
+    """
+    archived = ArchivedOrder.objects.filter(**filters).first()
+    if archived is None:
+        return None
+
+    record = read_record(archived)
+    order = PurchaseOrder(
+        code=record['code'],
+        customer_email=record['customer_email'],
+        total_before_tax=Decimal(record['total_before_tax']),
+        total_tax=Decimal(record['total_tax']),
+        total_amount=Decimal(record['total_amount']),
+        amount_paid=Decimal(record['amount_paid']),
+        change_given=Decimal(record['change_given']),
+        invoice_sent=record['invoice_sent'],
+        invoice_sent_at=parse_datetime(record['invoice_sent_at']) if record['invoice_sent_at'] else None,
+    )
+    order.purchase_date = parse_datetime(record['purchase_date'])
+
+    items = [
+        PurchaseItem(
+            product=Product(id=item['product_id'], code=item['product_code'], name=item['product_name']),
+            quantity=item['quantity'],
+            unit_price=Decimal(item['unit_price']),
+            tax_percentage=Decimal(item['tax_percentage']),
+        )
+        for item in record['items']
+    ]
+    denomination_details = [
+        DenominationDetail(
+            denomination=AmountDenomination(id=detail['denomination_id'], value=detail['value']),
+            count=detail['count'],
+            type=detail['type'],
+        )
+        for detail in record['denominations']
+    ]
+
+    return order, items, denomination_details
@@ -0,0 +1,43 @@
+"""
+Change feed of finalized orders for downstream sync.
+
+Finalizing an order appends an ``OrderFeedEntry`` right after its transaction commits. Consumers read
+entries after the last cursor they processed, so a sync job fetches only what changed since its previous
+run and never rereads history. Entries are never updated, a finalized order appears exactly once.
+
+The append is its own one-statement transaction, so checkouts never wait on each other for the feed.
+Ids are still handed out at insert rather than at commit, and two appends can commit out of id order
+in the moment between the two. Readers therefore only see entries older than
+``ORDER_FEED_SETTLE_SECONDS``, by which time every lower id has committed and a cursor never steps past
+an entry that is still on its way. An order whose process dies between the checkout commit and the
+append has no entry, ``backfill_order_feed`` appends those.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.billing.models import OrderFeedEntry
+
+
+def append_to_feed(order):
+    """
+    Appends a finalized order to the feed once the current transaction commits. A failed append is logged
+    and leaves the committed order alone.
+    """
+    transaction.on_commit(lambda: OrderFeedEntry.objects.create(order=order), robust=True)
+
+
+def read_feed(after, limit):
+    """
+    Up to ``limit`` settled entries with an id greater than ``after``, oldest first, with their orders,
+    items and denomination details loaded for ``order_record``.
+    """
+    settled_before = timezone.now() - timedelta(seconds=settings.ORDER_FEED_SETTLE_SECONDS)
+    return list(
+        OrderFeedEntry.objects.filter(id__gt=after, created_on__lte=settled_before).order_by('id')
+        .select_related('order').prefetch_related(
+            'order__purchase_items__product', 'order__denomination_details__denomination',
+        )[:limit]
+    )
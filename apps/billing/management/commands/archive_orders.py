@@ -0,0 +1,93 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.billing.archive import append_records, archive_file_name, serialize_order
+from apps.billing.models import (
+    ArchivedOrder, DenominationDetail, OrderFeedEntry, OrderSearchDocument, PurchaseItem, PurchaseOrder,
+    StockMovement,
+)
+
+
+def months_ago(moment, months):
+    """Start of the month ``months`` calendar months before ``moment``."""
+    month_index = moment.year * 12 + moment.month - 1 - months
+    return moment.replace(year=month_index // 12, month=month_index % 12 + 1, day=1,
+                          hour=0, minute=0, second=0, microsecond=0)
+
+
+class Command(BaseCommand):
+    help = 'Moves finalized orders older than N months out of the hot tables into compressed archive files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.ORDER_ARCHIVE_AFTER_MONTHS,
+                            help='Archive orders purchased before the start of the month N months ago.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Orders archived per transaction.')
+
+    def handle(self, *args, **options):
+        cutoff = months_ago(timezone.now(), options['months'])
+        total = 0
+
+        while True:
+            archived = self._archive_batch(cutoff, options['batch_size'])
+            if not archived:
+                break
+            total += archived
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {total} orders purchased before {cutoff:%Y-%m-%d}."))
+
+    def _archive_batch(self, cutoff, batch_size):
+        with transaction.atomic():
+            orders = list(
+                PurchaseOrder.all_objects.select_for_update(skip_locked=True, of=('self',))
+                .filter(is_draft=False, purchase_date__lt=cutoff)
+                .order_by('id')[:batch_size]
+            )
+            if not orders:
+                return 0
+
+            # Prefetch after locking, select_for_update can't be combined with prefetch_related
+            orders = list(
+                PurchaseOrder.all_objects.filter(id__in=[order.id for order in orders]).prefetch_related(
+                    'purchase_items__product', 'denomination_details__denomination'
+                )
+            )
+
+            by_file = defaultdict(list)
+            for order in orders:
+                by_file[archive_file_name(order.purchase_date)].append(order)
+
+            # Records are written and fsynced before the hot rows are deleted. If the transaction
+            # rolls back, the appended bytes are simply never referenced by an index row.
+            index_rows = []
+            for file_name, file_orders in by_file.items():
+                positions = append_records(file_name, [serialize_order(order) for order in file_orders])
+                for order, (offset, length) in zip(file_orders, positions):
+                    index_rows.append(ArchivedOrder(
+                        code=order.code,
+                        customer_id=order.customer_id,
+                        customer_email=order.customer_email,
+                        purchase_date=order.purchase_date,
+                        total_amount=order.total_amount,
+                        amount_paid=order.amount_paid,
+                        archive_file=file_name,
+                        offset=offset,
+                        length=length,
+                    ))
+
+            ArchivedOrder.objects.bulk_create(index_rows)
+
+            order_ids = [order.id for order in orders]
+            # Uncompacted ledger rows keep their stock delta, they just lose the link to the archived order
+            StockMovement.objects.filter(purchase_id__in=order_ids).update(purchase=None)
+            DenominationDetail.objects.filter(purchase_id__in=order_ids).delete()
+            OrderSearchDocument.objects.filter(order_id__in=order_ids).delete()
+            OrderFeedEntry.objects.filter(order_id__in=order_ids).delete()
+            PurchaseItem.objects.filter(purchase_id__in=order_ids).delete()
+            PurchaseOrder.all_objects.filter(id__in=order_ids).delete()
+
+        return len(orders)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from apps.billing.models import OrderFeedEntry, PurchaseOrder
+
+
+class Command(BaseCommand):
+    help = ('Appends finalized orders that are missing from the change feed, such as an order whose process '
+            'stopped right after checkout committed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Orders appended per INSERT.')
+
+    def handle(self, *args, **options):
+        missing = PurchaseOrder.all_objects.filter(is_draft=False, feed_entry__isnull=True).order_by('id')
+        last_id = 0
+        total = 0
+
+        while True:
+            batch = list(missing.filter(id__gt=last_id).values_list('id', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            # A checkout appending the same order concurrently wins, the conflict is skipped
+            OrderFeedEntry.objects.bulk_create([OrderFeedEntry(order_id=order_id) for order_id in batch],
+                                               ignore_conflicts=True)
+            last_id = batch[-1]
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Appended {total} orders to the feed."))
@@ -0,0 +1,56 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from apps.billing.models import Product, StockMovement
+
+
+class Command(BaseCommand):
+    help = 'Folds pending stock ledger movements into Product.stock_quantity.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.STOCK_LEDGER_COMPACT_BATCH_SIZE,
+                            help='Maximum movements folded per transaction.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total_movements = 0
+        total_products = set()
+
+        while True:
+            compacted, products = self._compact_batch(batch_size)
+            if not compacted:
+                break
+            total_movements += compacted
+            total_products.update(products)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Compacted {total_movements} movements into {len(total_products)} products."
+        ))
+
+    def _compact_batch(self, batch_size):
+        """Lock a batch of movements, apply their per-product sums and delete them in one transaction."""
+        with transaction.atomic():
+            # skip_locked lets concurrent compactors split the ledger instead of double-applying rows
+            movements = list(
+                StockMovement.objects.select_for_update(skip_locked=True)
+                .order_by('id')
+                .values_list('id', 'product_id', 'quantity')[:batch_size]
+            )
+            if not movements:
+                return 0, set()
+
+            deltas = defaultdict(int)
+            for _, product_id, quantity in movements:
+                deltas[product_id] += quantity
+
+            for product_id, delta in deltas.items():
+                if delta:
+                    Product.all_objects.filter(id=product_id).update(stock_quantity=F('stock_quantity') + delta)
+
+            StockMovement.objects.filter(id__in=[movement[0] for movement in movements]).delete()
+
+        return len(movements), set(deltas)
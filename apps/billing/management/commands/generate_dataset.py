@@ -0,0 +1,267 @@
+import csv
+import io
+import itertools
+import math
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.billing.models import (
+    AmountDenomination, ArchivedOrder, Customer, DenominationDetail, OrderFeedEntry, OrderSearchDocument, Product,
+    PurchaseItem, PurchaseOrder,
+)
+from apps.billing.search import build_document
+from apps.billing.totals import basket_totals
+
+TAX_RATES = (Decimal('0.00'), Decimal('5.00'), Decimal('12.00'), Decimal('18.00'), Decimal('28.00'))
+TAX_WEIGHTS = (10, 25, 20, 35, 10)
+# Customers mostly pay to the next round amount with a single larger note
+ROUND_UP_TO = (10, 50, 100, 500)
+ROUND_UP_WEIGHTS = (15, 25, 35, 25)
+# Digits of the per-run sequence in generated order codes
+ORDER_NUMBER_DIGITS = 9
+
+
+@contextmanager
+def explicit_timestamps(model, *field_names):
+    """Lets bulk inserts keep the given auto_now / auto_now_add values instead of stamping the current time."""
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def zipf_cum_weights(count, exponent):
+    """Cumulative weights making the item at rank n about n ** -exponent as likely as the first."""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def greedy_breakdown(amount, denominations):
+    """Splits an integer amount into ``(value, count)`` pairs using the largest denominations first."""
+    breakdown = []
+    for value in denominations:
+        count, amount = divmod(amount, value)
+        if count:
+            breakdown.append((value, count))
+    return breakdown
+
+
+class Command(BaseCommand):
+    help = ('Generates a deterministic synthetic dataset of products, customers and finalized orders '
+            'for scale testing. Intended for an otherwise empty database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, equal seeds give equal data.')
+        parser.add_argument('--products', type=int, default=5000, help='Products to create.')
+        parser.add_argument('--customers', type=int, default=50000, help='Customers to create.')
+        parser.add_argument('--orders', type=int, default=1000000, help='Finalized orders to create.')
+        parser.add_argument('--days', type=int, default=365, help='Spread purchase dates over this many days.')
+        parser.add_argument('--end-date', type=datetime.fromisoformat, default=None,
+                            help='Last day of purchases (YYYY-MM-DD), defaults to yesterday.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Orders inserted per transaction.')
+        parser.add_argument('--prefix', default='SYN',
+                            help='Prefix of generated product codes, order codes and emails.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.order_prefix = f"PO{self.prefix}"
+        self.order_numbers = itertools.count(1)
+        # COPY is several times faster than INSERTs for the item and tender tables
+        self.use_copy = connection.vendor == 'postgresql'
+
+        if Product.all_objects.filter(code__startswith=self.prefix).exists():
+            raise CommandError(f"Products with prefix {self.prefix!r} already exist, use another --prefix.")
+        if (PurchaseOrder.all_objects.filter(code__startswith=self.order_prefix).exists()
+                or ArchivedOrder.objects.filter(code__startswith=self.order_prefix).exists()):
+            raise CommandError(f"Orders with prefix {self.order_prefix!r} already exist, use another --prefix.")
+        code_length = PurchaseOrder._meta.get_field('code').max_length
+        if len(self.order_prefix) + ORDER_NUMBER_DIGITS > code_length:
+            raise CommandError(f"--prefix must be at most {code_length - ORDER_NUMBER_DIGITS - 2} characters.")
+        if min(options['products'], options['customers'], options['orders'], options['days']) <= 0:
+            raise CommandError('--products, --customers, --orders and --days must be positive.')
+
+        end_date = options['end_date'] or (timezone.localtime() - timedelta(days=1)).replace(tzinfo=None)
+        end = timezone.make_aware(datetime.combine(end_date.date() + timedelta(days=1), time.min))
+        start = end - timedelta(days=options['days'])
+
+        products = self._create_products(options['products'], start)
+        customers = self._create_customers(options['customers'], start)
+        denominations = self._denominations()
+
+        product_weights = zipf_cum_weights(len(products), exponent=1.1)
+        customer_weights = zipf_cum_weights(len(customers), exponent=0.8)
+        # Popularity must not follow creation order, or the cheapest or oldest rows would always sell most
+        self.rng.shuffle(products)
+        self.rng.shuffle(customers)
+
+        created = 0
+        purchase_dates = self._purchase_dates(start, end, options['orders'])
+        with explicit_timestamps(PurchaseOrder, 'purchase_date', 'created_on', 'last_updated_on'):
+            while created < options['orders']:
+                batch_dates = list(itertools.islice(purchase_dates, options['batch_size']))
+                with transaction.atomic():
+                    self._create_orders(batch_dates, products, product_weights, customers, customer_weights,
+                                        denominations)
+                created += len(batch_dates)
+                self.stdout.write(f"Created {created} of {options['orders']} orders.")
+
+        call_command('rebuild_customer_stats', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(products)} products, {len(customers)} customers and {created} orders "
+            f"between {start:%Y-%m-%d} and {end:%Y-%m-%d}."
+        ))
+
+    def _create_products(self, count, created_on):
+        products = []
+        for number in range(1, count + 1):
+            # Log-uniform prices between ₹5 and ₹5000, most products are cheap
+            unit_price = Decimal(round(math.exp(self.rng.uniform(math.log(5), math.log(5000))), 2)).quantize(
+                Decimal('0.01'))
+            products.append(Product(
+                code=f"{self.prefix}{number:07d}",
+                name=f"Synthetic Product {number}",
+                stock_quantity=self.rng.randint(1000, 100000),
+                unit_price=unit_price,
+                tax_percentage=self.rng.choices(TAX_RATES, TAX_WEIGHTS)[0],
+                created_on=created_on,
+                last_updated_on=created_on,
+            ))
+
+        with explicit_timestamps(Product, 'created_on', 'last_updated_on'):
+            Product.all_objects.bulk_create(products, batch_size=1000)
+        return list(Product.all_objects.filter(code__startswith=self.prefix).order_by('id'))
+
+    def _create_customers(self, count, created_on):
+        domain = f"{self.prefix.lower()}.example.com"
+        customers = [
+            Customer(email=f"customer{number}@{domain}", created_on=created_on, last_updated_on=created_on)
+            for number in range(1, count + 1)
+        ]
+        with explicit_timestamps(Customer, 'created_on', 'last_updated_on'):
+            Customer.all_objects.bulk_create(customers, batch_size=1000, ignore_conflicts=True)
+        return list(Customer.all_objects.filter(email__endswith=f"@{domain}").order_by('id'))
+
+    @staticmethod
+    def _denominations():
+        """Maps denomination value to id, creating missing denominations with no available notes."""
+        for value in settings.VALID_DENOMINATIONS:
+            AmountDenomination.all_objects.get_or_create(value=value)
+        return dict(AmountDenomination.all_objects.values_list('value', 'id'))
+
+    def _purchase_dates(self, start, end, count):
+        """
+        Yields ``count`` non-decreasing purchase dates after ``start`` with random millisecond gaps. The gaps only
+        average out to the span, so dates are clamped to the last millisecond before ``end``.
+        """
+        span_ms = int((end - start).total_seconds() * 1000)
+        mean_gap = max(span_ms // count, 1)
+        last = end - timedelta(milliseconds=1)
+        moment = start
+        for _ in range(count):
+            moment += timedelta(milliseconds=self.rng.randint(1, 2 * mean_gap - 1) if mean_gap > 1 else 1)
+            yield min(moment, last)
+
+    def _create_orders(self, purchase_dates, products, product_weights, customers, customer_weights, denominations):
+        rng = self.rng
+        values = sorted(denominations, reverse=True)
+        orders, baskets, tenders = [], [], []
+
+        for purchase_date in purchase_dates:
+            customer = rng.choices(customers, cum_weights=customer_weights)[0]
+
+            # Geometric basket sizes averaging about four lines, no product twice in a basket
+            basket_size = min(1 + int(rng.expovariate(1 / 3)), len(products))
+            basket = {}
+            while len(basket) < basket_size:
+                product = rng.choices(products, cum_weights=product_weights)[0]
+                basket[product.id] = (product, rng.choices((1, 2, 3, 4, 6), (60, 20, 10, 6, 4))[0])
+            lines = list(basket.values())
+
+            totals = basket_totals((quantity, product.unit_price, product.tax_percentage)
+                                   for product, quantity in lines)
+            total_amount = int(totals.total_amount)
+            round_to = rng.choices(ROUND_UP_TO, ROUND_UP_WEIGHTS)[0]
+            amount_paid = max(-(-total_amount // round_to) * round_to, round_to)
+
+            orders.append(PurchaseOrder(
+                code=f"{self.order_prefix}{next(self.order_numbers):0{ORDER_NUMBER_DIGITS}d}",
+                customer=customer,
+                customer_email=customer.email,
+                purchase_date=purchase_date,
+                created_on=purchase_date,
+                last_updated_on=purchase_date,
+                is_draft=False,
+                total_before_tax=totals.total_before_tax,
+                total_tax=totals.total_tax,
+                total_amount=totals.total_amount,
+                amount_paid=amount_paid,
+                change_given=amount_paid - total_amount,
+                invoice_sent=True,
+                invoice_sent_at=purchase_date,
+            ))
+            baskets.append(lines)
+            tenders.append((greedy_breakdown(amount_paid, values),
+                            greedy_breakdown(amount_paid - total_amount, values)))
+
+        PurchaseOrder.all_objects.bulk_create(orders)
+        if orders and orders[0].pk is None:
+            # Backends that can't return ids from bulk inserts
+            ids = dict(PurchaseOrder.all_objects.filter(code__in=[order.code for order in orders])
+                       .values_list('code', 'id'))
+            for order in orders:
+                order.pk = ids[order.code]
+
+        item_rows = [
+            (order.pk, product.id, quantity, product.unit_price, product.tax_percentage)
+            for order, lines in zip(orders, baskets)
+            for product, quantity in lines
+        ]
+        detail_rows = [
+            (order.pk, denominations[value], count, detail_type,
+             connection.ops.adapt_datetimefield_value(order.purchase_date))
+            for order, tender in zip(orders, tenders)
+            for detail_type, breakdown in zip((DenominationDetail.PAID, DenominationDetail.BALANCE), tender)
+            for value, count in breakdown
+        ]
+        self._insert(PurchaseItem, ('purchase', 'product', 'quantity', 'unit_price', 'tax_percentage'), item_rows)
+        self._insert(DenominationDetail, ('purchase', 'denomination', 'count', 'type', 'created_on'), detail_rows)
+
+        search_rows = [
+            (order.pk,
+             build_document(order.code, order.customer_email, ((product.code, product.name) for product, _ in lines)),
+             order.total_amount, connection.ops.adapt_datetimefield_value(order.purchase_date))
+            for order, lines in zip(orders, baskets)
+        ]
+        self._insert(OrderSearchDocument, ('order', 'document', 'total_amount', 'purchase_date'), search_rows)
+        self._insert(OrderFeedEntry, ('order', 'created_on'), [
+            (order.pk, connection.ops.adapt_datetimefield_value(order.purchase_date)) for order in orders
+        ])
+
+    def _insert(self, model, field_names, rows):
+        """Inserts plain value tuples, skipping model instances which dominate the cost of bulk_create."""
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in field_names)
+
+        with connection.cursor() as cursor:
+            if not self.use_copy:
+                placeholders = ', '.join(['%s'] * len(field_names))
+                cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", rows)
+                return
+
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
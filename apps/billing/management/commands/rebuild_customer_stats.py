@@ -0,0 +1,50 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+
+from apps.billing.models import ArchivedOrder, CustomerStats, PurchaseOrder
+
+
+class Command(BaseCommand):
+    help = ('Recomputes customer stats from finalized and archived orders. '
+            'Bills finalized while it runs may be missed, so run it in a quiet period.')
+
+    def handle(self, *args, **options):
+        stats = {}
+
+        sources = (
+            PurchaseOrder.all_objects.filter(is_draft=False, customer__isnull=False),
+            ArchivedOrder.objects.filter(customer__isnull=False),
+        )
+        for queryset in sources:
+            rows = queryset.values('customer_id').annotate(
+                order_count=Count('id'),
+                lifetime_spend=Sum('total_amount'),
+                first_purchase_at=Min('purchase_date'),
+                last_purchase_at=Max('purchase_date'),
+            ).order_by()
+
+            for row in rows.iterator():
+                current = stats.get(row['customer_id'])
+                if current is None:
+                    stats[row['customer_id']] = CustomerStats(
+                        customer_id=row['customer_id'],
+                        order_count=row['order_count'],
+                        lifetime_spend=row['lifetime_spend'] or Decimal('0'),
+                        first_purchase_at=row['first_purchase_at'],
+                        last_purchase_at=row['last_purchase_at'],
+                    )
+                    continue
+
+                current.order_count += row['order_count']
+                current.lifetime_spend += row['lifetime_spend'] or Decimal('0')
+                current.first_purchase_at = min(current.first_purchase_at, row['first_purchase_at'])
+                current.last_purchase_at = max(current.last_purchase_at, row['last_purchase_at'])
+
+        with transaction.atomic():
+            CustomerStats.objects.all().delete()
+            CustomerStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {len(stats)} customers."))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.billing.models import OrderSearchDocument, PurchaseOrder
+from apps.billing.search import document_for
+
+
+class Command(BaseCommand):
+    help = ('Writes search documents for all finalized orders. Run once after upgrading, and after renaming '
+            'products to refresh their names in past orders.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Orders indexed per transaction.')
+
+    def handle(self, *args, **options):
+        orders = PurchaseOrder.all_objects.filter(is_draft=False).order_by('id')
+        last_id = 0
+        total = 0
+
+        while True:
+            batch = list(orders.filter(id__gt=last_id).prefetch_related('purchase_items__product')
+                         [:options['batch_size']])
+            if not batch:
+                break
+            with transaction.atomic():
+                OrderSearchDocument.objects.bulk_create(
+                    [document_for(order, order.purchase_items.all()) for order in batch],
+                    update_conflicts=True,
+                    unique_fields=['order'],
+                    update_fields=['document', 'total_amount', 'purchase_date'],
+                )
+            last_id = batch[-1].id
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} orders for search."))
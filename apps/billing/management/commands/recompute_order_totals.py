@@ -0,0 +1,91 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.billing.models import OrderSearchDocument, PurchaseItem, PurchaseOrder
+from apps.billing.totals import order_totals
+
+CENT = Decimal('0.01')
+# Orders listed by code when their change no longer matches, the rest are only counted
+MAX_LISTED_ORDERS = 20
+
+
+class Command(BaseCommand):
+    help = ('Recomputes stored totals of finalized orders from their purchase items, e.g. after a tax correction. '
+            'Change given is never rewritten, orders it no longer matches are listed for review.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Orders recomputed per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Report changed orders without saving them.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        scanned = changed = 0
+        to_review = []
+
+        # Drafts are recomputed whenever they are saved
+        finalized = PurchaseOrder.all_objects.filter(is_draft=False).order_by('id').only(
+            'id', 'code', 'total_before_tax', 'total_tax', 'total_amount', 'amount_paid', 'change_given',
+        )
+        while True:
+            orders = list(finalized.filter(id__gt=last_id)[:batch_size])
+            if not orders:
+                break
+            last_id = orders[-1].id
+            scanned += len(orders)
+
+            rows = (
+                PurchaseItem.objects.filter(purchase_id__in=[order.id for order in orders])
+                .order_by('purchase_id')
+                .values_list('purchase_id', 'quantity', 'unit_price', 'tax_percentage')
+            )
+            totals = order_totals(rows.iterator())
+
+            updated = [order for order in orders if self._apply(order, totals.get(order.id))]
+            changed += len(updated)
+            to_review.extend(order.code for order in updated
+                             if order.amount_paid and order.amount_paid - order.total_amount != order.change_given)
+            if updated and not options['dry_run']:
+                with transaction.atomic():
+                    PurchaseOrder.all_objects.bulk_update(updated, ['total_before_tax', 'total_tax', 'total_amount'])
+                    self._update_search_documents(updated)
+
+        action = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(f"{action} {changed} of {scanned} orders."))
+        if to_review:
+            listed = ', '.join(to_review[:MAX_LISTED_ORDERS])
+            more = f" and {len(to_review) - MAX_LISTED_ORDERS} more" if len(to_review) > MAX_LISTED_ORDERS else ''
+            self.stdout.write(self.style.WARNING(
+                f"Change given no longer matches the total of {len(to_review)} orders, review them: {listed}{more}."
+            ))
+        if changed and not options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                'Customer lifetime spend is now out of date, run rebuild_customer_stats in a quiet period.'
+            ))
+
+    @staticmethod
+    def _apply(order, totals):
+        """Sets recomputed totals on the order, mirroring calculate_totals. Returns True if anything changed."""
+        if totals is None:
+            totals = (Decimal('0'), Decimal('0'), Decimal('0'))
+
+        old_values = (order.total_before_tax, order.total_tax, order.total_amount)
+        # Stored columns have two decimal places, compare at that precision
+        if all(new.quantize(CENT) == old for new, old in zip(totals, old_values)):
+            return False
+
+        order.total_before_tax, order.total_tax, order.total_amount = totals
+        return True
+
+    @staticmethod
+    def _update_search_documents(orders):
+        """Keeps the amount lookups of order search in step with the new totals."""
+        total_amounts = {order.id: order.total_amount for order in orders}
+        documents = list(
+            OrderSearchDocument.objects.filter(order_id__in=total_amounts).only('order_id', 'total_amount')
+        )
+        for document in documents:
+            document.total_amount = total_amounts[document.order_id]
+        OrderSearchDocument.objects.bulk_update(documents, ['total_amount'])
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from apps.billing.models import TillSnapshot
+from apps.billing.till import take_snapshot
+
+
+class Command(BaseCommand):
+    help = ('Records the current till counts, for point-in-time till reconciliation. Schedule it and run it '
+            'at shift close.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=[kind for kind, _ in TillSnapshot.KIND_CHOICES],
+                            default=TillSnapshot.SCHEDULED, help='Why the snapshot is taken.')
+        parser.add_argument('--note', default='', help='Free text stored with the snapshot.')
+
+    def handle(self, *args, **options):
+        snapshot = take_snapshot(kind=options['kind'], note=options['note'])
+        total = sum(int(value) * count for value, count in snapshot.counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Till snapshot #{snapshot.id} at {snapshot.taken_at:%Y-%m-%d %H:%M:%S}: ₹{total} "
+            f"up to tender #{snapshot.last_detail_id}."
+        ))
@@ -1,5 +1,16 @@
 from django.db import models
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+
 
 class ActiveManager(models.Manager):
     def get_queryset(self):
-        return super().get_queryset().filter(is_active=True, is_deleted=False)
\ No newline at end of file
+        return super().get_queryset().filter(is_active=True, is_deleted=False)
+
+
+class ProductManager(ActiveManager):
+    def with_available_stock(self):
+        """Annotate ``available_stock`` as the compacted snapshot plus pending ledger deltas."""
+        return self.get_queryset().annotate(
+            available_stock=F('stock_quantity') + Coalesce(Sum('stock_movements__quantity'), 0)
+        )
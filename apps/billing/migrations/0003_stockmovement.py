@@ -0,0 +1,30 @@
+# Generated by Django 4.2.28 on 2026-10-19 08:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_denominationdetail_purchaseorder_is_draft_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(help_text='Signed stock delta, negative for sales')),
+                ('type', models.CharField(choices=[('sale', 'Sale'), ('adjustment', 'Adjustment')], default='sale', max_length=10)),
+                ('created_on', models.DateTimeField(auto_now_add=True, help_text='When the movement was recorded')),
+                ('product', models.ForeignKey(help_text='Product', on_delete=django.db.models.deletion.RESTRICT, related_name='stock_movements', to='billing.product')),
+                ('purchase', models.ForeignKey(blank=True, help_text='Purchase order that caused the movement', null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='stock_movements', to='billing.purchaseorder')),
+            ],
+            options={
+                'verbose_name': 'Stock Movement',
+                'verbose_name_plural': 'Stock Movements',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.28 on 2026-10-19 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_stockmovement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(help_text='Unique identification for Order', max_length=25, unique=True)),
+                ('customer_email', models.EmailField(db_index=True, help_text='Customer Email', max_length=254)),
+                ('purchase_date', models.DateTimeField(db_index=True, help_text='Date of purchase')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('amount_paid', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('archive_file', models.CharField(help_text='Archive file name inside ORDER_ARCHIVE_DIR', max_length=100)),
+                ('offset', models.BigIntegerField(help_text='Byte offset of the compressed record')),
+                ('length', models.IntegerField(help_text='Byte length of the compressed record')),
+                ('archived_on', models.DateTimeField(auto_now_add=True, help_text='When the order was archived')),
+            ],
+            options={
+                'verbose_name': 'Archived Order',
+                'verbose_name_plural': 'Archived Orders',
+                'ordering': ['-purchase_date'],
+            },
+        ),
+    ]
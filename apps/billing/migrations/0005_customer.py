@@ -0,0 +1,50 @@
+# Generated by Django 4.2.28 on 2026-10-19 09:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0004_archivedorder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Customer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField(default=True, help_text='Whether this item is active, use this instead of deleting')),
+                ('created_on', models.DateTimeField(auto_now_add=True, help_text='When this item was originally created')),
+                ('last_updated_on', models.DateTimeField(auto_now=True, help_text='When this item was last modified')),
+                ('is_deleted', models.BooleanField(default=False, help_text='use this for soft deleting')),
+                ('email', models.EmailField(help_text='The normalized (trimmed, lower-cased) customer email', max_length=254, unique=True)),
+            ],
+            options={
+                'verbose_name': 'Customer',
+                'verbose_name_plural': 'Customers',
+                'ordering': ['email'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='archivedorder',
+            name='customer_email',
+            field=models.EmailField(help_text='Customer Email', max_length=254),
+        ),
+        migrations.AlterField(
+            model_name='purchaseorder',
+            name='customer_email',
+            field=models.EmailField(help_text='Customer Email as entered, lookups go through customer', max_length=254),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='customer',
+            field=models.ForeignKey(blank=True, help_text='Customer', null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='archived_orders', to='billing.customer'),
+        ),
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='customer',
+            field=models.ForeignKey(blank=True, help_text='Customer', null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='purchase_orders', to='billing.customer'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.28 on 2026-10-19 09:00
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Lower, Trim
+
+
+def backfill_customers(apps, schema_editor):
+    """Create one customer per normalized email and link existing orders to it."""
+    Customer = apps.get_model('billing', 'Customer')
+    PurchaseOrder = apps.get_model('billing', 'PurchaseOrder')
+    ArchivedOrder = apps.get_model('billing', 'ArchivedOrder')
+
+    for model in (PurchaseOrder, ArchivedOrder):
+        emails = (
+            model.objects.annotate(normalized_email=Lower(Trim('customer_email')))
+            .values_list('normalized_email', flat=True)
+            .distinct()
+            .iterator()
+        )
+        batch = []
+        for email in emails:
+            batch.append(Customer(email=email))
+            if len(batch) >= 1000:
+                Customer.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        Customer.objects.bulk_create(batch, ignore_conflicts=True)
+
+        # One set-based UPDATE resolved through the unique index on Customer.email
+        model.objects.filter(customer__isnull=True).update(customer=Subquery(
+            Customer.objects.filter(email=Lower(Trim(OuterRef('customer_email')))).values('id')[:1]
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0005_customer'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_customers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.28 on 2026-10-19 09:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0006_backfill_customers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('customer', models.OneToOneField(help_text='Customer', on_delete=django.db.models.deletion.RESTRICT, primary_key=True, related_name='stats', serialize=False, to='billing.customer')),
+                ('order_count', models.IntegerField(default=0, help_text='Finalized orders')),
+                ('lifetime_spend', models.DecimalField(decimal_places=2, default=0, help_text='Sum of net amounts of finalized orders', max_digits=14)),
+                ('first_purchase_at', models.DateTimeField(blank=True, help_text='Date of the first purchase', null=True)),
+                ('last_purchase_at', models.DateTimeField(blank=True, help_text='Date of the latest purchase', null=True)),
+                ('last_updated_on', models.DateTimeField(auto_now=True, help_text='When the stats were last changed')),
+            ],
+            options={
+                'verbose_name': 'Customer Stats',
+                'verbose_name_plural': 'Customer Stats',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.28 on 2026-10-19 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0007_customerstats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='purchaseorder',
+            name='purchase_date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, help_text='Date of purchase'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.28 on 2026-10-19 09:24
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.utils.timezone
+
+
+def backfill_created_on(apps, schema_editor):
+    """Existing tenders are dated by their order, the closest timestamp recorded for them."""
+    DenominationDetail = apps.get_model('billing', 'DenominationDetail')
+    PurchaseOrder = apps.get_model('billing', 'PurchaseOrder')
+    DenominationDetail.objects.update(created_on=Subquery(
+        PurchaseOrder.objects.filter(id=OuterRef('purchase_id')).values('purchase_date')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0008_purchaseorder_purchase_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TillSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(db_index=True, help_text='When the counts were read')),
+                ('last_detail_id', models.BigIntegerField(default=0, help_text='Highest DenominationDetail id included')),
+                ('counts', models.JSONField(help_text='Available count per denomination value, e.g. {"500": 10}')),
+                ('kind', models.CharField(choices=[('scheduled', 'Scheduled'), ('shift_close', 'Shift close'), ('manual', 'Manual')], default='scheduled', max_length=15)),
+                ('note', models.CharField(blank=True, help_text='Free text, e.g. who closed the shift', max_length=200)),
+            ],
+            options={
+                'verbose_name': 'Till Snapshot',
+                'verbose_name_plural': 'Till Snapshots',
+                'ordering': ['-taken_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='denominationdetail',
+            name='created_on',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now, help_text='When the notes went into or out of the till'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_created_on, migrations.RunPython.noop),
+    ]
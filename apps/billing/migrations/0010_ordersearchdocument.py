@@ -0,0 +1,78 @@
+# Generated by Django 4.2.28 on 2026-10-19 09:26
+
+from django.db import OperationalError, migrations, models
+import django.db.models.deletion
+
+POSTGRES_FORWARD = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX billing_ordersearch_document_trgm ON billing_ordersearchdocument '
+    'USING gin (document gin_trgm_ops)',
+]
+POSTGRES_BACKWARD = ['DROP INDEX IF EXISTS billing_ordersearch_document_trgm']
+
+# External content table kept in sync by triggers, the trigram tokenizer matches any substring of 3+ characters
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE billing_ordersearch_fts USING fts5(document, content='billing_ordersearchdocument', "
+    "content_rowid='order_id', tokenize='trigram')",
+    'CREATE TRIGGER billing_ordersearch_fts_insert AFTER INSERT ON billing_ordersearchdocument BEGIN '
+    'INSERT INTO billing_ordersearch_fts(rowid, document) VALUES (new.order_id, new.document); END',
+    'CREATE TRIGGER billing_ordersearch_fts_delete AFTER DELETE ON billing_ordersearchdocument BEGIN '
+    "INSERT INTO billing_ordersearch_fts(billing_ordersearch_fts, rowid, document) "
+    "VALUES ('delete', old.order_id, old.document); END",
+    'CREATE TRIGGER billing_ordersearch_fts_update AFTER UPDATE ON billing_ordersearchdocument BEGIN '
+    "INSERT INTO billing_ordersearch_fts(billing_ordersearch_fts, rowid, document) "
+    "VALUES ('delete', old.order_id, old.document); "
+    'INSERT INTO billing_ordersearch_fts(rowid, document) VALUES (new.order_id, new.document); END',
+]
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS billing_ordersearch_fts_insert',
+    'DROP TRIGGER IF EXISTS billing_ordersearch_fts_delete',
+    'DROP TRIGGER IF EXISTS billing_ordersearch_fts_update',
+    'DROP TABLE IF EXISTS billing_ordersearch_fts',
+]
+
+
+def _run(schema_editor, statements_by_vendor):
+    for statement in statements_by_vendor.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        _run(schema_editor, {'postgresql': POSTGRES_FORWARD})
+        return
+    try:
+        _run(schema_editor, {'sqlite': SQLITE_FORWARD[:1]})
+    except OperationalError:
+        # SQLite before 3.34 or built without FTS5, search falls back to scanning the documents
+        return
+    _run(schema_editor, {'sqlite': SQLITE_FORWARD[1:]})
+
+
+def drop_search_index(apps, schema_editor):
+    _run(schema_editor, {'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0009_denominationdetail_created_on_tillsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSearchDocument',
+            fields=[
+                ('order', models.OneToOneField(help_text='Purchase order', on_delete=django.db.models.deletion.RESTRICT, primary_key=True, related_name='search_document', serialize=False, to='billing.purchaseorder')),
+                ('document', models.TextField(help_text='Lower-cased order code, customer email, product codes and names')),
+                ('total_amount', models.DecimalField(db_index=True, decimal_places=2, help_text='Net amount of the order, for amount lookups', max_digits=10)),
+                ('purchase_date', models.DateTimeField(db_index=True, help_text='Date of purchase, newest results come first')),
+            ],
+            options={
+                'verbose_name': 'Order Search Document',
+                'verbose_name_plural': 'Order Search Documents',
+                'ordering': ['-purchase_date'],
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
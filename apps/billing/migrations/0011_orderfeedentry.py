@@ -0,0 +1,41 @@
+# Generated by Django 4.2.28 on 2026-10-19 09:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_feed(apps, schema_editor):
+    """Appends existing finalized orders in purchase order, in one set-based INSERT ... SELECT."""
+    OrderFeedEntry = apps.get_model('billing', 'OrderFeedEntry')
+    PurchaseOrder = apps.get_model('billing', 'PurchaseOrder')
+    quote = schema_editor.connection.ops.quote_name
+    schema_editor.execute(
+        f"INSERT INTO {quote(OrderFeedEntry._meta.db_table)} ({quote('order_id')}, {quote('created_on')}) "
+        f"SELECT {quote('id')}, {quote('purchase_date')} FROM {quote(PurchaseOrder._meta.db_table)} "
+        f"WHERE {quote('is_draft')} = %s ORDER BY {quote('purchase_date')}, {quote('id')}",
+        [False],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0010_ordersearchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderFeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(auto_now_add=True, help_text='When the order entered the feed')),
+                ('order', models.OneToOneField(help_text='Finalized purchase order', on_delete=django.db.models.deletion.RESTRICT, related_name='feed_entry', to='billing.purchaseorder')),
+            ],
+            options={
+                'verbose_name': 'Order Feed Entry',
+                'verbose_name_plural': 'Order Feed Entries',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(backfill_feed, migrations.RunPython.noop),
+    ]
@@ -1,2 +1,8 @@
 from .masters import *
-from .billing import *
\ No newline at end of file
+from .billing import *
+from .stock import *
+from .archive import *
+from .stats import *
+from .till import *
+from .search import *
+from .feed import *
\ No newline at end of file
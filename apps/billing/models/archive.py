@@ -0,0 +1,30 @@
+from django.db import models
+
+from apps.billing.models import Customer
+
+
+class ArchivedOrder(models.Model):
+    """
+    Index of finalized orders moved out of the hot tables by ``archive_orders``.
+    The full order lives as a compressed record at ``offset`` in ``archive_file``.
+    """
+    code = models.CharField(max_length=25, unique=True, help_text='Unique identification for Order')
+    customer = models.ForeignKey(Customer, on_delete=models.RESTRICT, null=True, blank=True,
+                                 related_name='archived_orders', help_text='Customer')
+    customer_email = models.EmailField(help_text='Customer Email')
+    purchase_date = models.DateTimeField(db_index=True, help_text='Date of purchase')
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    archive_file = models.CharField(max_length=100, help_text='Archive file name inside ORDER_ARCHIVE_DIR')
+    offset = models.BigIntegerField(help_text='Byte offset of the compressed record')
+    length = models.IntegerField(help_text='Byte length of the compressed record')
+    archived_on = models.DateTimeField(auto_now_add=True, help_text='When the order was archived')
+
+    class Meta:
+        ordering = ['-purchase_date']
+        verbose_name = 'Archived Order'
+        verbose_name_plural = 'Archived Orders'
+
+    def __str__(self):
+        return f"Archived Order #{self.code} - {self.customer_email} - ₹{self.total_amount}"
@@ -1,18 +1,20 @@
-import math
 import time
 
 from decimal import Decimal
 from django.core.exceptions import ValidationError
 from django.db import models
 
-from apps.billing.models import BaseModel, Product, AmountDenomination
+from apps.billing.models import BaseModel, Customer, Product, AmountDenomination
+from apps.billing.totals import basket_totals
 
 
 class PurchaseOrder(BaseModel):
     """Main purchase/order table"""
     code = models.CharField(max_length=25, unique=True, db_index=True, help_text='Unique identification for Order')
-    customer_email = models.EmailField(db_index=True, help_text='Customer Email')
-    purchase_date = models.DateTimeField(auto_now_add=True, help_text='Date of purchase')
+    customer = models.ForeignKey(Customer, on_delete=models.RESTRICT, null=True, blank=True,
+                                 related_name='purchase_orders', help_text='Customer')
+    customer_email = models.EmailField(help_text='Customer Email as entered, lookups go through customer')
+    purchase_date = models.DateTimeField(auto_now_add=True, db_index=True, help_text='Date of purchase')
     is_draft = models.BooleanField(default=False, help_text='Is draft?')
 
     # Calculated amounts
@@ -38,10 +40,12 @@ class PurchaseOrder(BaseModel):
         """Calculate all totals from purchase items. Floors total_amount for customer benefit."""
         items = self.purchase_items.all()
 
-        self.total_before_tax = sum(item.get_subtotal() for item in items)
-        self.total_tax = sum(item.get_tax_amount() for item in items)
+        # Summed in integer paise, the results equal the per-item Decimal get_subtotal / get_tax_amount sums
+        totals = basket_totals((item.quantity, item.unit_price, item.tax_percentage) for item in items)
+        self.total_before_tax = totals.total_before_tax
+        self.total_tax = totals.total_tax
         # Floor the final amount — customer always pays the rounded-down value
-        self.total_amount = Decimal(math.floor(self.total_before_tax + self.total_tax))
+        self.total_amount = totals.total_amount
 
         if self.amount_paid:
             self.change_given = self.amount_paid - self.total_amount
@@ -53,16 +57,19 @@ class PurchaseOrder(BaseModel):
             'change_given': self.change_given
         }
 
+    @classmethod
+    def generate_code(cls):
+        """Generate an unused order code with millisecond precision"""
+        while True:
+            code = f"PO{int(time.time() * 1000)}"
+            if not cls.all_objects.filter(code=code).exists():
+                return code
+            # In the unlikely event of a collision, we'll try again
+            time.sleep(0.001)  # Wait for 1 millisecond before trying again
+
     def save(self, *args, **kwargs):
         if not self.code:
-            while True:
-                # Generate a code with millisecond precision
-                code = str(int(time.time() * 1000))
-                if not PurchaseOrder.objects.filter(code=code).exists():
-                    self.code = f"PO{code}"
-                    break
-                # In the unlikely event of a collision, we'll try again
-                time.sleep(0.001)  # Wait for 1 millisecond before trying again
+            self.code = self.generate_code()
 
         super().save(*args, **kwargs)
 
@@ -114,6 +121,8 @@ class DenominationDetail(models.Model):
     denomination = models.ForeignKey(AmountDenomination, on_delete=models.RESTRICT)
     count = models.IntegerField()
     type = models.CharField(max_length=10, choices=TYPE_CHOICES)
+    created_on = models.DateTimeField(auto_now_add=True, db_index=True,
+                                      help_text='When the notes went into or out of the till')
 
     class Meta:
         ordering = ['-denomination__value']
@@ -0,0 +1,21 @@
+from django.db import models
+
+from apps.billing.models import PurchaseOrder
+
+
+class OrderFeedEntry(models.Model):
+    """
+    Append-only log of finalized orders. The id is the change feed cursor: entries are appended once the
+    finalizing transaction commits and are served in id order after they settle.
+    """
+    order = models.OneToOneField(PurchaseOrder, on_delete=models.RESTRICT, related_name='feed_entry',
+                                 help_text='Finalized purchase order')
+    created_on = models.DateTimeField(auto_now_add=True, help_text='When the order entered the feed')
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Order Feed Entry'
+        verbose_name_plural = 'Order Feed Entries'
+
+    def __str__(self):
+        return f"Feed #{self.id} - Order #{self.order_id}"
@@ -1,7 +1,7 @@
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
-from apps.billing.managers import ActiveManager
-from core.settings import VALID_DENOMINATIONS
+from apps.billing.managers import ActiveManager, ProductManager
 
 
 class BaseModel(models.Model):
@@ -31,6 +31,8 @@ class Product(BaseModel):
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, help_text="The product unit price")
     tax_percentage = models.DecimalField(max_digits=5, decimal_places=2, help_text="The product tax percentage")
 
+    objects = ProductManager()
+
     class Meta:
         ordering = ['name']
         verbose_name = 'Product'
@@ -49,6 +51,30 @@ class Product(BaseModel):
             raise ValidationError({'stock_quantity': 'Stock quantity cannot be negative'})
 
 
+class Customer(BaseModel):
+    """Customer master table, one row per normalized email"""
+    email = models.EmailField(unique=True, help_text="The normalized (trimmed, lower-cased) customer email")
+
+    class Meta:
+        ordering = ['email']
+        verbose_name = 'Customer'
+        verbose_name_plural = 'Customers'
+
+    def __str__(self):
+        return self.email
+
+    @staticmethod
+    def normalize_email(email):
+        """Emails are matched case-insensitively"""
+        return email.strip().lower()
+
+    @classmethod
+    def for_email(cls, email):
+        """Get or create the customer for an email address"""
+        customer, _ = cls.all_objects.get_or_create(email=cls.normalize_email(email))
+        return customer
+
+
 class AmountDenomination(BaseModel):
     """Currency denomination master table"""
     value = models.IntegerField(unique=True, help_text="The currency denomination value")
@@ -64,10 +90,10 @@ class AmountDenomination(BaseModel):
 
     def clean(self):
         """Validate that denomination is in an allowed list"""
-        if self.value not in VALID_DENOMINATIONS:
+        if self.value not in settings.VALID_DENOMINATIONS:
             raise ValidationError({
                 'value': f'{self.value} is not a valid denomination. '
-                         f'Valid denominations: {", ".join(map(str, VALID_DENOMINATIONS))}'
+                         f'Valid denominations: {", ".join(map(str, settings.VALID_DENOMINATIONS))}'
             })
         if self.available_count < 0:
             raise ValidationError({'available_count': 'Count cannot be negative'})
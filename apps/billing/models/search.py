@@ -0,0 +1,24 @@
+from django.db import models
+
+from apps.billing.models import PurchaseOrder
+
+
+class OrderSearchDocument(models.Model):
+    """
+    Denormalized search text of a finalized order, written when the bill is generated. PostgreSQL indexes
+    ``document`` with a trigram GIN index, SQLite mirrors it into an FTS5 trigram table.
+    """
+    order = models.OneToOneField(PurchaseOrder, on_delete=models.RESTRICT, primary_key=True,
+                                 related_name='search_document', help_text='Purchase order')
+    document = models.TextField(help_text='Lower-cased order code, customer email, product codes and names')
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, db_index=True,
+                                       help_text='Net amount of the order, for amount lookups')
+    purchase_date = models.DateTimeField(db_index=True, help_text='Date of purchase, newest results come first')
+
+    class Meta:
+        ordering = ['-purchase_date']
+        verbose_name = 'Order Search Document'
+        verbose_name_plural = 'Order Search Documents'
+
+    def __str__(self):
+        return f"Search document of order #{self.order_id}"
@@ -0,0 +1,52 @@
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Least
+
+from apps.billing.models import Customer
+
+
+class CustomerStats(models.Model):
+    """Lifetime totals per customer, maintained incrementally when bills are finalized"""
+    customer = models.OneToOneField(Customer, on_delete=models.RESTRICT, primary_key=True, related_name='stats',
+                                    help_text='Customer')
+    order_count = models.IntegerField(default=0, help_text='Finalized orders')
+    lifetime_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                         help_text='Sum of net amounts of finalized orders')
+    first_purchase_at = models.DateTimeField(null=True, blank=True, help_text='Date of the first purchase')
+    last_purchase_at = models.DateTimeField(null=True, blank=True, help_text='Date of the latest purchase')
+    last_updated_on = models.DateTimeField(auto_now=True, help_text='When the stats were last changed')
+
+    class Meta:
+        verbose_name = 'Customer Stats'
+        verbose_name_plural = 'Customer Stats'
+
+    def __str__(self):
+        return f"{self.customer.email} - {self.order_count} orders - ₹{self.lifetime_spend}"
+
+    @classmethod
+    def record_purchase(cls, order):
+        """Adds a finalized order to its customer's stats. Call inside the finalization transaction."""
+        if order.customer_id is None:
+            return
+
+        updated = cls.objects.filter(customer_id=order.customer_id).update(
+            order_count=F('order_count') + 1,
+            lifetime_spend=F('lifetime_spend') + order.total_amount,
+            first_purchase_at=Least('first_purchase_at', Value(order.purchase_date)),
+            last_purchase_at=Greatest('last_purchase_at', Value(order.purchase_date)),
+        )
+        if updated:
+            return
+
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    customer_id=order.customer_id,
+                    order_count=1,
+                    lifetime_spend=order.total_amount,
+                    first_purchase_at=order.purchase_date,
+                    last_purchase_at=order.purchase_date,
+                )
+        except IntegrityError:
+            # A concurrent first purchase created the row, add to it instead
+            cls.record_purchase(order)
@@ -0,0 +1,32 @@
+from django.db import models
+
+from apps.billing.models import Product, PurchaseOrder
+
+
+class StockMovement(models.Model):
+    """
+    Append-only stock ledger. Sales insert rows here instead of updating the product row,
+    and ``compact_stock_ledger`` periodically folds them into ``Product.stock_quantity``.
+    """
+    SALE = 'sale'
+    ADJUSTMENT = 'adjustment'
+    TYPE_CHOICES = [
+        (SALE, 'Sale'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.RESTRICT, related_name='stock_movements',
+                                help_text='Product')
+    purchase = models.ForeignKey(PurchaseOrder, on_delete=models.RESTRICT, null=True, blank=True,
+                                 related_name='stock_movements', help_text='Purchase order that caused the movement')
+    quantity = models.IntegerField(help_text='Signed stock delta, negative for sales')
+    type = models.CharField(max_length=10, choices=TYPE_CHOICES, default=SALE)
+    created_on = models.DateTimeField(auto_now_add=True, help_text='When the movement was recorded')
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Stock Movement'
+        verbose_name_plural = 'Stock Movements'
+
+    def __str__(self):
+        return f"{self.product.code} {self.quantity:+d} ({self.get_type_display()})"
@@ -0,0 +1,30 @@
+from django.db import models
+
+
+class TillSnapshot(models.Model):
+    """
+    Counts per denomination in the till at ``taken_at``. ``last_detail_id`` is the high-water mark: every
+    ``DenominationDetail`` up to it is reflected in the counts, none after it.
+    """
+    SCHEDULED = 'scheduled'
+    SHIFT_CLOSE = 'shift_close'
+    MANUAL = 'manual'
+    KIND_CHOICES = [
+        (SCHEDULED, 'Scheduled'),
+        (SHIFT_CLOSE, 'Shift close'),
+        (MANUAL, 'Manual'),
+    ]
+
+    taken_at = models.DateTimeField(db_index=True, help_text='When the counts were read')
+    last_detail_id = models.BigIntegerField(default=0, help_text='Highest DenominationDetail id included')
+    counts = models.JSONField(help_text='Available count per denomination value, e.g. {"500": 10}')
+    kind = models.CharField(max_length=15, choices=KIND_CHOICES, default=SCHEDULED)
+    note = models.CharField(max_length=200, blank=True, help_text='Free text, e.g. who closed the shift')
+
+    class Meta:
+        ordering = ['-taken_at']
+        verbose_name = 'Till Snapshot'
+        verbose_name_plural = 'Till Snapshots'
+
+    def __str__(self):
+        return f"Till at {self.taken_at:%Y-%m-%d %H:%M} ({self.get_kind_display()})"
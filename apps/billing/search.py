@@ -0,0 +1,109 @@
+"""
+Order search for support staff.
+
+Every finalized order has an ``OrderSearchDocument`` holding its code, customer email and the codes and
+names of its products as one lower-cased string. A query is split into terms and an order matches when
+every term is a substring of its document, or, for numeric terms, equals its amount.
+
+PostgreSQL answers substring matches from a ``pg_trgm`` GIN index, SQLite from an FTS5 trigram table
+kept in sync by triggers. Terms shorter than a trigram, and databases without either index, fall back
+to scanning the documents.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from apps.billing.models import OrderSearchDocument
+
+FTS_TABLE = 'billing_ordersearch_fts'
+TRIGRAM_LENGTH = 3
+MAX_TERMS = 8
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# total_amount is DecimalField(max_digits=10, decimal_places=2), larger numbers are never amounts
+MAX_AMOUNT = Decimal(10) ** 8
+
+_fts_available = None
+
+
+def build_document(code, customer_email, products):
+    """Search text for an order, ``products`` being ``(code, name)`` pairs."""
+    parts = [code, customer_email]
+    for product_code, name in products:
+        parts += [product_code, name]
+    return ' '.join(parts).lower()
+
+
+def document_for(order, purchase_items):
+    """Unsaved search document of a finalized order and its items (with products loaded)."""
+    return OrderSearchDocument(
+        order=order,
+        document=build_document(order.code, order.customer_email,
+                                ((item.product.code, item.product.name) for item in purchase_items)),
+        total_amount=order.total_amount,
+        purchase_date=order.purchase_date,
+    )
+
+
+def index_order(order, purchase_items):
+    """Writes or refreshes an order's search document. Call inside the finalization transaction."""
+    document = document_for(order, purchase_items)
+    OrderSearchDocument.objects.update_or_create(order=order, defaults={
+        'document': document.document,
+        'total_amount': document.total_amount,
+        'purchase_date': document.purchase_date,
+    })
+
+
+def _uses_fts():
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+    return _fts_available
+
+
+def _amount(term):
+    """The term as an order amount, or None."""
+    try:
+        amount = Decimal(term)
+    except InvalidOperation:
+        return None
+    if amount.is_finite() and abs(amount) < MAX_AMOUNT and amount.as_tuple().exponent >= -2:
+        return amount
+    return None
+
+
+def _fts_match(terms):
+    # Quoted FTS5 strings are matched as substrings by the trigram tokenizer, AND lets FTS5 intersect them
+    expression = ' AND '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+    return Q(order_id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expression]))
+
+
+def _text_match(term):
+    if len(term) >= TRIGRAM_LENGTH and _uses_fts():
+        return _fts_match([term])
+    # LIKE '%term%' on the lower-cased document, which the PostgreSQL trigram index serves
+    return Q(document__contains=term)
+
+
+def search_orders(query, limit=DEFAULT_LIMIT):
+    """Newest search documents matching every term of ``query``, with their orders loaded."""
+    terms = query.lower().split()[:MAX_TERMS]
+    if not terms:
+        return []
+
+    documents = OrderSearchDocument.objects.select_related('order')
+    fts_terms = []
+    for term in terms:
+        amount = _amount(term)
+        if amount is not None:
+            documents = documents.filter(_text_match(term) | Q(total_amount=amount))
+        elif len(term) >= TRIGRAM_LENGTH and _uses_fts():
+            fts_terms.append(term)
+        else:
+            documents = documents.filter(_text_match(term))
+    if fts_terms:
+        documents = documents.filter(_fts_match(fts_terms))
+    return list(documents.order_by('-purchase_date')[:min(limit, MAX_LIMIT)])
@@ -1,3 +1,509 @@
-from django.test import TestCase
+import importlib
+import io
+import math
+import os
+import random
+import tempfile
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from apps.api.checkout import settle_order
+from apps.api.models import IdempotencyKey
+from apps.billing import totals
+from apps.billing.archive import ArchiveError, append_records, load_archived_order
+from apps.billing.models import (
+    AmountDenomination, ArchivedOrder, Customer, CustomerStats, DenominationDetail, OrderFeedEntry,
+    OrderSearchDocument, Product, PurchaseItem, PurchaseOrder, StockMovement, TillSnapshot,
+)
+from apps.billing.search import index_order, search_orders
+from apps.billing.till import ReconciliationError, take_snapshot, till_at
+from apps.billing.totals import basket_totals, order_totals
+from core.paginators import EstimatedCountPaginator
+
+
+def _random_line(rng):
+    quantity = rng.choice([1, 2, 3, rng.randint(1, 50), rng.randint(1, 100000)])
+    unit_price = Decimal(rng.randint(0, 10 ** 7)).scaleb(rng.choice([-2, -2, -1, 0]))
+    tax_percentage = Decimal(rng.choice([0, 500, 1200, 1800, 2800, 1825, 1850, rng.randint(0, 10000)])).scaleb(
+        rng.choice([-2, -2, -1, 0]) if rng.random() < 0.2 else -2
+    )
+    if tax_percentage > 100:
+        tax_percentage = Decimal('100.00')
+    return quantity, unit_price, tax_percentage
+
+
+def _reference_totals(lines):
+    """The original per-item Decimal implementation of PurchaseOrder.calculate_totals."""
+    items = [PurchaseItem(quantity=q, unit_price=p, tax_percentage=t) for q, p, t in lines]
+    total_before_tax = sum(item.get_subtotal() for item in items)
+    total_tax = sum(item.get_tax_amount() for item in items)
+    return total_before_tax, total_tax, Decimal(math.floor(total_before_tax + total_tax))
+
+
+class BasketTotalsPropertyTests(SimpleTestCase):
+    """Randomized checks that the paise engine matches the Decimal implementation exactly."""
+
+    ITERATIONS = 300
+
+    def assertSameDecimals(self, actual, expected):
+        # str() comparison also catches differing exponents, which surface in API responses
+        self.assertEqual([str(value) for value in actual], [str(value) for value in expected])
+
+    def _check_random_baskets(self, max_lines):
+        rng = random.Random(max_lines)
+        for _ in range(self.ITERATIONS):
+            lines = [_random_line(rng) for _ in range(rng.randint(0, max_lines))]
+            with self.subTest(lines=lines[:5]):
+                self.assertSameDecimals(basket_totals(lines), _reference_totals(lines))
+
+    def test_small_baskets_match_decimal_results(self):
+        self._check_random_baskets(max_lines=10)
+
+    def test_large_baskets_match_decimal_results(self):
+        self.ITERATIONS = 20
+        self._check_random_baskets(max_lines=1000)
+
+    def test_large_baskets_match_without_numpy(self):
+        self.ITERATIONS = 20
+        with mock.patch.object(totals, 'numpy', None):
+            self._check_random_baskets(max_lines=1000)
+
+    @skipIf(totals.load_numpy() is None, 'NumPy is not installed')
+    def test_int64_overflow_falls_back_to_python_ints(self):
+        lines = [(2 ** 31 - 1, Decimal('99999999.99'), Decimal('100.00'))] * totals.NUMPY_MIN_LINES
+        self.assertSameDecimals(basket_totals(lines), _reference_totals(lines))
+
+    def test_empty_basket(self):
+        self.assertSameDecimals(basket_totals([]), _reference_totals([]))
+
+    def test_rejects_sub_paise_prices(self):
+        with self.assertRaises(ValueError):
+            basket_totals([(1, Decimal('1.005'), Decimal('5.00'))])
+
+    def test_order_totals_match_per_order_baskets(self):
+        rng = random.Random(7)
+        baskets = {order_id: [_random_line(rng) for _ in range(rng.randint(1, 40))] for order_id in range(1, 60)}
+        rows = [(order_id, *line) for order_id, lines in baskets.items() for line in lines]
+
+        for ordered_rows in (rows, rng.sample(rows, len(rows))):
+            result = order_totals(ordered_rows)
+            self.assertEqual(set(result), set(baskets))
+            for order_id, lines in baskets.items():
+                self.assertSameDecimals(result[order_id], _reference_totals(lines))
+
+
+class StockLedgerTests(TestCase):
+
+    def setUp(self):
+        self.soap = Product.objects.create(code='P100', name='Lavender Soap', unit_price=40, tax_percentage=18,
+                                           stock_quantity=50)
+        self.rice = Product.objects.create(code='P200', name='Basmati Rice', unit_price=120, tax_percentage=5,
+                                           stock_quantity=10)
+
+    def _available(self):
+        return dict(Product.objects.with_available_stock().values_list('code', 'available_stock'))
+
+    def _compact(self, *args):
+        call_command('compact_stock_ledger', *args, stdout=io.StringIO())
+
+    def test_available_stock_adds_pending_movements(self):
+        StockMovement.objects.create(product=self.soap, quantity=-3)
+        StockMovement.objects.create(product=self.soap, quantity=-4)
+        StockMovement.objects.create(product=self.soap, quantity=5, type=StockMovement.ADJUSTMENT)
+        self.assertEqual(self._available(), {'P100': 48, 'P200': 10})
+
+    def test_compaction_preserves_available_stock_and_is_idempotent(self):
+        for quantity in (-1, -2, -3, 4, -5):
+            StockMovement.objects.create(product=self.soap, quantity=quantity)
+        StockMovement.objects.create(product=self.rice, quantity=-10)
+
+        self._compact('--batch-size', '2')
+        self.assertFalse(StockMovement.objects.exists())
+        self.soap.refresh_from_db()
+        self.rice.refresh_from_db()
+        self.assertEqual((self.soap.stock_quantity, self.rice.stock_quantity), (43, 0))
+        self.assertEqual(self._available(), {'P100': 43, 'P200': 0})
+
+        self._compact()
+        self.soap.refresh_from_db()
+        self.assertEqual(self.soap.stock_quantity, 43)
+
+    def _finalize(self, quantity):
+        order = PurchaseOrder.objects.create(customer_email='a@x.com', is_draft=True)
+        PurchaseItem.objects.create(purchase=order, product=self.soap, quantity=quantity,
+                                    unit_price=self.soap.unit_price, tax_percentage=self.soap.tax_percentage)
+        settle_order(order, {'paid_amount': Decimal(0), 'balance': Decimal(0), 'paid': [], 'change': []})
+        self.soap.refresh_from_db()
+
+    @override_settings(STOCK_LEDGER_ENABLED=True)
+    def test_sales_append_to_the_ledger_when_enabled(self):
+        self._finalize(3)
+        self.assertEqual(self.soap.stock_quantity, 50)
+        self.assertEqual(list(StockMovement.objects.values_list('product_id', 'quantity', 'type')),
+                         [(self.soap.id, -3, StockMovement.SALE)])
+        self.assertEqual(self._available()['P100'], 47)
+
+    @override_settings(STOCK_LEDGER_ENABLED=False)
+    def test_sales_update_the_product_when_disabled(self):
+        self._finalize(3)
+        self.assertEqual(self.soap.stock_quantity, 47)
+        self.assertFalse(StockMovement.objects.exists())
+
+
+class EstimatedCountPaginatorTests(TestCase):
+
+    def setUp(self):
+        self.superuser = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        for number in range(3):
+            PurchaseOrder.objects.create(customer_email=f"customer{number}@example.com", is_draft=number == 0)
+
+    def _changelist_paginator(self, query=''):
+        request = RequestFactory().get(f"/admin/billing/purchaseorder/{query}")
+        request.user = self.superuser
+        return admin.site._registry[PurchaseOrder].get_changelist_instance(request).paginator
+
+    def test_default_manager_filter_counts_as_unfiltered(self):
+        self.assertTrue(EstimatedCountPaginator._is_unfiltered(PurchaseOrder.objects.all()))
+        self.assertTrue(EstimatedCountPaginator._is_unfiltered(PurchaseItem.objects.all()))
+        self.assertFalse(EstimatedCountPaginator._is_unfiltered(PurchaseOrder.objects.filter(is_draft=True)))
+        self.assertFalse(EstimatedCountPaginator._is_unfiltered(PurchaseOrder.all_objects.all()))
+
+    def test_changelist_filters(self):
+        self.assertTrue(EstimatedCountPaginator._is_unfiltered(self._changelist_paginator().object_list))
+        self.assertFalse(EstimatedCountPaginator._is_unfiltered(
+            self._changelist_paginator('?is_draft__exact=1').object_list))
+
+    def test_growing_tables_use_estimated_counts(self):
+        self.client.force_login(self.superuser)
+        for model in (PurchaseOrder, PurchaseItem, DenominationDetail, StockMovement, Customer, CustomerStats,
+                      ArchivedOrder, OrderSearchDocument, OrderFeedEntry, IdempotencyKey):
+            with self.subTest(model=model.__name__):
+                self.assertIs(admin.site._registry[model].paginator, EstimatedCountPaginator)
+                opts = model._meta
+                response = self.client.get(f"/admin/{opts.app_label}/{opts.model_name}/")
+                self.assertEqual(response.status_code, 200)
+
+    def test_count_uses_large_estimates_only(self):
+        paginator = EstimatedCountPaginator(PurchaseOrder.objects.order_by('id'), 50)
+        self.assertEqual(paginator.count, 3)
+
+        for estimate, expected in ((None, 3), (500, 3), (250000, 250000)):
+            with self.subTest(estimate=estimate):
+                paginator = EstimatedCountPaginator(PurchaseOrder.objects.order_by('id'), 50)
+                with mock.patch.object(EstimatedCountPaginator, '_estimate_count', return_value=estimate):
+                    self.assertEqual(paginator.count, expected)
+
+
+class GenerateDatasetTests(TestCase):
+
+    def _generate(self, prefix):
+        call_command('generate_dataset', seed=7, products=20, customers=10, orders=60, days=1, batch_size=25,
+                     end_date=datetime(2026, 1, 31), prefix=prefix, stdout=io.StringIO())
+
+    def test_runs_with_different_prefixes_share_a_database(self):
+        self._generate('SYNA')
+        self._generate('SYNB')
+
+        end = timezone.make_aware(datetime.combine(datetime(2026, 2, 1), time.min))
+        orders = PurchaseOrder.all_objects.all()
+        self.assertEqual(orders.filter(code__startswith='POSYNA').count(), 60)
+        self.assertEqual(orders.filter(code__startswith='POSYNB').count(), 60)
+        self.assertFalse(orders.filter(purchase_date__gte=end).exists())
+        self.assertFalse(orders.filter(purchase_date__lt=end - timedelta(days=1)).exists())
+
+        with self.assertRaises(CommandError):
+            self._generate('SYNA')
+
+
+class OrderArchiveTests(TestCase):
+
+    def setUp(self):
+        self.archive_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(ORDER_ARCHIVE_DIR=self.archive_dir))
+
+        soap = Product.objects.create(code='P100', name='Lavender Soap', unit_price=40, tax_percentage=18)
+        note = AmountDenomination.objects.create(value=100, available_count=5)
+        self.old, self.recent = (
+            PurchaseOrder.objects.create(customer_email='ravi@example.com', total_before_tax=Decimal('80.00'),
+                                         total_tax=Decimal('14.40'), total_amount=Decimal('94.00'),
+                                         amount_paid=Decimal('100.00'), change_given=Decimal('6.00'))
+            for _ in range(2)
+        )
+        for order in (self.old, self.recent):
+            PurchaseItem.objects.create(purchase=order, product=soap, quantity=2, unit_price=soap.unit_price,
+                                        tax_percentage=soap.tax_percentage)
+            DenominationDetail.objects.create(purchase=order, denomination=note, count=1,
+                                              type=DenominationDetail.PAID)
+        PurchaseOrder.objects.filter(id=self.old.id).update(purchase_date=timezone.now() - timedelta(days=400))
+
+    def test_archived_orders_round_trip(self):
+        call_command('archive_orders', '--months', '12', stdout=io.StringIO())
+
+        self.assertFalse(PurchaseOrder.all_objects.filter(id=self.old.id).exists())
+        self.assertTrue(PurchaseOrder.objects.filter(id=self.recent.id).exists())
+        self.assertEqual(list(ArchivedOrder.objects.values_list('code', flat=True)), [self.old.code])
+
+        order, items, details = load_archived_order(code=self.old.code)
+        self.assertEqual((order.code, order.customer_email, order.total_amount, order.change_given),
+                         (self.old.code, 'ravi@example.com', Decimal('94.00'), Decimal('6.00')))
+        self.assertEqual([(item.product.code, item.quantity, item.get_total()) for item in items],
+                         [('P100', 2, Decimal('94.40'))])
+        self.assertEqual([(detail.denomination.value, detail.count, detail.type) for detail in details],
+                         [(100, 1, DenominationDetail.PAID)])
+        self.assertIsNone(load_archived_order(code='PO-MISSING'))
+
+    def test_appends_report_the_offsets_they_wrote(self):
+        first = append_records('orders-test.arc', [b'abc', b'de'])
+        second = append_records('orders-test.arc', [b'fgh'])
+        self.assertEqual(first + second, [(0, 3), (3, 2), (5, 3)])
+
+    def test_missing_archive_file_is_an_archive_error(self):
+        call_command('archive_orders', '--months', '12', stdout=io.StringIO())
+        archived = ArchivedOrder.objects.get()
+        os.remove(os.path.join(self.archive_dir, archived.archive_file))
+        with self.assertRaises(ArchiveError):
+            load_archived_order(code=archived.code)
+        self.assertEqual(self.client.get(f"/bill/{archived.code}/").status_code, 404)
+
+
+class RecomputeOrderTotalsTests(TestCase):
+
+    def _order(self, code, is_draft=False):
+        # Stored totals from before a tax correction: 40 at 0% instead of 18%
+        order = PurchaseOrder.objects.create(code=code, customer_email='ravi@example.com', is_draft=is_draft,
+                                             total_before_tax=40, total_tax=0, total_amount=40, amount_paid=50,
+                                             change_given=10)
+        items = [PurchaseItem.objects.create(purchase=order, product=self.soap, quantity=1, unit_price=40,
+                                             tax_percentage=18)]
+        if not is_draft:
+            index_order(order, items)
+        return order
+
+    def setUp(self):
+        self.soap = Product.objects.create(code='P100', name='Lavender Soap', unit_price=40, tax_percentage=18)
+
+    def test_recomputes_finalized_orders_and_leaves_change_for_review(self):
+        finalized = self._order('PO1001')
+        draft = self._order('PO1002', is_draft=True)
+
+        output = io.StringIO()
+        call_command('recompute_order_totals', stdout=output)
+
+        finalized.refresh_from_db()
+        self.assertEqual((finalized.total_tax, finalized.total_amount), (Decimal('7.20'), Decimal('47')))
+        self.assertEqual(finalized.change_given, Decimal('10'))
+        self.assertEqual(finalized.search_document.total_amount, Decimal('47'))
+        draft.refresh_from_db()
+        self.assertEqual(draft.total_amount, Decimal('40'))
+
+        self.assertIn('Updated 1 of 1 orders.', output.getvalue())
+        self.assertIn('review them: PO1001.', output.getvalue())
+        self.assertIn('rebuild_customer_stats', output.getvalue())
+
+    def test_dry_run_saves_nothing(self):
+        finalized = self._order('PO1001')
+        output = io.StringIO()
+        call_command('recompute_order_totals', dry_run=True, stdout=output)
+
+        finalized.refresh_from_db()
+        self.assertEqual(finalized.total_amount, Decimal('40'))
+        self.assertIn('Would update 1 of 1 orders.', output.getvalue())
+        self.assertNotIn('rebuild_customer_stats', output.getvalue())
+
+
+class CustomerTests(TestCase):
+
+    def test_emails_are_normalized_to_one_customer(self):
+        self.assertEqual(Customer.normalize_email('  Ravi.K@Example.COM '), 'ravi.k@example.com')
+        customer = Customer.for_email('Ravi.K@Example.com')
+        self.assertEqual(Customer.for_email(' ravi.k@example.com'), customer)
+        self.assertEqual(customer.email, 'ravi.k@example.com')
+
+        # A deactivated customer is reused, not duplicated against the unique email
+        Customer.all_objects.filter(id=customer.id).update(is_active=False)
+        self.assertEqual(Customer.for_email('RAVI.K@example.com'), customer)
+        self.assertEqual(Customer.all_objects.count(), 1)
+
+    def test_backfill_creates_one_customer_per_normalized_email(self):
+        backfill = importlib.import_module('apps.billing.migrations.0006_backfill_customers').backfill_customers
+        orders = [PurchaseOrder.objects.create(customer_email=email)
+                  for email in ('Ravi@Example.com', ' ravi@example.com ', 'meera@example.com')]
+        archived = ArchivedOrder.objects.create(code='PO-OLD', customer_email='RAVI@EXAMPLE.COM',
+                                                purchase_date=timezone.now(), archive_file='orders-2024-01.arc',
+                                                offset=0, length=1)
+        linked = PurchaseOrder.objects.create(customer_email='ravi@example.com',
+                                              customer=Customer.for_email('ravi@example.com'))
+
+        backfill(django_apps, None)
+
+        self.assertEqual(sorted(Customer.objects.values_list('email', flat=True)),
+                         ['meera@example.com', 'ravi@example.com'])
+        ravi = Customer.objects.get(email='ravi@example.com')
+        for order in orders + [linked]:
+            order.refresh_from_db()
+        archived.refresh_from_db()
+        meera = Customer.objects.get(email='meera@example.com')
+        self.assertEqual([order.customer for order in orders], [ravi, ravi, meera])
+        self.assertEqual((archived.customer, linked.customer), (ravi, ravi))
+
+
+class CustomerStatsTests(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.for_email('ravi@example.com')
+        self.now = timezone.now()
+
+    def _order(self, amount, days_ago):
+        order = PurchaseOrder.objects.create(customer=self.customer, customer_email='ravi@example.com',
+                                             total_amount=Decimal(amount))
+        PurchaseOrder.objects.filter(id=order.id).update(purchase_date=self.now - timedelta(days=days_ago))
+        order.refresh_from_db()
+        return order
+
+    def _stats(self):
+        stats = CustomerStats.objects.get(customer=self.customer)
+        return stats.order_count, stats.lifetime_spend, stats.first_purchase_at, stats.last_purchase_at
+
+    def test_purchases_accumulate_in_any_order(self):
+        for amount, days_ago in (('100.00', 5), ('40.50', 9), ('10.00', 1)):
+            CustomerStats.record_purchase(self._order(amount, days_ago))
+        self.assertEqual(self._stats(), (3, Decimal('150.50'), self.now - timedelta(days=9),
+                                         self.now - timedelta(days=1)))
+
+        CustomerStats.record_purchase(PurchaseOrder.objects.create(customer_email='guest@example.com'))
+        self.assertEqual(CustomerStats.objects.count(), 1)
+
+    def test_concurrent_first_purchase_is_added_to_the_winner(self):
+        CustomerStats.record_purchase(self._order('100.00', 5))
+        second = self._order('20.00', 2)
+
+        real_filter = CustomerStats.objects.filter
+        calls = []
+
+        def racing_filter(*args, **kwargs):
+            # The first update runs before the concurrent insert is visible and matches no row
+            calls.append(kwargs)
+            if len(calls) == 1:
+                stale = mock.Mock()
+                stale.update.return_value = 0
+                return stale
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(CustomerStats.objects, 'filter', side_effect=racing_filter):
+            CustomerStats.record_purchase(second)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self._stats(), (2, Decimal('120.00'), self.now - timedelta(days=5),
+                                         self.now - timedelta(days=2)))
+
+    def test_rebuild_matches_incremental_stats_and_counts_archived_orders(self):
+        for amount, days_ago in (('100.00', 5), ('40.50', 9)):
+            CustomerStats.record_purchase(self._order(amount, days_ago))
+        PurchaseOrder.objects.create(customer=self.customer, customer_email='ravi@example.com', is_draft=True,
+                                     total_amount=Decimal('999.00'))
+        incremental = self._stats()
+
+        call_command('rebuild_customer_stats', stdout=io.StringIO())
+        self.assertEqual(self._stats(), incremental)
+
+        ArchivedOrder.objects.create(code='PO-OLD', customer=self.customer, customer_email='ravi@example.com',
+                                     purchase_date=self.now - timedelta(days=400), total_amount=Decimal('5.00'),
+                                     archive_file='orders-2024-01.arc', offset=0, length=1)
+        call_command('rebuild_customer_stats', stdout=io.StringIO())
+        self.assertEqual(self._stats(), (3, Decimal('145.50'), self.now - timedelta(days=400),
+                                         self.now - timedelta(days=5)))
+
+
+class TillReconciliationTests(TestCase):
+
+    def setUp(self):
+        self.note = AmountDenomination.objects.create(value=500, available_count=2)
+        self.coin = AmountDenomination.objects.create(value=10, available_count=5)
+
+    def _tender(self, denomination, count, type, created_on):
+        order = PurchaseOrder.objects.create(customer_email='a@x.com')
+        detail = DenominationDetail.objects.create(purchase=order, denomination=denomination, count=count,
+                                                   type=type)
+        DenominationDetail.objects.filter(id=detail.id).update(created_on=created_on)
+
+    def test_till_is_snapshot_plus_later_tenders(self):
+        snapshot = take_snapshot()
+        self.assertEqual(snapshot.counts, {'500': 2, '10': 5})
+        start = snapshot.taken_at
+        self._tender(self.note, 1, DenominationDetail.PAID, start + timedelta(minutes=1))
+        self._tender(self.coin, 3, DenominationDetail.BALANCE, start + timedelta(minutes=1))
+        self._tender(self.note, 4, DenominationDetail.PAID, start + timedelta(minutes=10))
+
+        state = till_at(start + timedelta(minutes=5))
+        self.assertEqual(state.snapshot, snapshot)
+        self.assertEqual(state.counts, {500: 3, 10: 2})
+        self.assertEqual(state.deltas_scanned, 2)
+        self.assertEqual(till_at(start + timedelta(minutes=15)).counts, {500: 7, 10: 2})
+
+    def test_scan_stops_at_the_next_snapshot(self):
+        first = take_snapshot()
+        self._tender(self.note, 1, DenominationDetail.PAID, first.taken_at)
+        second = take_snapshot()
+        second.taken_at = first.taken_at + timedelta(hours=1)
+        second.save()
+        # Recorded before ``moment`` but after the next snapshot's high-water mark, as after a clock step back
+        self._tender(self.note, 7, DenominationDetail.PAID, first.taken_at)
+
+        state = till_at(first.taken_at + timedelta(minutes=30))
+        self.assertEqual(state.counts[500], 3)
+        self.assertEqual(state.deltas_scanned, 1)
+
+    def test_needs_an_earlier_snapshot(self):
+        TillSnapshot.objects.create(taken_at=timezone.now(), counts={})
+        with self.assertRaises(ReconciliationError):
+            till_at(timezone.now() - timedelta(days=1))
+
+
+class OrderSearchTests(TestCase):
+
+    def _order(self, code, email, total, *products):
+        order = PurchaseOrder.objects.create(code=code, customer_email=email, total_amount=Decimal(total))
+        items = [
+            PurchaseItem.objects.create(purchase=order, product=product, quantity=1, unit_price=product.unit_price,
+                                        tax_percentage=product.tax_percentage)
+            for product in products
+        ]
+        index_order(order, items)
+        return order
+
+    def setUp(self):
+        soap = Product.objects.create(code='P100', name='Lavender Soap', unit_price=40, tax_percentage=18)
+        rice = Product.objects.create(code='P200', name='Basmati Rice', unit_price=120, tax_percentage=5)
+        self.first = self._order('PO1001', 'Asha.K@example.com', '47.00', soap)
+        self.second = self._order('PO1002', 'ravi@example.com', '173.00', soap, rice)
+
+    def _codes(self, query):
+        return [document.order.code for document in search_orders(query)]
+
+    def test_matches_partial_email_product_and_code(self):
+        self.assertEqual(self._codes('asha.k'), [self.first.code])
+        self.assertEqual(self._codes('LAVENDER'), [self.second.code, self.first.code])
+        self.assertEqual(self._codes('p200'), [self.second.code])
+        self.assertEqual(self._codes('o1001'), [self.first.code])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self._codes('soap ravi'), [self.second.code])
+        self.assertEqual(self._codes('rice asha'), [])
+
+    def test_numbers_match_amounts(self):
+        self.assertEqual(self._codes('173'), [self.second.code])
+        self.assertEqual(self._codes('ra 47.00'), [])
+        self.assertEqual(self._codes('12345678901234567890'), [])
+
+    def test_reindexing_replaces_the_document(self):
+        self.second.customer_email = 'meera@example.com'
+        index_order(self.second, self.second.purchase_items.select_related('product'))
+        self.assertEqual(self._codes('ravi'), [])
+        self.assertEqual(self._codes('meera'), [self.second.code])
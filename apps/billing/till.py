@@ -0,0 +1,73 @@
+"""
+Point-in-time till state.
+
+``take_snapshot`` records the till counts together with the highest ``DenominationDetail`` id they
+include. The till at any later moment is the latest snapshot before it plus the tenders recorded
+between the two, so an audit scans at most one snapshot interval of tenders instead of all history.
+
+Tenders are the only till movements recorded row by row. Edits to ``AmountDenomination`` counts (refills,
+banking) show up from the next snapshot on, so take one right after them.
+"""
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, Max, Sum, When
+from django.utils import timezone
+
+from apps.billing.models import AmountDenomination, ArchivedOrder, DenominationDetail, TillSnapshot
+
+TillState = namedtuple('TillState', ['at', 'snapshot', 'counts', 'deltas_scanned'])
+
+
+class ReconciliationError(Exception):
+    """The till can't be reconstructed for the requested moment."""
+
+
+def take_snapshot(kind=TillSnapshot.SCHEDULED, note=''):
+    """Records the current till counts and their high-water mark."""
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # SHARE mode waits for bills still writing tenders and holds new ones back until this commits, so the
+            # counts and the high-water mark cover the same tenders. Bills only wait for the two reads below.
+            with connection.cursor() as cursor:
+                cursor.execute(f"LOCK TABLE {connection.ops.quote_name(DenominationDetail._meta.db_table)} "
+                               f"IN SHARE MODE")
+        last_detail_id = DenominationDetail.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        counts = {str(value): count for value, count in
+                  AmountDenomination.all_objects.values_list('value', 'available_count')}
+        return TillSnapshot.objects.create(
+            taken_at=timezone.now(), last_detail_id=last_detail_id, counts=counts, kind=kind, note=note,
+        )
+
+
+def till_at(moment):
+    """
+    Till counts at ``moment``: the latest snapshot taken at or before it, plus the tenders recorded after
+    that snapshot up to ``moment``. Raises ``ReconciliationError`` when no snapshot precedes ``moment`` or
+    when orders in between have been archived, since their tenders are no longer in the table.
+    """
+    snapshot = TillSnapshot.objects.filter(taken_at__lte=moment).order_by('-taken_at').first()
+    if snapshot is None:
+        raise ReconciliationError(f"No till snapshot was taken before {moment.isoformat()}.")
+    if ArchivedOrder.objects.filter(purchase_date__gt=snapshot.taken_at, purchase_date__lte=moment).exists():
+        raise ReconciliationError(f"Orders between {snapshot.taken_at.isoformat()} and {moment.isoformat()} "
+                                  f"have been archived.")
+
+    tenders = DenominationDetail.objects.filter(id__gt=snapshot.last_detail_id, created_on__lte=moment)
+    # Tenders after the next snapshot's high-water mark can't predate ``moment``, this bounds the scan
+    next_snapshot = TillSnapshot.objects.filter(taken_at__gt=moment).order_by('taken_at').first()
+    if next_snapshot is not None:
+        tenders = tenders.filter(id__lte=next_snapshot.last_detail_id)
+
+    counts = {int(value): count for value, count in snapshot.counts.items()}
+    deltas = tenders.order_by().values('denomination__value').annotate(
+        delta=Sum(Case(When(type=DenominationDetail.BALANCE, then=-F('count')), default=F('count'))),
+        rows=Count('id'),
+    )
+    scanned = 0
+    for row in deltas:
+        value = row['denomination__value']
+        counts[value] = counts.get(value, 0) + row['delta']
+        scanned += row['rows']
+
+    return TillState(at=moment, snapshot=snapshot, counts=counts, deltas_scanned=scanned)
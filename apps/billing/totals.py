@@ -0,0 +1,199 @@
+"""
+Totals engine working on integer paise.
+
+Unit prices are converted to integer paise and tax rates to integer basis points, so a line's tax is
+the exact integer ``quantity * paise * basis_points`` in millionths of a rupee and every sum is exact.
+That lets the engine reproduce the ``Decimal`` arithmetic of ``PurchaseItem.get_*`` and
+``PurchaseOrder.calculate_totals`` digit for digit, including the exponent of the returned Decimals.
+
+NumPy is used to sum large baskets and bulk recomputations when it is installed, otherwise the same
+integer arithmetic runs in pure Python. It is imported on the first large basket rather than at startup,
+where it would take longer to import than all the models.
+"""
+from collections import namedtuple
+from decimal import Decimal
+from operator import mul
+
+
+HUNDRED = Decimal('100')
+PAISE_PER_RUPEE = 10 ** 2
+BASIS_POINTS_PER_RATE = 10 ** 4
+# subtotal (paise) * basis points is in units of 10^-6 rupees
+MICRO_PER_RUPEE = PAISE_PER_RUPEE * BASIS_POINTS_PER_RATE
+
+# Below this size converting to arrays costs more than it saves
+NUMPY_MIN_LINES = 64
+INT64_MAX = 2 ** 63 - 1
+
+BasketTotals = namedtuple('BasketTotals', ['total_before_tax', 'total_tax', 'total_amount'])
+
+_NOT_LOADED = object()
+numpy = _NOT_LOADED
+
+_rate_exponents = {}
+
+
+def load_numpy():
+    """The NumPy module, imported on first call, or None when it isn't installed."""
+    global numpy
+    if numpy is _NOT_LOADED:
+        try:
+            import numpy as module
+        except ImportError:  # pragma: no cover - NumPy is optional
+            module = None
+        numpy = module
+    return numpy
+
+
+def _to_scaled_int(value, places):
+    scaled = value.scaleb(places)
+    if scaled != scaled.to_integral_value():
+        raise ValueError(f"{value} has more than {places} decimal places.")
+    return int(scaled)
+
+
+def to_paise(value):
+    """Converts a rupee ``Decimal`` with at most two decimal places to integer paise."""
+    return _to_scaled_int(value, 2)
+
+
+def to_basis_points(value):
+    """Converts a tax percentage ``Decimal`` with at most two decimal places to integer basis points."""
+    return _to_scaled_int(value, 2)
+
+
+def _rate_exponent(tax_percentage):
+    """Exponent of ``tax_percentage / 100`` as ``PurchaseItem.get_tax_amount`` computes it."""
+    key = tax_percentage.as_tuple()
+    exponent = _rate_exponents.get(key)
+    if exponent is None:
+        exponent = _rate_exponents[key] = (tax_percentage / HUNDRED).as_tuple().exponent
+    return exponent
+
+
+def _as_decimal(units, scale, exponent):
+    return Decimal(units).scaleb(-scale).quantize(Decimal(1).scaleb(exponent))
+
+
+def _build_totals(subtotal_paise, tax_micro, subtotal_exponent, tax_exponent):
+    # Floor on the exact micro-rupee total, Python's // floors towards negative infinity like math.floor
+    total_rupees = (subtotal_paise * BASIS_POINTS_PER_RATE + tax_micro) // MICRO_PER_RUPEE
+    return BasketTotals(
+        total_before_tax=_as_decimal(subtotal_paise, 2, subtotal_exponent),
+        total_tax=_as_decimal(tax_micro, 6, tax_exponent),
+        total_amount=Decimal(total_rupees),
+    )
+
+
+class _Columns:
+    """Integer columns of a set of lines plus the Decimal exponents needed to rebuild the results."""
+
+    def __init__(self):
+        self.quantities = []
+        self.paise = []
+        self.basis_points = []
+        # Sums start from int 0 in the Decimal implementation, so exponents never exceed 0
+        self.subtotal_exponent = 0
+        self.tax_exponent = 0
+
+    def append(self, quantity, unit_price, tax_percentage):
+        self.quantities.append(int(quantity))
+        self.paise.append(to_paise(unit_price))
+        self.basis_points.append(to_basis_points(tax_percentage))
+
+        price_exponent = unit_price.as_tuple().exponent
+        if price_exponent < self.subtotal_exponent:
+            self.subtotal_exponent = price_exponent
+        tax_exponent = price_exponent + _rate_exponent(tax_percentage)
+        if tax_exponent < self.tax_exponent:
+            self.tax_exponent = tax_exponent
+
+    def __len__(self):
+        return len(self.quantities)
+
+    def use_numpy(self):
+        if len(self) < NUMPY_MIN_LINES or load_numpy() is None:
+            return False
+        # Fall back to Python's arbitrary precision ints when a sum could overflow int64
+        bound = (max(map(abs, self.quantities)) * max(map(abs, self.paise))
+                 * max(max(map(abs, self.basis_points)), 1) * len(self))
+        return bound <= INT64_MAX
+
+    def arrays(self):
+        return (
+            numpy.array(self.quantities, dtype=numpy.int64),
+            numpy.array(self.paise, dtype=numpy.int64),
+            numpy.array(self.basis_points, dtype=numpy.int64),
+        )
+
+
+def basket_totals(lines):
+    """
+    Computes ``BasketTotals`` for an iterable of ``(quantity, unit_price, tax_percentage)`` lines,
+    with ``total_amount`` floored for the customer's benefit.
+    """
+    columns = _Columns()
+    for quantity, unit_price, tax_percentage in lines:
+        columns.append(quantity, unit_price, tax_percentage)
+
+    if columns.use_numpy():
+        quantities, paise, basis_points = columns.arrays()
+        line_paise = quantities * paise
+        subtotal_paise = int(line_paise.sum())
+        tax_micro = int((line_paise * basis_points).sum())
+    else:
+        line_paise = list(map(mul, columns.quantities, columns.paise))
+        subtotal_paise = sum(line_paise)
+        tax_micro = sum(map(mul, line_paise, columns.basis_points))
+
+    return _build_totals(subtotal_paise, tax_micro, columns.subtotal_exponent, columns.tax_exponent)
+
+
+def order_totals(rows):
+    """
+    Computes ``BasketTotals`` for many orders at once from ``(order_id, quantity, unit_price, tax_percentage)``
+    rows, e.g. a ``values_list`` over ``PurchaseItem``. Rows ordered by order id are summed in one
+    vectorized pass. Returns a dict keyed by order id.
+    """
+    columns = _Columns()
+    order_ids = []
+    segment_starts = []
+    exponents = {}
+
+    for order_id, quantity, unit_price, tax_percentage in rows:
+        if not order_ids or order_ids[-1] != order_id:
+            order_ids.append(order_id)
+            segment_starts.append(len(columns))
+            columns.subtotal_exponent = columns.tax_exponent = 0
+        columns.append(quantity, unit_price, tax_percentage)
+        subtotal_exponent, tax_exponent = exponents.get(order_id, (0, 0))
+        exponents[order_id] = (
+            min(subtotal_exponent, columns.subtotal_exponent),
+            min(tax_exponent, columns.tax_exponent),
+        )
+
+    if not order_ids:
+        return {}
+
+    if columns.use_numpy():
+        quantities, paise, basis_points = columns.arrays()
+        line_paise = quantities * paise
+        segment_paise = numpy.add.reduceat(line_paise, segment_starts).tolist()
+        segment_tax = numpy.add.reduceat(line_paise * basis_points, segment_starts).tolist()
+    else:
+        line_paise = list(map(mul, columns.quantities, columns.paise))
+        line_tax = list(map(mul, line_paise, columns.basis_points))
+        bounds = list(zip(segment_starts, segment_starts[1:] + [len(columns)]))
+        segment_paise = [sum(line_paise[start:end]) for start, end in bounds]
+        segment_tax = [sum(line_tax[start:end]) for start, end in bounds]
+
+    # Unordered input splits an order into several segments, merge them back
+    sums = {}
+    for order_id, subtotal_paise, tax_micro in zip(order_ids, segment_paise, segment_tax):
+        previous_paise, previous_tax = sums.get(order_id, (0, 0))
+        sums[order_id] = (previous_paise + subtotal_paise, previous_tax + tax_micro)
+
+    return {
+        order_id: _build_totals(subtotal_paise, tax_micro, *exponents[order_id])
+        for order_id, (subtotal_paise, tax_micro) in sums.items()
+    }
@@ -1,3 +1,37 @@
-from django.test import TestCase
+import gzip
+import re
+import tempfile
 
-# Create your tests here.
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.staticfiles import IMMUTABLE_CACHE_CONTROL, StaticFilesMiddleware
+
+
+class StaticFilesTests(TestCase):
+
+    def setUp(self):
+        self.static_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(STATIC_ROOT=self.static_root))
+
+    def test_pages_render_before_collectstatic(self):
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '/static/js/billing.js')
+
+    def test_collected_files_are_hashed_and_precompressed(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+        script_url = re.search(r'/static/js/billing\.[0-9a-f]{12}\.js', self.client.get('/').content.decode()).group()
+
+        response = self.client.get(script_url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        with open(f"{self.static_root}/js/billing.js", 'rb') as source:
+            self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), source.read())
+
+    def test_disabled_in_debug(self):
+        with override_settings(DEBUG=True):
+            with self.assertRaises(MiddlewareNotUsed):
+                StaticFilesMiddleware(lambda request: None)
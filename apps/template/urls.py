@@ -5,5 +5,6 @@ from apps.template import views
 urlpatterns = [
     path('', views.billing_form, name='billing-form'),
     path('bill/<str:order_code>/', views.billing_result, name='billing-result'),
+    path('bill/<str:order_code>/invoice/', views.invoice_download, name='invoice-download'),
     path('history/', views.purchase_history, name='purchase-history'),
 ]
@@ -1,31 +1,44 @@
-from django.shortcuts import render, get_object_or_404
+import logging
 
-from apps.billing.models import PurchaseOrder, PurchaseItem
-from core.settings import VALID_DENOMINATIONS
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.shortcuts import render
+
+from apps.api.invoices import InvoiceRenderTimeout, get_invoice
+from apps.billing.archive import ArchiveError, load_archived_order
+from apps.billing.models import ArchivedOrder, Customer, CustomerStats, PurchaseOrder
+from core.routers import read_from_replica
+
+logger = logging.getLogger(__name__)
 
 
 def billing_form(request):
-    denominations = sorted(VALID_DENOMINATIONS, reverse=True)
+    denominations = sorted(settings.VALID_DENOMINATIONS, reverse=True)
     return render(request, 'billing/billing_form.html', {'denominations': denominations})
 
 
+@read_from_replica
 def purchase_history(request):
     email = request.GET.get('email', '').strip()
     orders = []
     selected_order = None
     items = []
+    stats = None
 
-    if email:
-        orders = PurchaseOrder.objects.filter(
-            customer_email=email, is_draft=False
-        ).order_by('-purchase_date')
+    # Emails are matched case-insensitively through the customer's integer key
+    customer = Customer.objects.filter(email=Customer.normalize_email(email)).first() if email else None
+
+    if customer:
+        stats = CustomerStats.objects.filter(customer=customer).first()
+        orders = list(PurchaseOrder.objects.filter(
+            customer=customer, is_draft=False
+        ).order_by('-purchase_date'))
+        # Archived orders are listed from their index rows, which carry the same columns the list shows
+        orders += ArchivedOrder.objects.filter(customer=customer).order_by('-purchase_date')
 
         order_code = request.GET.get('order')
         if order_code:
-            selected_order = get_object_or_404(
-                PurchaseOrder, code=order_code, customer_email=email, is_draft=False
-            )
-            items = selected_order.purchase_items.select_related('product').all()
+            selected_order, items, _ = _get_finalized_order(code=order_code, customer=customer)
             for item in items:
                 item.subtotal = item.get_subtotal()
                 item.tax_amount = item.get_tax_amount()
@@ -36,15 +49,14 @@ def purchase_history(request):
         'orders': orders,
         'selected_order': selected_order,
         'items': items,
+        'stats': stats,
     })
 
 
+@read_from_replica
 def billing_result(request, order_code):
-    order = get_object_or_404(PurchaseOrder, code=order_code, is_draft=False)
-    items = order.purchase_items.select_related('product').all()
-    change_details = order.denomination_details.filter(
-        type='balance'
-    ).select_related('denomination')
+    order, items, denomination_details = _get_finalized_order(code=order_code)
+    change_details = [detail for detail in denomination_details if detail.type == 'balance']
 
     for item in items:
         item.subtotal = item.get_subtotal()
@@ -56,3 +68,55 @@ def billing_result(request, order_code):
         'items': items,
         'change_details': change_details,
     })
+
+
+@read_from_replica
+def invoice_download(request, order_code):
+    """
+    Serves the stored invoice as PDF, or as HTML when PDF rendering is not available. Answers 503 with
+    Retry-After when the render pool is too slow.
+    """
+    order, items, denomination_details = _get_finalized_order(code=order_code)
+    change_details = [detail for detail in denomination_details if detail.type == 'balance']
+
+    for item in items:
+        item.subtotal = item.get_subtotal()
+        item.tax_amount = item.get_tax_amount()
+        item.total = item.get_total()
+
+    try:
+        invoice = get_invoice(order, items, change_details)
+    except InvoiceRenderTimeout:
+        response = HttpResponse('The invoice is still being prepared, please try again shortly.',
+                                status=503, content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = str(settings.INVOICE_RENDER_RETRY_AFTER)
+        return response
+
+    if invoice.pdf:
+        response = HttpResponse(invoice.pdf, content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="invoice-{order.code}.pdf"'
+    else:
+        response = HttpResponse(invoice.html, content_type='text/html; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="invoice-{order.code}.html"'
+    return response
+
+
+def _get_finalized_order(**filters):
+    """
+    Finalized order with its items and denomination details, falling through to the
+    cold archive when the order has been moved out of the hot tables.
+    """
+    order = PurchaseOrder.objects.filter(is_draft=False, **filters).first()
+    if order:
+        items = order.purchase_items.select_related('product').all()
+        denomination_details = order.denomination_details.select_related('denomination').all()
+        return order, items, denomination_details
+
+    try:
+        archived = load_archived_order(**filters)
+    except ArchiveError:
+        logger.exception('archived_order_unreadable', extra={'filters': filters})
+        raise Http404('The archived order could not be read.')
+    if archived is None:
+        raise Http404('No finalized order matches the given query.')
+    return archived
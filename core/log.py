@@ -0,0 +1,179 @@
+"""
+Structured, non-blocking logging.
+
+``QueueListenerHandler`` only puts records on a bounded in-memory queue. A background thread formats
+them as JSON lines with ``JsonFormatter`` and writes them to a rotating file, so a request never waits
+on log I/O. Fields passed with ``extra=`` become JSON keys. The thread and the log directory are only
+created by the first record, so management commands that log nothing leave no trace.
+
+``log_request`` wraps a view and logs one record per request with its status, duration and query count.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from functools import wraps
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+
+# Attributes every LogRecord has, anything else on a record came in through ``extra``
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class _LogEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        try:
+            return super().default(o)
+        except TypeError:
+            # A log line is never worth an exception
+            return str(o)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in RESERVED_ATTRS)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, cls=_LogEncoder)
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    Queues records for a background thread that writes them as JSON to a rotating file. When the queue is
+    full records are dropped rather than blocking, the next written record carries the number dropped.
+    """
+
+    def __init__(self, filename, max_bytes, backup_count, queue_size):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.filename = filename
+        file_handler = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count,
+                                           encoding='utf-8', delay=True)
+        file_handler.setFormatter(JsonFormatter())
+        # Counted without a lock, it is a hint for operators and may be off under contention
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, file_handler, respect_handler_level=True)
+        self._started = self._stopped = False
+
+    def emit(self, record):
+        # Handler.handle holds self.lock around emit, so only one thread starts the listener
+        if not self._started:
+            self._start()
+        super().emit(record)
+
+    def _start(self):
+        os.makedirs(os.path.dirname(self.filename) or '.', exist_ok=True)
+        self.listener.start()
+        self._started = True
+        # Drain the queue at exit, this runs before logging.shutdown() closes the file
+        atexit.register(self._stop)
+
+    def prepare(self, record):
+        # Unlike QueueHandler.prepare, keep the traceback apart from the message so it gets its own JSON key
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.dropped:
+            record.dropped_records = self.dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.dropped = 0
+
+    def _stop(self):
+        if self._started and not self._stopped:
+            self._stopped = True
+            self.listener.stop()
+
+    def close(self):
+        self._stop()
+        super().close()
+
+
+def _count_queries(counter):
+    def wrapper(execute, sql, params, many, context):
+        counter[0] += 1
+        return execute(sql, params, many, context)
+    return wrapper
+
+
+def _order_code(request, response):
+    data = getattr(response, 'data', None)
+    if isinstance(data, dict) and data.get('order_code'):
+        return data['order_code']
+    try:
+        data = request.data
+    except Exception:
+        # Unparseable bodies were already answered with a 400
+        return None
+    return data.get('order_code') if isinstance(data, dict) else None
+
+
+def log_request(event, logger):
+    """
+    Logs ``event`` once per request with the response status, the order code it concerned, duration and
+    the number of database queries run while handling it.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            queries = [0]
+            started = time.perf_counter()
+            try:
+                with ExitStack() as stack:
+                    for connection in connections.all():
+                        stack.enter_context(connection.execute_wrapper(_count_queries(queries)))
+                    response = view_func(request, *args, **kwargs)
+            except Exception as e:
+                # DRF turns APIExceptions into 4xx responses, anything else is a 500
+                status = getattr(e, 'status_code', 500)
+                logger.log(logging.ERROR if status >= 500 else logging.INFO, event, exc_info=status >= 500, extra={
+                    'order_code': _order_code(request, None),
+                    'status': status,
+                    'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+                    'queries': queries[0],
+                })
+                raise
+
+            logger.log(
+                logging.INFO if response.status_code < 500 else logging.ERROR,
+                event,
+                extra={
+                    'order_code': _order_code(request, response),
+                    'status': response.status_code,
+                    'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+                    'queries': queries[0],
+                    'replayed': response.has_header('Idempotent-Replayed'),
+                },
+            )
+            return response
+
+        return wrapper
+
+    return decorator
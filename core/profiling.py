@@ -0,0 +1,161 @@
+"""
+Opt-in per-request profiling.
+
+``ProfilingMiddleware`` runs views from ``PROFILING_VIEW_MODULES`` under ``cProfile`` when the request
+carries ``PROFILING_HEADER`` set to ``PROFILING_TOKEN``, or is picked by ``PROFILING_SAMPLE_RATE``.
+Each profiled request leaves two files in ``PROFILING_DIR``:
+
+- ``<id>.pstats``, for ``python -m pstats`` or snakeviz.
+- ``<id>.collapsed``, collapsed stacks in microseconds for flamegraph.pl or speedscope.
+
+The oldest files are pruned beyond ``PROFILING_MAX_FILES`` profiles or ``PROFILING_MAX_AGE`` seconds.
+"""
+import os
+import random
+import time
+import uuid
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+PROFILE_SUFFIXES = ('.pstats', '.collapsed')
+# Call paths deeper than this, or carrying less than this share of the request's time, are folded into
+# their caller. Every function can be reached along many paths, so this keeps the walk and the file small.
+MAX_STACK_DEPTH = 64
+MIN_PATH_SHARE = 1e-4
+
+
+def _frame_name(func):
+    filename, lineno, name = func
+    if filename == '~':
+        # Built-ins are reported as ('~', 0, '<built-in method ...>')
+        return name
+    return f"{name} ({Path(filename).name}:{lineno})"
+
+
+def collapsed_stacks(stats):
+    """
+    Converts cProfile stats to collapsed stack lines. cProfile only records caller/callee pairs, so a
+    function's time is split across its call paths in proportion to the time each caller spent in it.
+    """
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees.setdefault(caller, []).append((func, cumulative))
+
+    totals = {}
+    roots = [func for func, (_, _, _, _, callers) in stats.stats.items() if not callers]
+    min_path_time = MIN_PATH_SHARE * sum(stats.stats[func][3] for func in roots)
+
+    def visit(func, path, scale):
+        _, _, own_time, cumulative, _ = stats.stats[func]
+        path = path + (_frame_name(func),)
+        stack = ';'.join(path)
+        totals[stack] = totals.get(stack, 0) + own_time * scale
+
+        for callee, edge_time in callees.get(func, ()):
+            callee_cumulative = stats.stats[callee][3]
+            if not callee_cumulative or _frame_name(callee) in path:
+                continue
+            if len(path) >= MAX_STACK_DEPTH or edge_time * scale < min_path_time:
+                totals[stack] += edge_time * scale
+                continue
+            visit(callee, path, scale * edge_time / callee_cumulative)
+
+    for func in roots:
+        visit(func, (), 1.0)
+
+    return [f"{stack} {round(seconds * 1e6)}" for stack, seconds in totals.items() if seconds * 1e6 >= 1]
+
+
+def prune_profiles(directory, max_files, max_age):
+    """Deletes profiles older than ``max_age`` seconds and all but the newest ``max_files``."""
+    profiles = sorted(directory.glob('*.pstats'), key=lambda path: path.stat().st_mtime, reverse=True)
+    cutoff = time.time() - max_age
+    for index, path in enumerate(profiles):
+        if index >= max_files or path.stat().st_mtime < cutoff:
+            for suffix in PROFILE_SUFFIXES:
+                path.with_suffix(suffix).unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles opted-in or sampled requests to the billing views and writes pstats and collapsed stacks.
+    Async capable so it doesn't force the middleware above it into sync mode under ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self._finish(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if getattr(request, '_profiler', None) is None:
+            return response
+        # process_view and sync views run on the shared sync thread, the profiler must be stopped there
+        return await sync_to_async(self._finish)(request, response)
+
+    def _finish(self, request, response):
+        profiler = getattr(request, '_profiler', None)
+        if profiler is None:
+            return response
+
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - request._profile_started) * 1000
+        name = request.resolver_match.url_name if request.resolver_match else 'unknown'
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{elapsed_ms:.0f}ms-{uuid.uuid4().hex[:8]}"
+        self._write(profiler, profile_id)
+        response['X-Profile-Id'] = profile_id
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.PROFILING_ENABLED or not self._wants_profile(request):
+            return None
+        if getattr(view_func, '__module__', None) not in settings.PROFILING_VIEW_MODULES:
+            return None
+
+        # cProfile and pstats are only imported once a request is actually profiled
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler or debugger already owns this thread
+            return None
+        request._profiler = profiler
+        request._profile_started = time.perf_counter()
+        return None
+
+    @staticmethod
+    def _wants_profile(request):
+        token = settings.PROFILING_TOKEN
+        if token and request.headers.get(settings.PROFILING_HEADER) == token:
+            return True
+        return random.random() < settings.PROFILING_SAMPLE_RATE
+
+    @staticmethod
+    def _write(profiler, profile_id):
+        import pstats
+
+        directory = Path(settings.PROFILING_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        stats = pstats.Stats(profiler)
+        stats.dump_stats(directory / f"{profile_id}.pstats")
+
+        collapsed_path = directory / f"{profile_id}.collapsed"
+        temporary_path = collapsed_path.with_suffix('.collapsed.tmp')
+        temporary_path.write_text('\n'.join(collapsed_stacks(stats)) + '\n')
+        os.replace(temporary_path, collapsed_path)
+
+        prune_profiles(directory, settings.PROFILING_MAX_FILES, settings.PROFILING_MAX_AGE)
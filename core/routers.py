@@ -0,0 +1,58 @@
+"""
+Database routing for the optional read replica.
+
+Views wrapped with ``read_from_replica`` send their reads to the ``replica`` database when one is
+configured, writes always go to ``default``. A client that just finalized an order carries a short-lived
+cookie that keeps its reads on the primary, so it always sees its own writes.
+"""
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+REPLICA_DB_ALIAS = 'replica'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def read_from_replica(view_func):
+    """Routes reads made while handling the view (including template rendering) to the replica."""
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if REPLICA_DB_ALIAS not in settings.DATABASES or request.COOKIES.get(settings.REPLICA_PIN_COOKIE):
+            return view_func(request, *args, **kwargs)
+
+        token = _use_replica.set(True)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+
+    return wrapper
+
+
+def pin_to_primary(response):
+    """Keeps the client's replica-routed reads on the primary until the replica has caught up."""
+    response.set_cookie(
+        settings.REPLICA_PIN_COOKIE,
+        '1',
+        max_age=settings.REPLICA_PIN_SECONDS,
+        httponly=True,
+        samesite='Lax',
+    )
+    return response
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return REPLICA_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data as the primary
+        return True
@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -24,9 +24,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = config('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = config('DEBUG', default=True, cast=bool)
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='', cast=Csv())
 
 
 # Application definition
@@ -48,6 +48,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Serves collected static files before anything else runs, GZip then compresses HTML and JSON responses
+    'core.staticfiles.StaticFilesMiddleware',
+    'django.middleware.gzip.GZipMiddleware',
+    # Sheds excess checkout load before sessions, auth or views touch the database
+    'apps.api.middleware.AdmissionControlMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -91,6 +97,26 @@ DATABASES = {
     },
 }
 
+# Optional read replica used by views wrapped with core.routers.read_from_replica.
+# Locally this can be a second SQLite file or Postgres database kept in sync with the primary.
+DB_REPLICA_NAME = config('DB_REPLICA_NAME', default='')
+if DB_REPLICA_NAME:
+    DATABASES['replica'] = {
+        'ENGINE': config('DB_REPLICA_ENGINE', default=DATABASES['default']['ENGINE']),
+        'NAME': DB_REPLICA_NAME,
+        'USER': config('DB_REPLICA_USER', default=DATABASES['default']['USER']),
+        'PASSWORD': config('DB_REPLICA_PASSWORD', default=DATABASES['default']['PASSWORD']),
+        'HOST': config('DB_REPLICA_HOST', default=DATABASES['default']['HOST']),
+        'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Seconds a client stays pinned to the primary after finalizing an order (read-your-writes)
+REPLICA_PIN_COOKIE = 'pin_primary'
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -128,6 +154,18 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
+STATIC_ROOT = config('STATIC_ROOT', default=str(BASE_DIR / 'staticfiles'))
+
+# collectstatic writes content-hashed, gzip/brotli-compressed copies (brotli needs the optional `brotli`
+# package). With DEBUG off, templates reference the hashed names, so run collectstatic before serving.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'core.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -145,4 +183,130 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 SERVER_EMAIL = config('SERVER_EMAIL')
 
 # Value Configuration
-VALID_DENOMINATIONS = list(map(int,config('VALID_DENOMINATIONS','1,2,5,10,20,50,100,200,500').split(',')))
\ No newline at end of file
+VALID_DENOMINATIONS = list(map(int,config('VALID_DENOMINATIONS','1,2,5,10,20,50,100,200,500').split(',')))
+
+# Stock Ledger Configuration
+# When enabled, sales append StockMovement rows instead of updating Product.stock_quantity.
+# Run `python manage.py compact_stock_ledger` periodically to fold them into the snapshot.
+STOCK_LEDGER_ENABLED = config('STOCK_LEDGER_ENABLED', default=False, cast=bool)
+STOCK_LEDGER_COMPACT_BATCH_SIZE = config('STOCK_LEDGER_COMPACT_BATCH_SIZE', default=5000, cast=int)
+
+# Idempotency Configuration
+# Seconds a generate-bill response is kept for replay to retries with the same Idempotency-Key.
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)
+
+# Order Archive Configuration
+# Finalized orders older than ORDER_ARCHIVE_AFTER_MONTHS are moved here by `python manage.py archive_orders`.
+ORDER_ARCHIVE_DIR = config('ORDER_ARCHIVE_DIR', default=str(BASE_DIR / 'archive'))
+ORDER_ARCHIVE_AFTER_MONTHS = config('ORDER_ARCHIVE_AFTER_MONTHS', default=12, cast=int)
+
+# Order Feed Configuration
+# /api/order-feed/ returns ORDER_FEED_PAGE_SIZE finalized orders per page unless ?limit= asks for
+# another size, up to ORDER_FEED_MAX_PAGE_SIZE. Entries are served once they are ORDER_FEED_SETTLE_SECONDS
+# old, so appends that commit out of id order are all visible before a cursor moves past them.
+ORDER_FEED_PAGE_SIZE = config('ORDER_FEED_PAGE_SIZE', default=500, cast=int)
+ORDER_FEED_MAX_PAGE_SIZE = config('ORDER_FEED_MAX_PAGE_SIZE', default=5000, cast=int)
+ORDER_FEED_SETTLE_SECONDS = config('ORDER_FEED_SETTLE_SECONDS', default=2, cast=int)
+
+# Invoice Rendering Configuration
+# Invoices render in a process pool; PDFs are produced when WeasyPrint is installed.
+INVOICE_STORAGE_DIR = config('INVOICE_STORAGE_DIR', default=str(BASE_DIR / 'invoices'))
+INVOICE_RENDER_WORKERS = config('INVOICE_RENDER_WORKERS', default=2, cast=int)
+INVOICE_RENDER_QUEUE_SIZE = config('INVOICE_RENDER_QUEUE_SIZE', default=8, cast=int)
+INVOICE_RENDER_TIMEOUT = config('INVOICE_RENDER_TIMEOUT', default=60, cast=int)
+# Seconds a download that timed out tells the client to wait before retrying
+INVOICE_RENDER_RETRY_AFTER = config('INVOICE_RENDER_RETRY_AFTER', default=5, cast=int)
+
+# Cache Configuration
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    },
+}
+
+# Draft Configuration
+# 'database' keeps drafts as PurchaseOrder(is_draft=True) rows, 'cache' keeps them in DRAFT_CACHE_ALIAS
+# until the bill is generated. The cache must be shared by all workers (file, database or external cache).
+DRAFT_BACKEND = config('DRAFT_BACKEND', default='database')
+DRAFT_CACHE_ALIAS = config('DRAFT_CACHE_ALIAS', default='default')
+DRAFT_CACHE_TIMEOUT = config('DRAFT_CACHE_TIMEOUT', default=21600, cast=int)
+
+# Admission Control Configuration
+# Per process: at most ADMISSION_MAX_CONCURRENT checkout requests run, ADMISSION_MAX_QUEUE more wait
+# (bills ahead of drafts) for up to ADMISSION_QUEUE_TIMEOUT seconds, the rest get 503 with Retry-After.
+ADMISSION_CONTROL_ENABLED = config('ADMISSION_CONTROL_ENABLED', default=True, cast=bool)
+ADMISSION_MAX_CONCURRENT = config('ADMISSION_MAX_CONCURRENT', default=4, cast=int)
+ADMISSION_MAX_QUEUE = config('ADMISSION_MAX_QUEUE', default=16, cast=int)
+ADMISSION_QUEUE_TIMEOUT = config('ADMISSION_QUEUE_TIMEOUT', default=5, cast=float)
+ADMISSION_RETRY_AFTER = config('ADMISSION_RETRY_AFTER', default=2, cast=int)
+
+# Change Strategy Configuration
+# How change is picked from the till: greedy, fewest_notes, preserve_scarce or target_float
+# (compare them with `python manage.py simulate_change_strategies`). CHANGE_TARGET_FLOAT is the count
+# per denomination the till should hold, used by target_float and as the simulation's opening till.
+CHANGE_STRATEGY = config('CHANGE_STRATEGY', default='greedy')
+CHANGE_TARGET_FLOAT = {
+    int(value): int(count) for value, count in (
+        pair.split(':') for pair in config(
+            'CHANGE_TARGET_FLOAT', default='500:10,200:10,100:20,50:20,20:30,10:30,5:40,2:40,1:50'
+        ).split(',')
+    )
+}
+
+# Profiling Configuration
+# When enabled, requests to PROFILING_VIEW_MODULES are profiled if they send PROFILING_HEADER with
+# PROFILING_TOKEN (header opt-in is off while the token is empty) or are sampled at PROFILING_SAMPLE_RATE.
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_HEADER = config('PROFILING_HEADER', default='X-Profile')
+PROFILING_TOKEN = config('PROFILING_TOKEN', default='')
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_VIEW_MODULES = ['apps.api.views', 'apps.template.views']
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILING_MAX_FILES = config('PROFILING_MAX_FILES', default=200, cast=int)
+PROFILING_MAX_AGE = config('PROFILING_MAX_AGE', default=7 * 86400, cast=int)
+
+# Till Events Configuration
+# /api/till-events/ sends a keep-alive every TILL_EVENTS_HEARTBEAT seconds. A stream more than
+# TILL_EVENTS_QUEUE_SIZE events behind gets a fresh snapshot instead.
+TILL_EVENTS_HEARTBEAT = config('TILL_EVENTS_HEARTBEAT', default=15, cast=int)
+TILL_EVENTS_QUEUE_SIZE = config('TILL_EVENTS_QUEUE_SIZE', default=256, cast=int)
+
+# Startup Benchmark Configuration
+# `python manage.py startup_benchmark` fails when the median time to first response of the WSGI or ASGI
+# application in a fresh interpreter exceeds STARTUP_BUDGET_MS. 0 disables the check.
+STARTUP_BUDGET_MS = config('STARTUP_BUDGET_MS', default=1000, cast=int)
+
+# Logging Configuration
+# The apps.* loggers write JSON lines to LOG_DIR/billing.log from a background thread, rotating at
+# LOG_MAX_BYTES and keeping LOG_BACKUP_COUNT files. Beyond LOG_QUEUE_SIZE pending records new ones are
+# dropped instead of blocking requests. The writer thread and LOG_DIR are only created by the first record.
+# core.test_runner points the file handlers at a temporary directory while the tests run.
+LOG_DIR = config('LOG_DIR', default=str(BASE_DIR / 'logs'))
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_MAX_BYTES = config('LOG_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+LOG_BACKUP_COUNT = config('LOG_BACKUP_COUNT', default=5, cast=int)
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'json_file': {
+            '()': 'core.log.QueueListenerHandler',
+            'filename': str(Path(LOG_DIR) / 'billing.log'),
+            'max_bytes': LOG_MAX_BYTES,
+            'backup_count': LOG_BACKUP_COUNT,
+            'queue_size': LOG_QUEUE_SIZE,
+        },
+    },
+    'loggers': {
+        'apps': {
+            'handlers': ['json_file'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
+
+TEST_RUNNER = 'core.test_runner.TestRunner'
@@ -0,0 +1,140 @@
+"""
+Fingerprinted, precompressed static files.
+
+``collectstatic`` with ``CompressedManifestStaticFilesStorage`` writes content-hashed copies of every
+asset plus ``.gz`` (and ``.br`` when the ``brotli`` package is installed) siblings for text assets.
+``StaticFilesMiddleware`` serves ``STATIC_ROOT`` itself: it picks the best precompressed variant the
+client accepts and marks hashed files as cacheable forever, since any change gives them a new name.
+Until ``collectstatic`` has written a manifest (tests, a fresh checkout) templates get the plain names.
+"""
+import gzip
+import mimetypes
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml'}
+# Compressing tiny files saves less than the extra request headers cost
+MIN_COMPRESS_SIZE = 256
+
+# ManifestStaticFilesStorage names hashed files <name>.<12 hex chars>.<ext>
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Unhashed names can change content at any deploy
+SHORT_CACHE_CONTROL = 'public, max-age=60'
+
+# Preferred first
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def _compress(path, content):
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content)))
+
+    for suffix, compressed in variants:
+        if len(compressed) < len(content):
+            Path(f"{path}{suffix}").write_bytes(compressed)
+
+
+def accepted_encodings(header):
+    """Content codings listed in an Accept-Encoding header, leaving out those refused with q=0."""
+    accepted = set()
+    for part in header.split(','):
+        coding, *params = [item.strip() for item in part.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass
+        if coding and quality > 0:
+            accepted.add(coding.lower())
+    return accepted
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes gzip/brotli variants of the text assets it collects."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        # Compress the originals and the final hashed copies, both can be requested
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = self.path(name)
+            content = Path(path).read_bytes()
+            if len(content) >= MIN_COMPRESS_SIZE:
+                _compress(path, content)
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            # No manifest collected yet, fail on the missing file when it is requested rather than on every page
+            return name
+        return super().stored_name(name)
+
+
+class StaticFilesMiddleware:
+    """
+    Serves ``STATIC_URL`` from ``STATIC_ROOT`` with content negotiation and cache headers. Requests for
+    files that haven't been collected fall through. Off with ``DEBUG``, so runserver serves the source
+    files and edits show up without running collectstatic.
+    """
+
+    def __init__(self, get_response):
+        if settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        self.root = Path(settings.STATIC_ROOT).resolve() if settings.STATIC_ROOT else None
+
+    def __call__(self, request):
+        if self.root is None or request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix):
+            return self.get_response(request)
+
+        path = (self.root / request.path[len(self.prefix):]).resolve()
+        if not path.is_relative_to(self.root) or not path.is_file():
+            return self.get_response(request)
+        return self._serve(request, path)
+
+    @staticmethod
+    def _serve(request, path):
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        served, encoding = path, None
+        for name, suffix in ENCODINGS:
+            candidate = path.with_name(path.name + suffix)
+            if name in accepted and candidate.is_file():
+                served, encoding = candidate, name
+                break
+
+        modified = served.stat().st_mtime
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        if if_modified_since and int(modified) <= if_modified_since:
+            response = HttpResponseNotModified()
+        else:
+            content_type, _ = mimetypes.guess_type(path.name)
+            response = FileResponse(served.open('rb'), content_type=content_type or 'application/octet-stream')
+            if encoding:
+                response['Content-Encoding'] = encoding
+            response['Last-Modified'] = http_date(modified)
+
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if HASHED_NAME.search(path.name) else SHORT_CACHE_CONTROL
+        response['Vary'] = 'Accept-Encoding'
+        return response
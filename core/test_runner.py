@@ -0,0 +1,32 @@
+"""
+Test runner that keeps test logs out of ``LOG_DIR``.
+
+Tests log checkout requests like production does, and would otherwise append them to the real
+``billing.log``. The runner points every file handler in ``LOGGING`` at a temporary directory for the run
+and restores the configured logging afterwards.
+"""
+import copy
+import logging.config
+import os
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._log_dir = tempfile.TemporaryDirectory(prefix='billing_system-test-logs-')
+        config = copy.deepcopy(settings.LOGGING)
+        for handler in config.get('handlers', {}).values():
+            if 'filename' in handler:
+                handler['filename'] = os.path.join(self._log_dir.name, os.path.basename(handler['filename']))
+        logging.config.dictConfig(config)
+
+    def teardown_test_environment(self, **kwargs):
+        # Reconfiguring closes the temporary handlers, stopping their writer threads before the cleanup
+        logging.config.dictConfig(settings.LOGGING)
+        self._log_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -36,6 +36,37 @@ $(document).ready(function () {
         $('#paid-amount').val(total);
     }
 
+    // Fills the denomination counts with the tender the server suggests. With `available` (the notes the
+    // customer has) the suggestion only uses those.
+    function suggestTender(available) {
+        var orderCode = $('#order-code').val();
+        if (!orderCode) return;
+
+        var data = { order_code: orderCode };
+        if (available && available.length) data.available = available;
+
+        $.ajax({
+            url: '/api/suggest-tender/',
+            method: 'POST',
+            contentType: 'application/json',
+            data: JSON.stringify(data),
+            success: function (res) {
+                $('.denom-input').val(0);
+                $.each(res.denominations, function (i, item) {
+                    $('.denom-input[data-value=' + item.value + ']').val(item.count);
+                });
+                updatePaidAmount();
+            },
+            error: function (xhr) {
+                // Without a suggestion the cashier enters the notes by hand
+                if (available) {
+                    var data = xhr.responseJSON || {};
+                    showError(data.error || 'Could not suggest a tender.');
+                }
+            }
+        });
+    }
+
     function reindexRows() {
         $('#product-table tbody .product-row').each(function (i) {
             $(this).find('td:first').text(i + 1);
@@ -108,6 +139,7 @@ $(document).ready(function () {
                 $('#total-amount').text(res.total_amount);
                 $('#totals-section').removeClass('hidden');
                 $('#denomination-section').removeClass('hidden');
+                suggestTender();
             },
             error: function (xhr) {
                 var data = xhr.responseJSON || {};
@@ -124,6 +156,19 @@ $(document).ready(function () {
         updatePaidAmount();
     });
 
+    // Suggest a tender from the notes entered as what the customer has
+    $('#suggest-tender').click(function () {
+        clearError();
+        var available = [];
+        $('.denom-input').each(function () {
+            var count = parseInt($(this).val()) || 0;
+            if (count > 0) {
+                available.push({ value: parseInt($(this).data('value')), count: count });
+            }
+        });
+        suggestTender(available);
+    });
+
     // Generate Bill
     $('#generate-bill').click(function () {
         clearError();
@@ -160,6 +205,8 @@ $(document).ready(function () {
             url: '/api/generate-bill/',
             method: 'POST',
             contentType: 'application/json',
+            // Only successful bills are stored against the key, so retries after a timeout replay that result
+            headers: { 'Idempotency-Key': 'bill-' + orderCode },
             data: JSON.stringify({ order_code: orderCode, denominations: denominations }),
             success: function (res) {
                 window.location.href = '/bill/' + res.order_code + '/';